@@ -0,0 +1,37 @@
+"""
+Advice prompt size as ledgers grow: the previous prompt (the whole metrics
+dict pasted in as a Python repr) vs the bounded summary from
+build_advice_prompt. Bank exports use the payee as category, so the
+category count grows with the ledger; that is modelled here.
+
+Run from the backend folder:
+    python benchmarks/bench_advice_prompt.py [rows ...]
+"""
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bench_metrics import make_ledger
+from services.ai_advisor import build_advice_prompt, estimate_tokens
+from services.parser import calculate_metrics
+
+COMPANY = {"name": "Bench Co", "industry": "Retail", "business_type": "Grocery"}
+
+def legacy_prompt(financial_data: dict):
+    # Only the part that scaled with the ledger; the instructions were fixed.
+    return f"Full Financial Data:\n{financial_data}"
+
+def main(sizes):
+    print(f"{'rows':>9} {'categories':>11} {'legacy tokens':>14} {'compact tokens':>15}")
+    for rows in sizes:
+        ledger = make_ledger(rows)
+        # Roughly one new payee every 20 rows
+        ledger["category"] = "Payee " + (ledger.index // 20).astype(str)
+        metrics = calculate_metrics(ledger)
+        legacy = estimate_tokens(legacy_prompt(metrics))
+        compact = estimate_tokens(build_advice_prompt(metrics, COMPANY))
+        print(f"{rows:>9,} {len(metrics['by_category']):>11,} {legacy:>14,} {compact:>15,}")
+
+if __name__ == "__main__":
+    main([int(arg) for arg in sys.argv[1:]] or [1_000, 10_000, 100_000, 1_000_000])
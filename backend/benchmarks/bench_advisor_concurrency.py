@@ -0,0 +1,68 @@
+"""
+Tail latency of the async advisor under concurrent uploads, using the local
+fake model instead of Gemini. Also reports the worst event-loop stall seen by
+a heartbeat task, which is what other requests on the worker would feel.
+
+Run from the backend folder:
+    python benchmarks/bench_advisor_concurrency.py [--requests 64] [--latency 0.2] [--timeout 1.0]
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services import ai_advisor
+from services.ai_advisor import get_financial_advice_async, set_model_factory
+from services.llm_stub import FakeGenerativeModel
+
+METRICS = {"revenue": 40420.75, "expenses": 18455.74, "net_profit": 21965.01}
+COMPANY = {"name": "Bench Co", "industry": "Tech", "business_type": "SaaS"}
+
+async def heartbeat(stop: asyncio.Event, interval: float = 0.01):
+    # Measures how late the loop wakes us up; blocking calls show up here.
+    worst = 0.0
+    loop = asyncio.get_running_loop()
+    while not stop.is_set():
+        start = loop.time()
+        await asyncio.sleep(interval)
+        worst = max(worst, loop.time() - start - interval)
+    return worst
+
+async def one_upload(timeout: float):
+    start = time.perf_counter()
+    result = await get_financial_advice_async(METRICS, COMPANY, timeout=timeout)
+    return time.perf_counter() - start, '"fallback": true' in result
+
+async def run(requests: int, timeout: float):
+    stop = asyncio.Event()
+    beat = asyncio.create_task(heartbeat(stop))
+    results = await asyncio.gather(*(one_upload(timeout) for _ in range(requests)))
+    stop.set()
+    return results, await beat
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=64)
+    parser.add_argument("--latency", type=float, default=0.2)
+    parser.add_argument("--jitter", type=float, default=0.3)
+    parser.add_argument("--timeout", type=float, default=1.0)
+    args = parser.parse_args()
+
+    set_model_factory(lambda: FakeGenerativeModel(latency=args.latency, jitter=args.jitter))
+    results, worst_stall = asyncio.run(run(args.requests, args.timeout))
+
+    latencies = np.array([latency for latency, _ in results]) * 1000
+    fallbacks = sum(1 for _, fallback in results if fallback)
+    print(f"requests={args.requests} concurrency_limit={ai_advisor.LLM_MAX_CONCURRENCY} "
+          f"model_latency={args.latency}s+{args.jitter}s timeout={args.timeout}s")
+    print(f"p50={np.percentile(latencies, 50):.0f}ms p95={np.percentile(latencies, 95):.0f}ms "
+          f"p99={np.percentile(latencies, 99):.0f}ms max={latencies.max():.0f}ms")
+    print(f"fallbacks={fallbacks} worst_event_loop_stall={worst_stall * 1000:.1f}ms")
+
+if __name__ == "__main__":
+    main()
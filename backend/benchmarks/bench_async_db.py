@@ -0,0 +1,147 @@
+"""
+Sync vs async database path under concurrent load: the read endpoints the
+API serves from get_async_db (company page, snapshot, records page) against
+the same queries on get_db in plain `def` handlers, which FastAPI runs in its
+threadpool. Requests go through the ASGI transport in one process, so this
+compares the handlers and drivers rather than the HTTP server.
+
+By default a throwaway SQLite database is used (aiosqlite against sqlite3);
+set DATABASE_URL to a Postgres database to compare asyncpg with psycopg2.
+
+Run from the backend folder:
+    python benchmarks/bench_async_db.py [--companies 2000] [--requests 3000] [--concurrency 1,16,64,256]
+"""
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+from typing import Optional
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+if not os.getenv("DATABASE_URL"):
+    os.environ["DATABASE_URL"] = f"sqlite:///{tempfile.mkdtemp(prefix='finpulse-async-')}/async.db"
+# Fail fast instead of waiting the default 30 s when the pool runs dry
+os.environ.setdefault("DB_POOL_TIMEOUT", "5")
+
+from fastapi import Depends, FastAPI, Query, Request
+from sqlalchemy import insert
+from sqlalchemy.orm import Session
+
+import main as api
+from database import engine, SessionLocal, async_engine, get_db
+from migrations import migrate
+from models import Company, FinancialRecord, CompanySnapshot
+from schemas import CompanyPage, CompanySnapshot as CompanySnapshotSchema, FinancialRecordPage
+from services.pagination import keyset_page
+from services.snapshots import snapshot_etag
+from services.telemetry import MetricsMiddleware
+
+PERIODS = 12
+
+# The same three routes on the sync session, as they were served before
+sync_app = FastAPI()
+sync_app.add_middleware(MetricsMiddleware)
+
+@sync_app.get("/companies/", response_model=CompanyPage)
+def sync_companies(cursor: Optional[str] = None, limit: int = Query(50), db: Session = Depends(get_db)):
+    items, next_cursor = keyset_page(db.query(Company), [Company.id], cursor, limit)
+    return {"items": items, "next_cursor": next_cursor}
+
+@sync_app.get("/companies/{company_id}/records", response_model=FinancialRecordPage)
+def sync_records(company_id: int, cursor: Optional[str] = None, limit: int = Query(50),
+                 db: Session = Depends(get_db)):
+    query = db.query(FinancialRecord).filter(FinancialRecord.company_id == company_id)
+    items, next_cursor = keyset_page(query, [FinancialRecord.period_end, FinancialRecord.id], cursor, limit,
+                                     descending=True)
+    return {"items": items, "next_cursor": next_cursor}
+
+@sync_app.get("/companies/{company_id}/snapshot", response_model=CompanySnapshotSchema)
+def sync_snapshot(company_id: int, request: Request, db: Session = Depends(get_db)):
+    row = db.query(*api.SNAPSHOT_COLUMNS).join(Company, Company.id == CompanySnapshot.company_id).filter(
+        CompanySnapshot.company_id == company_id
+    ).first()
+    return api._cached_json(request, snapshot_etag([(row.company_id, row.version)]),
+                            CompanySnapshotSchema.model_validate(row))
+
+def populate(companies: int, seed: int = 11):
+    rng = np.random.default_rng(seed)
+    start = datetime(2024, 1, 31)
+    migrate(engine, SessionLocal)
+    with SessionLocal() as db:
+        first = db.query(Company.id).count() + 1
+        ids = range(first, first + companies)
+        db.execute(insert(Company), [
+            {"id": i, "name": f"Company {i}", "industry": "Retail", "business_type": "Shop"} for i in ids
+        ])
+        revenue = rng.gamma(2.0, 20_000.0, companies * PERIODS)
+        db.execute(insert(FinancialRecord), [
+            {"company_id": company_id, "period_start": start + timedelta(days=30 * period - 30),
+             "period_end": start + timedelta(days=30 * period), "revenue": float(revenue[n]),
+             "cogs": 0.0, "opex": float(revenue[n] * 0.8), "net_profit": float(revenue[n] * 0.2), "assets": 0.0,
+             "liabilities": 0.0, "equity": 0.0}
+            for n, (company_id, period) in enumerate((c, p) for c in ids for p in range(PERIODS))
+        ])
+        db.commit()
+    # Snapshots for the new companies
+    migrate(engine, SessionLocal)
+    return list(ids)
+
+async def load(app, paths: list, concurrency: int):
+    # `concurrency` clients sending the paths back to back; returns latencies
+    # of the successful requests, the number that failed and the wall time
+    import httpx
+
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench") as client:
+        pending = iter(paths)
+        latencies = []
+        errors = 0
+
+        async def worker():
+            nonlocal errors
+            for path in pending:
+                start = time.perf_counter()
+                try:
+                    response = await client.get(path)
+                    response.raise_for_status()
+                except Exception:
+                    errors += 1
+                    continue
+                latencies.append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        return latencies, errors, time.perf_counter() - start
+
+async def compare(paths: list, concurrency_levels: list):
+    # One event loop for every run: the async engine's pooled connections belong to it
+    print(f"{'path':<6} {'clients':>8} {'req/s':>9} {'p50 ms':>9} {'p99 ms':>9} {'errors':>7}")
+    for concurrency in concurrency_levels:
+        for name, app in (("sync", sync_app), ("async", api.app)):
+            await load(app, paths[:200], concurrency)  # warm-up
+            latencies, errors, wall = await load(app, paths, concurrency)
+            p50, p99 = np.percentile(latencies, [50, 99]) * 1000 if latencies else (np.nan, np.nan)
+            print(f"{name:<6} {concurrency:>8} {len(latencies) / wall:>9.0f} {p50:>9.2f} {p99:>9.2f} {errors:>7}")
+    await async_engine.dispose()
+
+def main(args):
+    company_ids = populate(args.companies)
+    rng = np.random.default_rng(5)
+    picks = rng.choice(company_ids, args.requests)
+    routes = ["/companies/?limit=50", "/companies/{}/snapshot", "/companies/{}/records?limit=12"]
+    paths = [routes[i % len(routes)].format(int(company_id)) for i, company_id in enumerate(picks)]
+    print(f"{engine.url.get_backend_name()}: {args.companies:,} companies, {args.requests:,} requests "
+          f"over {', '.join(routes)}\n")
+    asyncio.run(compare(paths, args.concurrency))
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--companies", type=int, default=2000)
+    parser.add_argument("--requests", type=int, default=3000)
+    parser.add_argument("--concurrency", type=lambda value: [int(v) for v in value.split(",")], default=[1, 16, 64, 256])
+    main(parser.parse_args())
@@ -0,0 +1,69 @@
+"""
+.xlsx ingestion: pd.read_excel (default engine, whole sheet in memory) vs
+the streaming read-only path in services.excel, both folded into the same
+LedgerAggregate. Reports wall time and (in a second, traced run) peak
+Python memory.
+
+Run from the backend folder (writes workbooks to a temporary directory):
+    python benchmarks/bench_excel.py [rows ...]
+"""
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import pandas as pd
+from openpyxl import Workbook
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bench_metrics import make_ledger
+from services.parser import LedgerAggregate, stream_financial_statement
+
+def write_workbook(path: str, rows: int):
+    ledger = make_ledger(rows)
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet("Ledger")
+    sheet.append(["Date", "Category", "Amount", "Type"])
+    for row in ledger.itertuples(index=False):
+        sheet.append([row.date.to_pydatetime(), row.category, float(row.amount), row.type])
+    workbook.save(path)
+
+def read_excel_path(path: str):
+    aggregate = LedgerAggregate()
+    aggregate.fold(pd.read_excel(path))
+    return aggregate.to_metrics()
+
+def measure(fn, path: str):
+    start = time.perf_counter()
+    metrics = fn(path)
+    elapsed = time.perf_counter() - start
+
+    # Tracing slows allocation-heavy code down, so memory is a separate run.
+    tracemalloc.start()
+    fn(path)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return metrics, elapsed, peak / 1e6
+
+def rounded(by_month: dict):
+    return {month: {key: round(value, 2) for key, value in totals.items()} for month, totals in by_month.items()}
+
+def main(sizes):
+    workdir = tempfile.mkdtemp()
+    print(f"{'rows':>9} {'read_excel s':>13} {'MB':>7} {'streaming s':>12} {'MB':>7} {'speedup':>8}")
+    for rows in sizes:
+        path = os.path.join(workdir, f"ledger_{rows}.xlsx")
+        write_workbook(path, rows)
+
+        baseline, baseline_time, baseline_peak = measure(read_excel_path, path)
+        streamed, streamed_time, streamed_peak = measure(stream_financial_statement, path)
+        assert round(baseline["revenue"], 2) == round(streamed["revenue"], 2)
+        assert rounded(baseline["by_month"]) == rounded(streamed["by_month"])
+
+        print(f"{rows:>9,} {baseline_time:>13.2f} {baseline_peak:>7.0f} {streamed_time:>12.2f} {streamed_peak:>7.0f}"
+              f" {baseline_time / streamed_time:>7.1f}x")
+
+if __name__ == "__main__":
+    main([int(arg) for arg in sys.argv[1:]] or [100_000, 250_000])
@@ -0,0 +1,41 @@
+"""
+Cash-flow forecasting over synthetic ledgers (benchmarks/ledgers.py) of
+growing size: the ledger is written, converted to the columnar store and
+read back once, then forecast_columns (recurring detection, rolling
+anomalies and the projection) is timed on its columns.
+
+Run from the backend folder:
+    python benchmarks/bench_forecast.py [rows ...]
+"""
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+WORKDIR = tempfile.mkdtemp(prefix="finpulse-forecast-")
+os.chdir(WORKDIR)
+
+from ledgers import write_ledger
+from services.ledger_store import convert_ledger
+from services.rollups import dated_columns
+from services.forecasting import forecast_columns
+
+def main(sizes: list):
+    print(f"{'rows':>10} {'days':>6} {'median ms':>10} {'recurring':>10} {'anomalies':>10}")
+    for rows in sizes:
+        path, _ = convert_ledger(write_ledger(os.path.join(WORKDIR, f"ledger_{rows}.csv"), rows))
+        columns = dated_columns(path)
+        forecast_columns(columns)  # warm-up
+        timings = []
+        for _ in range(5):
+            start = time.perf_counter()
+            forecast = forecast_columns(columns)
+            timings.append(time.perf_counter() - start)
+        timings.sort()
+        print(f"{rows:>10,} {forecast['history_days']:>6} {timings[2] * 1000:>10.1f} "
+              f"{len(forecast['recurring']):>10} {forecast['anomaly_count']:>10}")
+
+if __name__ == "__main__":
+    main([int(value) for value in sys.argv[1:]] or [10_000, 100_000, 1_000_000])
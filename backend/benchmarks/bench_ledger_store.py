@@ -0,0 +1,61 @@
+"""
+Recomputing metrics for a company's upload history: re-parsing the original
+CSVs vs reading the memory-mapped Arrow copies from the ledger store.
+
+Run from the backend folder (writes to a temporary directory):
+    python benchmarks/bench_ledger_store.py [--uploads 12] [--rows 100000]
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+workdir = tempfile.mkdtemp()
+os.environ["LEDGER_STORE_DIR"] = os.path.join(workdir, "ledgers")
+
+from bench_metrics import make_ledger
+from services.ledger_store import convert_ledger, load_ledger_metrics
+from services.parser import stream_financial_statement
+from services.metrics import merge_ledger_metrics, empty_ledger_metrics
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--uploads", type=int, default=12)
+    parser.add_argument("--rows", type=int, default=100_000)
+    args = parser.parse_args()
+
+    sources = []
+    for index in range(args.uploads):
+        path = os.path.join(workdir, f"upload_{index}.csv")
+        make_ledger(args.rows, seed=index).to_csv(path, index=False)
+        sources.append(path)
+
+    start = time.perf_counter()
+    stored = [convert_ledger(path)[0] for path in sources]
+    convert = time.perf_counter() - start
+
+    start = time.perf_counter()
+    total = empty_ledger_metrics()
+    for path in sources:
+        merge_ledger_metrics(total, stream_financial_statement(path))
+    reparse = time.perf_counter() - start
+
+    start = time.perf_counter()
+    history = load_ledger_metrics(*stored)
+    mapped = time.perf_counter() - start
+
+    assert round(history["revenue"], 2) == round(total["revenue"], 2)
+    csv_bytes = sum(os.path.getsize(path) for path in sources)
+    arrow_bytes = sum(os.path.getsize(path) for path in stored)
+    rows = args.uploads * args.rows
+
+    print(f"{args.uploads} uploads, {rows:,} rows; CSV {csv_bytes / 1e6:.1f} MB, Arrow {arrow_bytes / 1e6:.1f} MB")
+    print(f"one-time conversion     {convert:8.2f}s")
+    print(f"re-parse CSV history    {reparse:8.2f}s  {rows / reparse:>12,.0f} rows/s")
+    print(f"memory-mapped history   {mapped:8.2f}s  {rows / mapped:>12,.0f} rows/s  ({reparse / mapped:.1f}x)")
+
+if __name__ == "__main__":
+    main()
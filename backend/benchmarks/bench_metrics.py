@@ -0,0 +1,58 @@
+"""
+Rows/sec of the columnar metrics engine against the original
+list-of-dicts calculate_metrics path.
+
+Run from the backend folder:
+    python benchmarks/bench_metrics.py [rows ...]
+"""
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.metrics import frame_to_columns, compute_ledger_metrics
+
+CATEGORIES = ["Product Sales", "Consulting Services", "Office Rent", "Software Subscriptions",
+              "Marketing Ads", "Freelance Labor", "Web Hosting", "Grant Funding"]
+
+def make_ledger(rows: int, seed: int = 7):
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame({
+        "date": pd.Timestamp("2021-01-01") + pd.to_timedelta(rng.integers(0, 3 * 365, rows), unit="D"),
+        "category": rng.choice(CATEGORIES, rows),
+        "amount": rng.gamma(2.0, 800.0, rows).round(2),
+        "type": rng.choice(["Income", "Expense"], rows)
+    })
+
+def legacy_calculate_metrics(data: list):
+    # The pre-columnar implementation, kept here as the baseline.
+    df = pd.DataFrame(data)
+    total_revenue = df[df['type'].str.lower() == 'income']['amount'].sum()
+    total_expenses = df[df['type'].str.lower() == 'expense']['amount'].sum()
+    return float(total_revenue), float(total_expenses)
+
+def timed(fn, repeat: int = 3):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+def main(sizes):
+    print(f"{'rows':>10} {'legacy rows/s':>15} {'columnar rows/s':>17} {'speedup':>8}")
+    for rows in sizes:
+        df = make_ledger(rows)
+        records = df.to_dict(orient="records")
+
+        legacy = timed(lambda: legacy_calculate_metrics(records))
+        columnar = timed(lambda: compute_ledger_metrics(frame_to_columns(df)))
+
+        print(f"{rows:>10,} {rows / legacy:>15,.0f} {rows / columnar:>17,.0f} {legacy / columnar:>7.1f}x")
+
+if __name__ == "__main__":
+    main([int(arg) for arg in sys.argv[1:]] or [10_000, 100_000, 1_000_000])
@@ -0,0 +1,113 @@
+"""
+Per-company history lookups on a synthetic financial_records table, with and
+without the composite (company_id, period_end, id) index, and OFFSET vs
+keyset pagination for deep pages.
+
+Run from the backend folder (builds a throwaway SQLite DB):
+    python benchmarks/bench_pagination.py [--rows 1000000] [--companies 20000]
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+import numpy as np
+from sqlalchemy import create_engine, text
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from models import Base, FinancialRecord
+from services.pagination import keyset_page
+
+INDEX_NAME = "ix_financial_records_company_period"
+
+def populate(engine, rows: int, companies: int, batch: int = 100_000):
+    rng = np.random.default_rng(3)
+    epoch = datetime(2015, 1, 1)
+    with engine.begin() as connection:
+        connection.execute(text(
+            "INSERT INTO companies (id, name, industry, business_type) VALUES (:id, :name, 'Retail', 'SME')"
+        ), [{"id": i, "name": f"Company {i}"} for i in range(1, companies + 1)])
+
+        for start in range(0, rows, batch):
+            size = min(batch, rows - start)
+            company_ids = rng.integers(1, companies + 1, size)
+            offsets = rng.integers(0, 3650, size)
+            revenue = rng.gamma(2.0, 5000.0, size)
+            connection.execute(text(
+                "INSERT INTO financial_records (company_id, period_start, period_end, revenue, cogs, opex, net_profit,"
+                " assets, liabilities, equity) VALUES (:company_id, :period_end, :period_end, :revenue, 0, 0, :revenue, 0, 0, 0)"
+            ), [
+                {"company_id": int(c), "period_end": epoch + timedelta(days=int(o)), "revenue": float(r)}
+                for c, o, r in zip(company_ids, offsets, revenue)
+            ])
+
+def timed(fn, repeat: int = 20):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - start) / repeat * 1000
+
+def history_queries(session, company_id: int, limit: int = 20):
+    base = session.query(FinancialRecord).filter(FinancialRecord.company_id == company_id)
+    columns = [FinancialRecord.period_end, FinancialRecord.id]
+
+    first_page = lambda: keyset_page(base, columns, None, limit, descending=True)
+
+    # Walk to the last page once to get a deep keyset cursor.
+    cursor, pages = None, 0
+    while True:
+        _, next_cursor = keyset_page(base, columns, cursor, limit, descending=True)
+        if not next_cursor:
+            break
+        cursor, pages = next_cursor, pages + 1
+    deep_keyset = lambda: keyset_page(base, columns, cursor, limit, descending=True)
+    deep_offset = lambda: base.order_by(FinancialRecord.period_end.desc(), FinancialRecord.id.desc()) \
+        .offset(pages * limit).limit(limit).all()
+
+    return {
+        "first page": timed(first_page),
+        f"page {pages + 1} (keyset)": timed(deep_keyset),
+        f"page {pages + 1} (offset)": timed(deep_offset)
+    }
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--companies", type=int, default=20_000)
+    args = parser.parse_args()
+
+    path = os.path.join(tempfile.mkdtemp(), "bench.db")
+    engine = create_engine(f"sqlite:///{path}")
+    Base.metadata.create_all(bind=engine)
+
+    start = time.perf_counter()
+    populate(engine, args.rows, args.companies)
+    print(f"populated {args.rows:,} records for {args.companies:,} companies in {time.perf_counter() - start:.1f}s")
+
+    from sqlalchemy.orm import sessionmaker
+    session = sessionmaker(bind=engine)()
+    # The busiest tenant has the deepest history.
+    company_id = session.execute(text(
+        "SELECT company_id FROM financial_records GROUP BY company_id ORDER BY COUNT(*) DESC LIMIT 1"
+    )).scalar()
+
+    with engine.begin() as connection:
+        connection.execute(text(f"DROP INDEX {INDEX_NAME}"))
+    without_index = history_queries(session, company_id)
+
+    with engine.begin() as connection:
+        connection.execute(text(
+            f"CREATE INDEX {INDEX_NAME} ON financial_records (company_id, period_end, id)"
+        ))
+        connection.execute(text("ANALYZE"))
+    with_index = history_queries(session, company_id)
+
+    print(f"{'query (ms)':<24} {'no index':>10} {'composite':>10}")
+    for name in with_index:
+        print(f"{name:<24} {without_index[name]:>10.2f} {with_index[name]:>10.2f}")
+
+if __name__ == "__main__":
+    main()
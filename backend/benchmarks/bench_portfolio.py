@@ -0,0 +1,93 @@
+"""
+Portfolio analytics over a synthetic book: companies spread over a few
+industries, each with a year of financial records and assessments, in a
+temporary SQLite database. Times portfolio_analytics end to end (queries
+included) against reading every company through the ORM one by one.
+
+Run from the backend folder:
+    python benchmarks/bench_portfolio.py [records]
+"""
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+os.environ["DATABASE_URL"] = f"sqlite:///{tempfile.mkdtemp(prefix='finpulse-portfolio-')}/portfolio.db"
+
+from sqlalchemy import insert
+
+from database import engine, SessionLocal
+from migrations import migrate, upgrade_schema
+from models import Company, FinancialRecord, Assessment
+from services.portfolio import portfolio_analytics
+
+INDUSTRIES = ["Retail", "Hospitality", "Manufacturing", "Services", "Technology", "Construction"]
+BUSINESS_TYPES = ["Sole trader", "Partnership", "Limited company"]
+PERIODS = 12
+
+def populate(records: int, seed: int = 7):
+    rng = np.random.default_rng(seed)
+    companies = max(records // PERIODS, 1)
+    base = rng.gamma(2.0, 20_000.0, companies)
+    margin = rng.normal(0.1, 0.15, companies)
+    start = datetime(2024, 1, 31)
+    upgrade_schema(engine)
+    with SessionLocal() as db:
+        db.execute(insert(Company), [
+            {"id": i + 1, "name": f"Company {i + 1}", "industry": INDUSTRIES[i % len(INDUSTRIES)],
+             "business_type": BUSINESS_TYPES[i % len(BUSINESS_TYPES)]}
+            for i in range(companies)
+        ])
+        revenue = np.repeat(base, PERIODS) * rng.normal(1.0, 0.2, companies * PERIODS).clip(0)
+        profit = revenue * (np.repeat(margin, PERIODS) + rng.normal(0, 0.05, companies * PERIODS))
+        scores = np.clip(np.repeat(margin * 200 + 50, PERIODS) + rng.normal(0, 8, companies * PERIODS), 0, 100)
+        rows = [
+            (company + 1, start + timedelta(days=30 * period), index)
+            for index, (company, period) in enumerate((c, p) for c in range(companies) for p in range(PERIODS))
+        ]
+        db.execute(insert(FinancialRecord), [
+            {"company_id": company_id, "period_start": period_end - timedelta(days=30), "period_end": period_end,
+             "revenue": float(revenue[i]), "opex": float(revenue[i] - profit[i]), "net_profit": float(profit[i])}
+            for company_id, period_end, i in rows
+        ])
+        db.execute(insert(Assessment), [
+            {"company_id": company_id, "created_at": period_end, "overall_score": int(scores[i]),
+             "risk_level": "Safe" if scores[i] > 60 else "Caution" if scores[i] > 30 else "Critical"}
+            for company_id, period_end, i in rows
+        ])
+        db.commit()
+    # Snapshots for every company, as at startup on an older database
+    migrate(engine, SessionLocal)
+    return companies
+
+def main(records: int):
+    start = time.perf_counter()
+    companies = populate(records)
+    print(f"{records:,} records / {companies:,} companies loaded in {time.perf_counter() - start:.1f} s")
+
+    with SessionLocal() as db:
+        portfolio_analytics(db)  # warm-up (imports pandas)
+        timings = []
+        for _ in range(5):
+            start = time.perf_counter()
+            result, _ = portfolio_analytics(db, group_by="both")
+            timings.append(time.perf_counter() - start)
+        print(f"portfolio_analytics   {min(timings) * 1000:8.1f} ms  "
+              f"({result['flagged_total']:,} flagged, {len(result['benchmarks'])} peer groups, "
+              f"{result['flag_counts']})")
+
+        # Per-company baseline over a sample, scaled up
+        sample = min(companies, 500)
+        start = time.perf_counter()
+        for company in db.query(Company).limit(sample):
+            company.financial_records[-1:], company.assessments[-2:]
+        looped = (time.perf_counter() - start) * companies / sample
+        print(f"one by one (ORM)      {looped * 1000:8.1f} ms  (estimated from {sample} companies, reads only)")
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 100_000)
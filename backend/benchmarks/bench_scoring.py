@@ -0,0 +1,65 @@
+"""
+Local scoring engine: latency of scoring one upload, and portfolio
+throughput of the vectorized rollup path against scoring companies one by
+one.
+
+Run from the backend folder:
+    python benchmarks/bench_scoring.py [companies]
+"""
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bench_metrics import make_ledger
+from services.parser import calculate_metrics
+from services.scoring import rollup_features, score_features, score_metrics
+
+def best_of(fn, repeat: int = 5):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+def make_rollups(companies: int, months: int = 24, seed: int = 7):
+    rng = np.random.default_rng(seed)
+    base = rng.gamma(2.0, 20_000.0, companies)
+    return pd.DataFrame({
+        "company_id": np.repeat(np.arange(1, companies + 1), months),
+        "month": np.tile([str(month) for month in np.arange("2023-01", "2025-01", dtype="datetime64[M]")], companies),
+        "revenue": np.repeat(base, months) * rng.normal(1.0, 0.3, companies * months).clip(0),
+        "expenses": np.repeat(base, months) * rng.normal(0.9, 0.2, companies * months).clip(0)
+    })
+
+def main(companies: int):
+    metrics = calculate_metrics(make_ledger(10_000))
+    single = best_of(lambda: score_metrics(metrics), repeat=50)
+    print(f"score_metrics (one upload, {len(metrics['by_category'])} categories, "
+          f"{len(metrics['by_month'])} months): {single * 1e6:,.0f} us")
+
+    rollups = make_rollups(companies)
+    vectorized = best_of(lambda: score_features(rollup_features(rollups)[1]))
+
+    # Per-company baseline over a sample, scaled up
+    sample = min(companies, 500)
+    grouped = [
+        {"revenue": group["revenue"].sum(), "expenses": group["expenses"].sum(),
+         "net_profit": group["revenue"].sum() - group["expenses"].sum(),
+         "by_month": {row.month: {"revenue": row.revenue, "expenses": row.expenses} for row in group.itertuples()}}
+        for _, group in rollups[rollups["company_id"] <= sample].groupby("company_id")
+    ]
+    looped = best_of(lambda: [score_metrics(entry) for entry in grouped], repeat=3) * companies / sample
+
+    print(f"portfolio of {companies:,} companies x 24 months:")
+    print(f"  one by one   {looped:8.2f} s  ({looped / companies * 1e6:,.1f} us/company)")
+    print(f"  vectorized   {vectorized:8.3f} s  ({vectorized / companies * 1e6:,.2f} us/company, "
+          f"{looped / vectorized:.0f}x)")
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 100_000)
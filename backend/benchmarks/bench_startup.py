@@ -0,0 +1,75 @@
+"""
+Cold start: a fresh interpreter importing the app, running its startup
+(migrations, job workers) and answering a first /simulate request, against
+a bare FastAPI app with one route. Also lists the heavy modules that are
+already loaded at that point; the upload pipeline's (pandas, pyarrow,
+google.generativeai) should only appear after the first upload.
+
+Run from the backend folder:
+    python benchmarks/bench_startup.py [runs]
+"""
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+HEAVY_MODULES = ["numpy", "pandas", "pyarrow", "openpyxl", "google.generativeai"]
+
+APP_PROBE = """
+import json, sys, time
+start = time.perf_counter()
+import main
+imported = time.perf_counter()
+from fastapi.testclient import TestClient
+with TestClient(main.app) as client:
+    started = time.perf_counter()
+    client.post("/simulate", json={"base_metrics": {"revenue": 1000, "expenses": 800, "net_profit": 200},
+                                   "modifiers": {"revenue_growth": 0.1}, "company_info": {}}).raise_for_status()
+    answered = time.perf_counter()
+    loaded = [name for name in HEAVY if name in sys.modules]
+print(json.dumps({"import": imported - start, "startup": started - imported, "first_request": answered - started,
+                  "total": answered - start, "loaded": loaded}))
+"""
+
+BASELINE_PROBE = """
+import json, time
+start = time.perf_counter()
+from fastapi import FastAPI
+import sqlalchemy.orm
+app = FastAPI()
+@app.post("/simulate")
+def simulate(body: dict):
+    return body
+imported = time.perf_counter()
+from fastapi.testclient import TestClient
+with TestClient(app) as client:
+    started = time.perf_counter()
+    client.post("/simulate", json={}).raise_for_status()
+    answered = time.perf_counter()
+print(json.dumps({"import": imported - start, "startup": started - imported, "first_request": answered - started,
+                  "total": answered - start, "loaded": []}))
+"""
+
+def run(probe: str, workdir: str):
+    env = dict(os.environ, DATABASE_URL=f"sqlite:///{workdir}/startup.db", GEMINI_API_KEY="",
+               PYTHONPATH=BACKEND_DIR)
+    output = subprocess.run([sys.executable, "-c", f"HEAVY = {HEAVY_MODULES!r}\n{probe}"], cwd=workdir, env=env,
+                            capture_output=True, text=True, check=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+def main(runs: int):
+    workdir = tempfile.mkdtemp(prefix="finpulse-startup-")
+    for name, probe in (("bare FastAPI", BASELINE_PROBE), ("FinPulse API", APP_PROBE)):
+        results = [run(probe, workdir) for _ in range(runs)]
+        medians = {key: statistics.median(result[key] for result in results)
+                   for key in ("import", "startup", "first_request", "total")}
+        print(f"{name:<14} import {medians['import'] * 1000:7.0f} ms  startup {medians['startup'] * 1000:6.0f} ms  "
+              f"first /simulate {medians['first_request'] * 1000:6.0f} ms  total {medians['total'] * 1000:7.0f} ms")
+        if results[-1]["loaded"]:
+            print(f"{'':<14} loaded: {', '.join(results[-1]['loaded'])}")
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 5)
@@ -0,0 +1,79 @@
+"""
+Synthetic ledgers shaped like the sample files in the repository root
+(test_financials*.csv): the same categories, income/expense mix, category
+frequencies and amount ranges, scaled to any number of rows.
+
+    from ledgers import synthetic_ledger, write_ledger
+    frame = synthetic_ledger(100_000, profile="struggling")
+    write_ledger("ledger.csv", 100_000)
+"""
+import glob
+import os
+from functools import lru_cache
+
+import numpy as np
+import pandas as pd
+
+SAMPLES_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+# Spread of generated amounts around each category's sample amounts (log scale)
+AMOUNT_SIGMA = 0.35
+
+@lru_cache(maxsize=None)
+def load_profiles():
+    """
+    Profile name ("default", "freelancer", "profitable", "struggling") ->
+    frame with one row per (category, type): its share of rows, log-mean
+    amount and rows per month in the sample.
+    """
+    profiles = {}
+    for path in sorted(glob.glob(os.path.join(SAMPLES_DIR, "test_financials*.csv"))):
+        name = os.path.basename(path)[len("test_financials"):-len(".csv")].lstrip("_") or "default"
+        sample = pd.read_csv(path)
+        sample.columns = [c.lower() for c in sample.columns]
+        months = max(pd.to_datetime(sample["date"]).dt.to_period("M").nunique(), 1)
+        grouped = sample.groupby(["category", "type"])["amount"]
+        profiles[name] = pd.DataFrame({
+            "share": grouped.size() / len(sample),
+            "log_amount": np.log(grouped.mean().clip(lower=1.0)),
+            "rows_per_month": len(sample) / months
+        }).reset_index()
+    if not profiles:
+        raise FileNotFoundError(f"No test_financials*.csv samples in {SAMPLES_DIR}")
+    return profiles
+
+def synthetic_ledger(rows: int, profile: str = "mixed", seed: int = 7, start: str = "2021-01-01"):
+    """
+    `rows` ledger rows (Date, Category, Amount, Type) drawn from one sample
+    profile, or from all of them with "mixed". Dates cover as many months as
+    the sample's rows-per-month rate implies for a small business, at most
+    five years, so monthly totals stay realistic as the ledger grows.
+    """
+    profiles = load_profiles()
+    shape = pd.concat(profiles.values(), ignore_index=True) if profile == "mixed" else profiles[profile]
+    shape = shape.assign(share=shape["share"] / shape["share"].sum())
+    rng = np.random.default_rng(seed)
+
+    picks = rng.choice(len(shape), size=rows, p=shape["share"].to_numpy())
+    amounts = np.exp(shape["log_amount"].to_numpy()[picks] + rng.normal(0.0, AMOUNT_SIGMA, rows)).round(2)
+    months = int(np.clip(rows / shape["rows_per_month"].mean(), 1, 60))
+    days = rng.integers(0, months * 30, rows)
+    dates = (pd.Timestamp(start) + pd.to_timedelta(np.sort(days), unit="D"))
+
+    return pd.DataFrame({
+        "Date": dates.strftime("%Y-%m-%d"),
+        "Category": shape["category"].to_numpy()[picks],
+        "Amount": amounts,
+        "Type": shape["type"].to_numpy()[picks]
+    })
+
+def write_ledger(path: str, rows: int, profile: str = "mixed", seed: int = 7):
+    """
+    Writes a synthetic ledger as CSV or .xlsx (by extension) and returns the
+    path.
+    """
+    frame = synthetic_ledger(rows, profile, seed)
+    if path.lower().endswith(".xlsx"):
+        frame.to_excel(path, index=False)
+    else:
+        frame.to_csv(path, index=False)
+    return path
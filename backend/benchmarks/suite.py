@@ -0,0 +1,289 @@
+"""
+Reproducible benchmark suite for the backend hot paths. Everything runs in
+process: a temporary working directory and SQLite database, the fake LLM
+from services.llm_stub, and synthetic ledgers shaped like the
+test_financials*.csv samples (benchmarks/ledgers.py).
+
+Cases: parser throughput (CSV and .xlsx) across file sizes,
+calculate_metrics, the simulator at batch scale, /upload latency through
+the ASGI test client, and concurrent uploads/simulations. Each case is
+timed over several rounds (pytest-benchmark style min/median/mean/stddev)
+and the run is written to JSON with the git commit, so two runs can be
+compared.
+
+Run from the backend folder:
+    python benchmarks/suite.py [--quick] [--only parser,upload] [--output results.json]
+    python benchmarks/suite.py --compare baseline.json [--threshold 0.15]
+    python benchmarks/suite.py --diff baseline.json results.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+# Isolated state, set before any backend module reads its configuration:
+# uploads/ and the ledger store are relative to the working directory.
+WORKDIR = tempfile.mkdtemp(prefix="finpulse-bench-")
+os.environ["DATABASE_URL"] = f"sqlite:///{WORKDIR}/bench.db"
+os.environ["GEMINI_API_KEY"] = ""
+os.environ.pop("AI_CACHE_SQLITE_PATH", None)
+os.environ.pop("COLUMN_MAPPING_CACHE_PATH", None)
+os.chdir(WORKDIR)
+
+import numpy as np
+
+from ledgers import synthetic_ledger, write_ledger
+
+# Rows per ledger for the size sweeps
+SIZES = {
+    "quick": {"csv": [10_000, 100_000], "xlsx": [10_000], "metrics": [10_000, 100_000]},
+    "full": {"csv": [10_000, 100_000, 1_000_000], "xlsx": [10_000, 100_000], "metrics": [10_000, 100_000, 1_000_000]}
+}
+
+def benchmark(fn, rounds: int = 5, warmup: int = 1, setup=None):
+    """
+    Times `fn` over `rounds` calls after `warmup` untimed ones. `setup(i)`,
+    if given, runs untimed before each call and its result is passed to fn.
+    Returns stats in seconds.
+    """
+    timings = []
+    for i in range(warmup + rounds):
+        argument = setup(i) if setup else None
+        start = time.perf_counter()
+        fn(argument) if setup else fn()
+        elapsed = time.perf_counter() - start
+        if i >= warmup:
+            timings.append(elapsed)
+    return summarize(timings)
+
+def summarize(timings: list):
+    return {
+        "rounds": len(timings),
+        "min": min(timings),
+        "max": max(timings),
+        "mean": statistics.fmean(timings),
+        "median": statistics.median(timings),
+        "stddev": statistics.stdev(timings) if len(timings) > 1 else 0.0,
+        "p95": float(np.percentile(timings, 95))
+    }
+
+def bench_parser(sizes: dict):
+    from services.parser import stream_financial_statement
+
+    results = {}
+    for extension in ("csv", "xlsx"):
+        for rows in sizes[extension]:
+            path = write_ledger(os.path.join(WORKDIR, f"parser_{rows}.{extension}"), rows)
+            stats = benchmark(lambda: stream_financial_statement(path), rounds=3 if rows >= 100_000 else 5)
+            stats["rows"] = rows
+            stats["rows_per_s"] = rows / stats["median"]
+            results[f"parser.{extension}[{rows}]"] = stats
+    return results
+
+def bench_metrics(sizes: dict):
+    from services.parser import calculate_metrics
+
+    results = {}
+    for rows in sizes["metrics"]:
+        frame = synthetic_ledger(rows)
+        stats = benchmark(lambda: calculate_metrics(frame.copy()), rounds=5)
+        stats["rows"] = rows
+        stats["rows_per_s"] = rows / stats["median"]
+        results[f"metrics.calculate_metrics[{rows}]"] = stats
+    return results
+
+def bench_simulator(sizes: dict):
+    from services.simulator import calculate_projection, calculate_projection_grid, project_multi_period
+
+    base = {"revenue": 40420.75, "expenses": 18455.74, "net_profit": 21965.01}
+    rng = np.random.default_rng(7)
+    modifiers = [{"revenue_growth": float(g), "expense_change": float(e)}
+                 for g, e in rng.uniform(-0.5, 0.5, (10_000, 2))]
+    spec = {"start": -0.5, "stop": 0.5, "step": 0.01}
+
+    batch = benchmark(lambda: [calculate_projection(base, m) for m in modifiers], rounds=5)
+    batch["calls"] = len(modifiers)
+    batch["calls_per_s"] = len(modifiers) / batch["median"]
+    grid = benchmark(lambda: calculate_projection_grid(base, spec, spec), rounds=5)
+    paths = benchmark(lambda: project_multi_period(base, {}, months=12, paths=10_000, seed=7), rounds=5)
+    return {
+        "simulator.calculate_projection[x10000]": batch,
+        "simulator.projection_grid[101x101]": grid,
+        "simulator.project_multi_period[12m,10000 paths]": paths
+    }
+
+def _ledger_files(count: int, rows: int, prefix: str):
+    # Distinct content per request: identical uploads would hit the ledger
+    # store and the AI cache instead of the full path.
+    files = []
+    for seed in range(count):
+        path = os.path.join(WORKDIR, f"{prefix}_{seed}.csv")
+        write_ledger(path, rows, seed=1000 + seed)
+        with open(path, "rb") as handle:
+            files.append(handle.read())
+    return files
+
+def bench_upload(sizes: dict, llm_latency: float):
+    import main
+    from fastapi.testclient import TestClient
+
+    results = {}
+    with TestClient(main.app) as client:
+        company_id = client.post("/companies/", json={
+            "name": "Bench Co", "industry": "Retail", "business_type": "Grocery"
+        }).json()["id"]
+        for rows in (1_000, 50_000):
+            files = _ledger_files(6, rows, f"upload_{rows}")
+
+            def upload(body):
+                response = client.post(f"/upload/{company_id}", files={"file": ("ledger.csv", body)})
+                assert response.status_code == 200, response.text
+
+            stats = benchmark(upload, rounds=5, setup=lambda i: files[i])
+            stats["rows"] = rows
+            stats["llm_latency"] = llm_latency
+            results[f"upload.inline[{rows}]"] = stats
+    return results
+
+async def _concurrent(app, requests: list):
+    # requests: (method, url, kwargs); all sent at once over the ASGI transport
+    import httpx
+
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench") as client:
+        async def one(method, url, kwargs):
+            start = time.perf_counter()
+            response = await client.request(method, url, **kwargs)
+            assert response.status_code == 200, response.text
+            return time.perf_counter() - start
+
+        start = time.perf_counter()
+        latencies = await asyncio.gather(*(one(*request) for request in requests))
+        return latencies, time.perf_counter() - start
+
+def bench_load(sizes: dict, llm_latency: float, concurrency: int = 32):
+    import main
+
+    # Requests go straight to the app, without its startup step
+    main.migrate(main.engine, main.SessionLocal)
+    # One company per upload: concurrent uploads for the same company race
+    # to create its first rollup months.
+    with main.SessionLocal() as session:
+        companies = [main.Company(name=f"Load Co {i}", industry="Retail", business_type="Grocery")
+                     for i in range(concurrency)]
+        session.add_all(companies)
+        session.commit()
+        company_ids = [company.id for company in companies]
+
+    results = {}
+    files = _ledger_files(concurrency, 2_000, "load")
+    uploads = [("POST", f"/upload/{company_id}", {"files": {"file": ("ledger.csv", body)}})
+               for company_id, body in zip(company_ids, files)]
+    simulations = [
+        ("POST", "/simulate", {"json": {
+            "base_metrics": {"revenue": 1000 + i, "expenses": 800, "net_profit": 200 + i},
+            "modifiers": {"revenue_growth": 0.1, "expense_change": 0.05},
+            "company_info": {"name": "Load Co"}
+        }})
+        for i in range(concurrency * 2)
+    ]
+    for name, requests in (("load.upload", uploads), ("load.simulate", simulations)):
+        latencies, wall = asyncio.run(_concurrent(main.app, requests))
+        stats = summarize(latencies)
+        stats.update(concurrency=len(requests), wall=wall, requests_per_s=len(requests) / wall,
+                     llm_latency=llm_latency)
+        results[f"{name}[x{len(requests)}]"] = stats
+    return results
+
+CASES = {
+    "parser": bench_parser,
+    "metrics": bench_metrics,
+    "simulator": bench_simulator,
+    "upload": bench_upload,
+    "load": bench_load
+}
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=BACKEND_DIR, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def compare(baseline: dict, current: dict, threshold: float):
+    """
+    Prints median time per case against a baseline run; returns the cases
+    slower by more than `threshold` (e.g. 0.15 = 15%).
+    """
+    regressions = []
+    print(f"\n{'case':<48} {'baseline ms':>12} {'current ms':>12} {'change':>8}")
+    for name, stats in current["cases"].items():
+        before = baseline["cases"].get(name)
+        if not before:
+            print(f"{name:<48} {'-':>12} {stats['median'] * 1000:>12.2f} {'new':>8}")
+            continue
+        change = stats["median"] / before["median"] - 1
+        flag = " !" if change > threshold else ""
+        print(f"{name:<48} {before['median'] * 1000:>12.2f} {stats['median'] * 1000:>12.2f} {change:>+7.1%}{flag}")
+        if change > threshold:
+            regressions.append(name)
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--quick", action="store_true", help="Smaller ledgers (CI-sized run)")
+    parser.add_argument("--only", help=f"Comma-separated subset of: {', '.join(CASES)}")
+    parser.add_argument("--output", help="Write results JSON here (default: benchmarks/results/<commit>.json)")
+    parser.add_argument("--compare", help="Baseline results JSON to compare this run against")
+    parser.add_argument("--diff", nargs=2, metavar=("BASELINE", "CURRENT"), help="Compare two saved runs and exit")
+    parser.add_argument("--threshold", type=float, default=0.15, help="Slowdown flagged as a regression")
+    parser.add_argument("--llm-latency", type=float, default=0.05, help="Fake LLM latency in seconds")
+    args = parser.parse_args()
+
+    if args.diff:
+        with open(args.diff[0]) as before, open(args.diff[1]) as after:
+            sys.exit(1 if compare(json.load(before), json.load(after), args.threshold) else 0)
+
+    from services.ai_advisor import set_model_factory
+    from services.llm_stub import FakeGenerativeModel
+    set_model_factory(lambda: FakeGenerativeModel(latency=args.llm_latency))
+
+    sizes = SIZES["quick" if args.quick else "full"]
+    selected = args.only.split(",") if args.only else list(CASES)
+    cases = {}
+    for name in selected:
+        print(f"running {name} ...", flush=True)
+        bench = CASES[name]
+        results = bench(sizes, args.llm_latency) if name in ("upload", "load") else bench(sizes)
+        for case, stats in results.items():
+            print(f"  {case:<46} median {stats['median'] * 1000:10.2f} ms  min {stats['min'] * 1000:10.2f} ms")
+        cases.update(results)
+
+    run = {
+        "commit": git_commit(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "mode": "quick" if args.quick else "full",
+        "python": platform.python_version(),
+        "machine": f"{platform.system()} {platform.machine()} ({os.cpu_count()} cpus)",
+        "cases": cases
+    }
+    output = args.output or os.path.join(BACKEND_DIR, "benchmarks", "results", f"{run['commit'] or 'run'}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w") as handle:
+        json.dump(run, handle, indent=2)
+    print(f"\nresults written to {output}")
+
+    if args.compare:
+        with open(args.compare) as handle:
+            sys.exit(1 if compare(json.load(handle), run, args.threshold) else 0)
+
+if __name__ == "__main__":
+    main()
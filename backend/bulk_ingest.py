@@ -0,0 +1,49 @@
+"""
+Bulk-load an accountant's book of clients from a folder or zip containing
+manifest.csv (name, industry, business_type, file) and the ledger files.
+
+Companies, financial records and locally scored assessments are inserted in
+batched transactions. AI narratives are queued as `assessment` jobs and run
+by the API's job workers or by `python worker.py`.
+
+Usage (from the backend folder):
+    python bulk_ingest.py clients.zip [--processes 8] [--no-assess]
+"""
+import argparse
+import os
+import shutil
+import tempfile
+import time
+
+from database import engine, SessionLocal
+from migrations import upgrade_schema
+from services.bulk import ingest_bundle, extract_bundle
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("bundle", help="Folder or .zip with manifest.csv")
+    parser.add_argument("--processes", type=int, default=None)
+    parser.add_argument("--no-assess", action="store_true", help="Do not queue AI assessments")
+    args = parser.parse_args()
+
+    upgrade_schema(engine)
+
+    root = args.bundle
+    extracted = None
+    if args.bundle.lower().endswith(".zip"):
+        extracted = tempfile.mkdtemp(prefix="finpulse-bulk-", dir=os.path.dirname(os.path.abspath(args.bundle)))
+        root = extract_bundle(args.bundle, extracted)
+
+    start = time.perf_counter()
+    db = SessionLocal()
+    try:
+        summary = ingest_bundle(db, root, args.processes, assess=not args.no_assess)
+    finally:
+        db.close()
+        if extracted:
+            shutil.rmtree(extracted, ignore_errors=True)
+
+    print(f"Loaded {summary['companies']} companies / {summary['records']} records "
+          f"in {time.perf_counter() - start:.1f}s; queued {summary['assessment_jobs']} assessment jobs")
+    for failure in summary["failed"]:
+        print(f"FAILED {failure['name']} ({failure['file']}): {failure['error']}")
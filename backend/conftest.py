@@ -0,0 +1,68 @@
+"""
+Shared setup for the in-process tests. Run from the backend folder:
+
+    python -m pytest -q
+
+The app runs against a throwaway SQLite database and upload folder, and the
+LLM is replaced by services.llm_stub.FakeGenerativeModel, so no server,
+database or API key is needed.
+"""
+import os
+import tempfile
+
+SAMPLE_LEDGER = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "test_financials.csv")
+
+# Set before any app module reads its configuration
+WORKDIR = tempfile.mkdtemp(prefix="finpulse-tests-")
+os.environ["DATABASE_URL"] = f"sqlite:///{WORKDIR}/test.db"
+os.environ["GEMINI_API_KEY"] = ""
+os.environ.pop("AI_CACHE_SQLITE_PATH", None)
+os.environ.pop("COLUMN_MAPPING_CACHE_PATH", None)
+# uploads/ and the ledger store are relative to the working directory
+os.chdir(WORKDIR)
+
+import pytest
+from fastapi.testclient import TestClient
+
+# The other test_*.py files are scripts for a running server (python test_x.py)
+collect_ignore = ["test_concurrent_uploads.py", "test_db_connection.py", "test_simulate_endpoint.py"]
+
+@pytest.fixture(scope="session")
+def app():
+    import main
+    from services.ai_advisor import set_model_factory
+    from services.llm_stub import FakeGenerativeModel
+    set_model_factory(lambda: FakeGenerativeModel(latency=0))
+    return main.app
+
+@pytest.fixture
+def client(app):
+    # Runs the lifespan: schema migration and the in-process job workers
+    with TestClient(app) as client:
+        yield client
+
+@pytest.fixture(scope="session")
+def schema(app):
+    from database import engine
+    from migrations import upgrade_schema
+    upgrade_schema(engine)
+
+@pytest.fixture
+def db(schema):
+    # A plain session: the app's job workers are not started
+    from database import SessionLocal
+    session = SessionLocal()
+    yield session
+    session.close()
+
+@pytest.fixture
+def company(client):
+    def create(name: str = "Test Co"):
+        response = client.post("/companies/", json={"name": name, "industry": "Retail", "business_type": "Shop"})
+        return response.json()["id"]
+    return create
+
+@pytest.fixture
+def sample_ledger():
+    with open(SAMPLE_LEDGER, "rb") as handle:
+        return handle.read()
@@ -0,0 +1,199 @@
+import asyncio
+import os
+import threading
+import time
+from sqlalchemy import create_engine
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import QueuePool
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Database Setup
+SQLALCHEMY_DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./finpulse.db")
+
+# Connection pool tuning (ignored for in-memory SQLite, which needs a single connection)
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+# Recycle before typical server/proxy idle timeouts (e.g. PgBouncer, Supabase) drop the socket.
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))
+DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "true").lower() in ("1", "true", "yes")
+
+class PoolStats:
+    """
+    Checkout counters and wait times, updated by InstrumentedQueuePool.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.checkouts = 0
+        self.timeouts = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+
+    def record(self, waited: float, timed_out: bool = False):
+        with self._lock:
+            if timed_out:
+                self.timeouts += 1
+                return
+            self.checkouts += 1
+            self.total_wait += waited
+            self.max_wait = max(self.max_wait, waited)
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                "checkouts": self.checkouts,
+                "timeouts": self.timeouts,
+                "avg_wait_ms": self.total_wait / self.checkouts * 1000 if self.checkouts else 0.0,
+                "max_wait_ms": self.max_wait * 1000
+            }
+
+pool_stats = PoolStats()
+
+class InstrumentedQueuePool(QueuePool):
+    """
+    QueuePool that records how long each checkout waited for a connection.
+    """
+
+    def connect(self):
+        start = time.perf_counter()
+        try:
+            connection = super().connect()
+        except Exception:
+            pool_stats.record(time.perf_counter() - start, timed_out=True)
+            raise
+        pool_stats.record(time.perf_counter() - start)
+        return connection
+
+def _engine_options(url: str):
+    options = {}
+    if "sqlite" in url:
+        # Handle arguments based on DB type (Postgres doesn't support check_same_thread)
+        options["connect_args"] = {"check_same_thread": False}
+        if ":memory:" in url or url.rstrip("/").endswith("sqlite:"):
+            return options
+    options.update(
+        poolclass=InstrumentedQueuePool,
+        pool_size=DB_POOL_SIZE,
+        max_overflow=DB_MAX_OVERFLOW,
+        pool_timeout=DB_POOL_TIMEOUT,
+        pool_recycle=DB_POOL_RECYCLE,
+        pool_pre_ping=DB_POOL_PRE_PING
+    )
+    return options
+
+engine = create_engine(SQLALCHEMY_DATABASE_URL, **_engine_options(SQLALCHEMY_DATABASE_URL))
+# expire_on_commit=False keeps loaded rows usable after a commit without a
+# reload, so handlers do not silently re-acquire a connection (and hold it
+# through slow work like LLM calls) just to read attributes back.
+SessionLocal = sessionmaker(autocommit=False, autoflush=False, expire_on_commit=False, bind=engine)
+
+def get_db():
+    db = SessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
+
+async def run_db(fn, *args, **kwargs):
+    """
+    Runs a sync Session call in a worker thread, off the event loop. When
+    the awaiting task is cancelled the call still runs to the end before
+    the cancellation propagates: the caller's cleanup (closing the session)
+    must not run in parallel with, say, a commit in progress.
+    """
+    call = asyncio.ensure_future(asyncio.to_thread(fn, *args, **kwargs))
+    cancelled = False
+    while not call.done():
+        try:
+            await asyncio.wait([call])
+        except asyncio.CancelledError:
+            cancelled = True
+    if cancelled:
+        raise asyncio.CancelledError()
+    return call.result()
+
+def conflict_insert(db, table):
+    """
+    INSERT for `table` in the session's dialect, which supports
+    on_conflict_do_nothing / on_conflict_do_update (Postgres and SQLite).
+    """
+    if db.get_bind().dialect.name == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+    else:
+        from sqlalchemy.dialects.sqlite import insert
+    return insert(table)
+
+# Async drivers for the same database
+ASYNC_DRIVERS = {"sqlite": "sqlite+aiosqlite", "postgresql": "postgresql+asyncpg", "postgres": "postgresql+asyncpg"}
+
+def async_url(url: str):
+    """
+    DATABASE_URL with its async driver: aiosqlite for SQLite, asyncpg for
+    Postgres. libpq's sslmode (e.g. Supabase URLs) becomes asyncpg's ssl.
+    """
+    scheme, rest = url.split("://", 1)
+    backend = scheme.split("+", 1)[0]
+    if backend in ("postgresql", "postgres"):
+        rest = rest.replace("sslmode=", "ssl=")
+    return f"{ASYNC_DRIVERS.get(backend, scheme)}://{rest}"
+
+# Async engine for the endpoints that use get_async_db. Override with
+# ASYNC_DATABASE_URL when the derived URL does not fit (an in-memory SQLite
+# database is not shared between the two engines).
+ASYNC_DATABASE_URL = os.getenv("ASYNC_DATABASE_URL") or async_url(SQLALCHEMY_DATABASE_URL)
+
+def _async_engine_options(url: str):
+    # Same pool sizing as the sync engine; asyncio engines use their own
+    # queue pool class, so checkout waits are not instrumented here.
+    if "sqlite" in url and (":memory:" in url or url.rstrip("/").endswith("sqlite+aiosqlite:")):
+        return {}
+    return {
+        "pool_size": DB_POOL_SIZE,
+        "max_overflow": DB_MAX_OVERFLOW,
+        "pool_timeout": DB_POOL_TIMEOUT,
+        "pool_recycle": DB_POOL_RECYCLE,
+        "pool_pre_ping": DB_POOL_PRE_PING
+    }
+
+async_engine = create_async_engine(ASYNC_DATABASE_URL, **_async_engine_options(ASYNC_DATABASE_URL))
+AsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+
+async def get_async_db():
+    """
+    get_db for async handlers: queries are awaited on the event loop
+    instead of blocking it (or taking a threadpool slot). Sync helpers that
+    take a Session run through `await db.run_sync(fn, ...)`.
+    """
+    async with AsyncSessionLocal() as db:
+        yield db
+
+def pool_metrics():
+    pool = engine.pool
+    metrics = {"class": type(pool).__name__}
+    if isinstance(pool, QueuePool):
+        metrics.update(
+            size=pool.size(),
+            checked_in=pool.checkedin(),
+            checked_out=pool.checkedout(),
+            overflow=pool.overflow(),
+            max_overflow=DB_MAX_OVERFLOW,
+            **pool_stats.snapshot()
+        )
+    return metrics
+
+def async_pool_metrics():
+    pool = async_engine.pool
+    metrics = {"class": type(pool).__name__}
+    if isinstance(pool, QueuePool):
+        metrics.update(
+            size=pool.size(),
+            checked_in=pool.checkedin(),
+            checked_out=pool.checkedout(),
+            overflow=pool.overflow(),
+            max_overflow=DB_MAX_OVERFLOW
+        )
+    return metrics
@@ -1,41 +1,85 @@
-from fastapi import FastAPI, UploadFile, File, HTTPException, Depends
+from fastapi import FastAPI, UploadFile, File, HTTPException, Depends, Query, Request, Header
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, PlainTextResponse, Response, StreamingResponse
+from fastapi.encoders import jsonable_encoder
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import select, text
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
-from typing import List
+from contextlib import asynccontextmanager
+from typing import Dict, List, Optional, Union
+import asyncio
+import json
 import os
 import shutil
+import uuid
+import zipfile
 
-from models import Base, Company, FinancialRecord, Assessment
-from schemas import CompanyCreate, Company as CompanySchema, Assessment as AssessmentSchema
-from services.parser import parse_financial_statement, calculate_metrics
-from services.ai_advisor import get_financial_advice
-from services.simulator import calculate_projection, analyze_scenario
-from pydantic import BaseModel
-
-# Database Setup
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker
-
-from dotenv import load_dotenv
+from models import Company, FinancialRecord, Assessment, Job, MonthlyRollup, CompanySnapshot, CompanyForecast
+from schemas import (
+    CompanyCreate,
+    Company as CompanySchema,
+    CompanyPage,
+    FinancialRecordPage,
+    AssessmentPage,
+    MonthlyRollup as MonthlyRollupSchema,
+    CompanySnapshot as CompanySnapshotSchema,
+    CompanySnapshotPage,
+    CompanyForecastPage,
+    Job as JobSchema
+)
+from services.jobs import JobQueue, create_job
+from services.simulator import (
+    calculate_projection,
+    calculate_projection_grid,
+    project_multi_period,
+    analyze_scenario_async,
+    stream_scenario,
+    MONTE_CARLO_PATHS
+)
+from services.cache import ai_cache, mapping_cache
+from services.ai_advisor import llm_available
+from services.telemetry import MetricsMiddleware, registry, span
+from services.snapshots import snapshot_etag
+from services.pagination import keyset_page_async, DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE
+from pydantic import BaseModel, Field
 
-load_dotenv()
+from database import (
+    engine, SessionLocal, get_db, async_engine, get_async_db, run_db, pool_metrics, async_pool_metrics
+)
+from migrations import migrate
 
-# Database Setup
-SQLALCHEMY_DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./finpulse.db")
+# Bring the schema up to date when the app starts. Set to false when
+# deployments run `python migrations.py` as a separate release step.
+AUTO_MIGRATE = os.getenv("AUTO_MIGRATE", "true").lower() in ("1", "true", "yes")
 
-# Handle arguments based on DB type (Postgres doesn't support check_same_thread)
-connect_args = {"check_same_thread": False} if "sqlite" in SQLALCHEMY_DATABASE_URL else {}
+# The upload pipeline (pandas, pyarrow, the AI client) is imported on first
+# use rather than with the app, so workers that only serve e.g. /simulate
+# start close to a bare FastAPI app.
+def _job_handlers():
+    from services.pipeline import JOB_HANDLERS
+    return JOB_HANDLERS
 
-engine = create_engine(SQLALCHEMY_DATABASE_URL, connect_args=connect_args)
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+# Background workers for uploads submitted with ?background=true
+job_queue = JobQueue(SessionLocal, _job_handlers)
 
-Base.metadata.create_all(bind=engine)
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    if AUTO_MIGRATE:
+        migrate(engine, SessionLocal)
+    await job_queue.start()
+    yield
+    await job_queue.stop()
+    await async_engine.dispose()
 
-app = FastAPI(title="FinPulse API", description="SME Financial Health Assessment Platform")
+app = FastAPI(title="FinPulse API", description="SME Financial Health Assessment Platform", lifespan=lifespan)
 
 # CORS Setup
 origins = ["*"]
 
+# Latency/size per route for /metrics, plus the optional Server-Timing header
+app.add_middleware(MetricsMiddleware)
+
 app.add_middleware(
     CORSMiddleware,
     allow_origins=origins,
@@ -44,144 +88,355 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
-
 @app.get("/")
 def read_root():
     return {"message": "Welcome to FinPulse API"}
 
 @app.get("/health")
-def health_check(db: Session = Depends(get_db)):
+def health_check():
     try:
-        # Try to execute a simple query
-        db.execute(text("SELECT 1"))
-        return {"status": "healthy", "database": "connected"}
+        # Try to execute a simple query on a pooled connection
+        with engine.connect() as connection:
+            connection.execute(text("SELECT 1"))
+        return {"status": "healthy", "database": "connected", "pool": pool_metrics(),
+                "async_pool": async_pool_metrics()}
     except Exception as e:
-        return {"status": "unhealthy", "database": "disconnected", "error": str(e)}
+        return {"status": "unhealthy", "database": "disconnected", "error": str(e), "pool": pool_metrics(),
+                "async_pool": async_pool_metrics()}
+
+def _runtime_gauges():
+    pool = pool_metrics()
+    yield from (
+        (f"finpulse_db_pool_{name}", f"Connection pool {name.replace('_', ' ')}", [({}, value)])
+        for name, value in pool.items() if isinstance(value, (int, float))
+    )
+    async_pool = async_pool_metrics()
+    yield from (
+        (f"finpulse_db_async_pool_{name}", f"Async connection pool {name.replace('_', ' ')}", [({}, value)])
+        for name, value in async_pool.items() if isinstance(value, (int, float))
+    )
+    caches = {"ai": ai_cache.stats(), "column_mapping": mapping_cache.stats()}
+    for name in ("hits", "misses", "evictions", "size", "hit_rate"):
+        yield (f"finpulse_cache_{name}", f"Result cache {name.replace('_', ' ')}",
+               [({"cache": cache}, stats[name]) for cache, stats in caches.items()])
+
+registry.gauge_collectors.append(_runtime_gauges)
+
+@app.get("/metrics", response_class=PlainTextResponse)
+def metrics():
+    # Prometheus text exposition format
+    return PlainTextResponse(registry.render(), media_type="text/plain; version=0.0.4")
+
+@app.get("/cache/stats")
+def cache_stats():
+    return ai_cache.stats()
+
+async def _stored_upload(db: AsyncSession, company_id: int, file_location: str, idempotency_key: Optional[str]):
+    # The stored result of an earlier identical upload (same Idempotency-Key
+    # or same bytes) by this company, or None
+    from services.pipeline import find_upload, stored_digest
+
+    try:
+        with span("upload.dedup"):
+            return await db.run_sync(find_upload, company_id, stored_digest(file_location), idempotency_key)
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    finally:
+        await db.commit()
 
 @app.post("/upload/{company_id}")
-async def upload_financial_statement(company_id: int, file: UploadFile = File(...), db: Session = Depends(get_db)):
-    # 1. Save File
-    file_location = f"uploads/{file.filename}"
-    os.makedirs("uploads", exist_ok=True)
-    with open(file_location, "wb") as buffer:
-        shutil.copyfileobj(file.file, buffer)
-        
-    # 2. Parse File
+async def upload_financial_statement(company_id: int, file: UploadFile = File(...), background: bool = False,
+                                     narrative: str = Query("inline", pattern="^(inline|deferred|none)$"),
+                                     idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key",
+                                                                             max_length=255),
+                                     db: AsyncSession = Depends(get_async_db)):
+    """
+    `narrative` controls the AI write-up; the score is always computed
+    locally. "deferred" returns the scored assessment right away and queues
+    the AI narrative as an `assessment` job; "none" skips it.
+
+    A file this company already uploaded (or a retry with the same
+    `Idempotency-Key` header) returns the stored record and assessment with
+    status "duplicate", without parsing, writing or calling the LLM again.
+    """
+    from services.pipeline import save_upload, process_upload
+
+    company = await db.get(Company, company_id)
+    if not company:
+        raise HTTPException(status_code=404, detail="Company not found")
+    # End the read transaction so the pooled connection is not held while
+    # the file is written and parsed.
+    await db.commit()
+
+    # 1. Save File (content-addressed: a repeat lands on the same path)
+    with span("upload.save"):
+        file_location = await run_in_threadpool(save_upload, file.file, file.filename)
+    stored = await _stored_upload(db, company_id, file_location, idempotency_key)
+    if stored:
+        return stored
+
+    # With ?background=true the rest runs on the job workers; poll /jobs/{id}.
+    if background:
+        job = await db.run_sync(create_job, "upload", company_id, {
+            "file_location": file_location, "narrative": narrative != "none", "idempotency_key": idempotency_key
+        })
+        job_queue.submit(job.id)
+        return JSONResponse(status_code=202, content={"status": "queued", "job_id": job.id})
+
+    # 2-5. Parse, store, assess. The pipeline is shared with the job workers
+    # and keeps its writes on a sync session, run off the event loop.
+    session = SessionLocal()
     try:
-        # Re-open file for parsing since it was consumed
-        with open(file_location, "rb") as f:
-            # Create a mock UploadFile for the parser (hacky but works for MVP)
-             # Ideally service accepts bytes or path. 
-             # Let's update service to read from path or handle it here.
-             # Actually, let's just use the parser logic here to keep it simple or fix parser.
-             pass
-    except Exception as e:
+        result = await process_upload(session, company, file_location, narrative=narrative == "inline",
+                                      idempotency_key=idempotency_key)
+    except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
-    
-    # Let's fix parser usage. We'll pass the file object before closing it? 
-    # Or better, just rewrite parser to take bytes.
-    # For now, let's just restart the file cursor to read again
-    file.file.seek(0)
-    parsed_data = await parse_financial_statement(file)
-    metrics = calculate_metrics(parsed_data)
-    
-    # 3. Save Record
-    company = db.query(Company).filter(Company.id == company_id).first()
-    if not company:
+    finally:
+        await run_db(session.close)
+    if result["status"] == "duplicate":
+        # A concurrent retry stored it first
+        return result
+
+    if narrative == "deferred" and llm_available():
+        job = await db.run_sync(create_job, "assessment", company_id, {
+            "metrics": jsonable_encoder(result["metrics"]), "record_id": result["record_id"]
+        })
+        job_queue.submit(job.id)
+        result["narrative_job_id"] = job.id
+    return result
+
+def _event_stream(events):
+    # Server-sent events from an async iterator of (event, data) pairs
+    async def body():
+        async for event, data in events:
+            yield f"event: {event}\ndata: {json.dumps(jsonable_encoder(data))}\n\n"
+    # X-Accel-Buffering stops nginx-style proxies from holding the stream back
+    return StreamingResponse(body(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+@app.post("/upload/{company_id}/stream")
+async def upload_financial_statement_stream(company_id: int, file: UploadFile = File(...),
+                                            idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key",
+                                                                                    max_length=255),
+                                            db: AsyncSession = Depends(get_async_db)):
+    """
+    /upload as server-sent events: `metrics` (metrics, rollups and the
+    local score) as soon as the file is parsed, `narrative` pieces of the AI
+    summary as they are generated, then `assessment` once it is stored
+    (also when the client disconnects early). Parse errors arrive as an
+    `error` event; a repeated upload as a single `duplicate` event.
+    """
+    from services.pipeline import save_upload, stream_upload
+
+    if not await db.scalar(select(Company.id).where(Company.id == company_id)):
         raise HTTPException(status_code=404, detail="Company not found")
+    await db.commit()
 
-    record = FinancialRecord(
-        company_id=company_id,
-        period_start=metrics['period_start'],
-        period_end=metrics['period_end'],
-        revenue=metrics['revenue'],
-        cogs=0.0, # TODO: Extract detailed categories
-        opex=metrics['expenses'],
-        net_profit=metrics['net_profit'],
-        assets=0.0,
-        liabilities=0.0,
-        equity=0.0,
-        raw_data_path=file_location
-    )
-    db.add(record)
-    db.commit()
-    
-    # 4. Run AI Analysis
-    company_info = {
-        "name": company.name,
-        "industry": company.industry,
-        "business_type": company.business_type
-    }
-    
-    print(f"----- CALCULATED METRICS FOR AI -----\n{metrics}\n-------------------------------------")
-    ai_result = get_financial_advice(metrics, company_info)
-    
-    # 5. Save Assessment
-    # Handle error in AI result
-    if isinstance(ai_result, dict) and "error" in ai_result:
-        # Log error but don't fail, maybe just save basic
-        assessment = Assessment(
-            company_id=company_id,
-            overall_score=0,
-            risk_level="Unknown",
-            summary_report="AI Analysis Failed: " + ai_result["error"],
-            recommendations="[]"
-        )
-    else:
-        # Parse JSON from AI (assuming strict format or use robust parser)
-        # For valid JSON string response
-        import json
-        try:
-            # Clean md code blocks if any
-            clean_json = ai_result.replace("```json", "").replace("```", "")
-            data = json.loads(clean_json)
-            assessment = Assessment(
-                company_id=company_id,
-                overall_score=100 - data.get('risk_score', 0), # Inverting for Health Score (0 Risk -> 100 Health)
-                risk_level="Calculated", 
-                summary_report=data.get('executive_summary', ''),
-                recommendations=json.dumps(data.get('recommendations', []))
-            )
-        except:
-             assessment = Assessment(
-                company_id=company_id,
-                overall_score=50,
-                risk_level="Parse Error",
-                summary_report=ai_result, # Save raw text
-                recommendations="[]"
-            )
-
-    db.add(assessment)
-    db.commit()
+    with span("upload.save"):
+        file_location = await run_in_threadpool(save_upload, file.file, file.filename)
+    stored = await _stored_upload(db, company_id, file_location, idempotency_key)
+    if stored:
+        async def duplicate():
+            yield "duplicate", stored
+        return _event_stream(duplicate())
+    # The stream opens its own sessions: it outlives this request's.
+    return _event_stream(stream_upload(SessionLocal, company_id, file_location, idempotency_key))
 
-    return {
-        "status": "success", 
-        "metrics": metrics, 
-        "assessment": {
-            "score": assessment.overall_score,
-            "risk": assessment.risk_level,
-            "summary": assessment.summary_report,
-            "recommendations": assessment.recommendations
-        }
-    }
+@app.post("/bulk/upload")
+async def bulk_upload(file: UploadFile = File(...), assess: bool = True, db: AsyncSession = Depends(get_async_db)):
+    """
+    Onboards many companies at once from a zip holding manifest.csv (name,
+    industry, business_type, file) plus the ledgers it references. Runs as a
+    background job; AI assessments are queued as separate, throttled jobs.
+    """
+    from services.pipeline import save_upload, UPLOAD_DIR
+    from services.bulk import extract_bundle, read_manifest
+
+    # Copying, extracting and scanning a bundle of up to BULK_MAX_BUNDLE_BYTES
+    # all run in threads, so other requests are served meanwhile. The zip is
+    # saved inside this request's bundle_dir (identical bundles uploaded at
+    # once do not share it) and removed as soon as it is extracted.
+    bundle_dir = os.path.join(UPLOAD_DIR, "bulk", uuid.uuid4().hex)
+    os.makedirs(bundle_dir)
+    zip_path = await run_in_threadpool(save_upload, file.file, "bundle.zip", directory=bundle_dir)
+    try:
+        root = await run_in_threadpool(extract_bundle, zip_path, bundle_dir)
+        await run_in_threadpool(read_manifest, root)
+    except (ValueError, zipfile.BadZipFile) as e:
+        await run_in_threadpool(shutil.rmtree, bundle_dir, ignore_errors=True)
+        raise HTTPException(status_code=400, detail=str(e))
+    finally:
+        if os.path.exists(zip_path):
+            os.remove(zip_path)
+
+    # The job removes bundle_dir once the ledgers are stored
+    job = await db.run_sync(create_job, "bulk_ingest", None, {"root": root, "bundle_dir": bundle_dir,
+                                                               "assess": assess})
+    job_queue.submit(job.id)
+    return JSONResponse(status_code=202, content={"status": "queued", "job_id": job.id})
+
+@app.get("/jobs/{job_id}", response_model=JobSchema)
+async def get_job(job_id: int, db: AsyncSession = Depends(get_async_db)):
+    job = await db.get(Job, job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    schema = JobSchema.model_validate(job, from_attributes=True)
+    schema.result = json.loads(job.result) if job.result else None
+    return schema
 
 @app.post("/companies/", response_model=CompanySchema)
-def create_company(company: CompanyCreate, db: Session = Depends(get_db)):
+async def create_company(company: CompanyCreate, db: AsyncSession = Depends(get_async_db)):
     db_company = Company(**company.dict())
     db.add(db_company)
-    db.commit()
-    db.refresh(db_company)
+    await db.commit()
+    await db.refresh(db_company)
     return db_company
 
-@app.get("/companies/", response_model=List[CompanySchema])
-def get_companies(db: Session = Depends(get_db)):
-    return db.query(Company).all()
+@app.get("/companies/", response_model=CompanyPage)
+async def get_companies(cursor: Optional[str] = None, limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+                        db: AsyncSession = Depends(get_async_db)):
+    try:
+        items, next_cursor = await keyset_page_async(db, select(Company), [Company.id], cursor, limit)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"items": items, "next_cursor": next_cursor}
+
+@app.get("/companies/{company_id}/records", response_model=FinancialRecordPage)
+async def get_financial_records(company_id: int, cursor: Optional[str] = None,
+                                limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+                                db: AsyncSession = Depends(get_async_db)):
+    # Newest period first, served from ix_financial_records_company_period
+    query = select(FinancialRecord).where(FinancialRecord.company_id == company_id)
+    try:
+        items, next_cursor = await keyset_page_async(db, query, [FinancialRecord.period_end, FinancialRecord.id],
+                                                     cursor, limit, descending=True)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"items": items, "next_cursor": next_cursor}
+
+@app.get("/companies/{company_id}/assessments", response_model=AssessmentPage)
+async def get_assessments(company_id: int, cursor: Optional[str] = None,
+                          limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+                          db: AsyncSession = Depends(get_async_db)):
+    # Newest first, served from ix_assessments_company_created
+    query = select(Assessment).where(Assessment.company_id == company_id)
+    try:
+        items, next_cursor = await keyset_page_async(db, query, [Assessment.created_at, Assessment.id], cursor,
+                                                     limit, descending=True)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"items": items, "next_cursor": next_cursor}
+
+@app.get("/companies/{company_id}/rollups", response_model=List[MonthlyRollupSchema])
+async def get_monthly_rollups(company_id: int, start: Optional[str] = Query(None, pattern=r"^\d{4}-\d{2}$"),
+                              end: Optional[str] = Query(None, pattern=r"^\d{4}-\d{2}$"),
+                              db: AsyncSession = Depends(get_async_db)):
+    # Pre-aggregated per-month totals for dashboards; no ledger is re-read.
+    query = select(MonthlyRollup).where(MonthlyRollup.company_id == company_id)
+    if start:
+        query = query.where(MonthlyRollup.month >= start)
+    if end:
+        query = query.where(MonthlyRollup.month <= end)
+    return (await db.scalars(query.order_by(MonthlyRollup.month))).all()
+
+# Snapshot columns plus the company's name and industry, as flat rows
+SNAPSHOT_COLUMNS = [*CompanySnapshot.__table__.columns, Company.name, Company.industry]
+
+def _cached_json(request: Request, etag: str, content):
+    # 304 without a body when the client already holds this version
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers=headers)
+    return JSONResponse(content=jsonable_encoder(content), headers=headers)
+
+@app.get("/companies/{company_id}/snapshot", response_model=CompanySnapshotSchema)
+async def get_company_snapshot(company_id: int, request: Request, db: AsyncSession = Depends(get_async_db)):
+    # Latest score, risk and trends in one primary-key read
+    row = (await db.execute(select(*SNAPSHOT_COLUMNS).join(Company, Company.id == CompanySnapshot.company_id).where(
+        CompanySnapshot.company_id == company_id
+    ))).first()
+    if not row:
+        raise HTTPException(status_code=404, detail="Snapshot not found")
+    return _cached_json(request, snapshot_etag([(row.company_id, row.version)]),
+                        CompanySnapshotSchema.model_validate(row))
+
+@app.get("/portfolio", response_model=CompanySnapshotPage)
+async def get_portfolio(request: Request, cursor: Optional[str] = None,
+                        limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+                        risk_level: Optional[str] = None, industry: Optional[str] = None,
+                        db: AsyncSession = Depends(get_async_db)):
+    # One query per page, in company order; risk filters use ix_company_snapshots_risk
+    query = select(*SNAPSHOT_COLUMNS).join(Company, Company.id == CompanySnapshot.company_id)
+    if risk_level:
+        query = query.where(CompanySnapshot.risk_level == risk_level)
+    if industry:
+        query = query.where(Company.industry == industry)
+    try:
+        rows, next_cursor = await keyset_page_async(db, query, [CompanySnapshot.company_id], cursor, limit)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    etag = snapshot_etag([(row.company_id, row.version) for row in rows])
+    page = {"items": [CompanySnapshotSchema.model_validate(row) for row in rows], "next_cursor": next_cursor}
+    return _cached_json(request, etag, page)
+
+@app.get("/portfolio/analytics")
+def get_portfolio_analytics(request: Request,
+                            group_by: str = Query("industry", pattern="^(industry|business_type|both)$"),
+                            industry: Optional[str] = None, business_type: Optional[str] = None,
+                            limit: int = Query(100, ge=0, le=MAX_PAGE_SIZE),
+                            db: Session = Depends(get_db)):
+    """
+    Percentile ranks, peer-group benchmarks and flagged companies (burning
+    cash, slipping score, outliers) across the portfolio, computed from the
+    snapshots in one pass. `limit` caps the flagged list.
+    """
+    from services.portfolio import portfolio_analytics
+
+    with span("portfolio.analytics"):
+        result, versions = portfolio_analytics(db, group_by, industry, business_type, limit)
+    return _cached_json(request, snapshot_etag(versions), result)
+
+@app.get("/companies/{company_id}/forecast")
+def get_company_forecast(company_id: int, horizon: Optional[int] = Query(None, ge=1, le=365),
+                         db: Session = Depends(get_db)):
+    """
+    Cash-flow forecast from the company's full ledger history: recurring
+    payments and receipts on their cadence, the remaining daily cash flow
+    with a 10th-90th percentile band, and the anomalous days left out of it.
+    `horizon` defaults to FORECAST_HORIZON_DAYS (90).
+    """
+    from services.forecasting import forecast_company, FORECAST_HORIZON_DAYS
+
+    if not db.get(Company, company_id):
+        raise HTTPException(status_code=404, detail="Company not found")
+    with span("forecast"):
+        forecast = forecast_company(db, company_id, horizon or FORECAST_HORIZON_DAYS)
+    if forecast is None:
+        raise HTTPException(status_code=404, detail="No ledger history to forecast from")
+    return forecast
+
+@app.post("/forecasts/refresh")
+async def refresh_company_forecasts(horizon: Optional[int] = Query(None, ge=1, le=365),
+                                   db: AsyncSession = Depends(get_async_db)):
+    # Recomputes every company's stored forecast on the job workers; poll /jobs/{id}.
+    job = await db.run_sync(create_job, "forecast_refresh", None, {"horizon": horizon} if horizon else {})
+    job_queue.submit(job.id)
+    return JSONResponse(status_code=202, content={"status": "queued", "job_id": job.id})
+
+@app.get("/portfolio/forecasts", response_model=CompanyForecastPage)
+async def get_portfolio_forecasts(cursor: Optional[str] = None,
+                                  limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+                                  at_risk: bool = False, db: AsyncSession = Depends(get_async_db)):
+    # Stored forecasts in company order; `at_risk` keeps those whose 10th
+    # percentile net cash flow over the horizon is negative
+    query = select(CompanyForecast)
+    if at_risk:
+        query = query.where(CompanyForecast.net_low < 0)
+    try:
+        items, next_cursor = await keyset_page_async(db, query, [CompanyForecast.company_id], cursor, limit)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"items": items, "next_cursor": next_cursor}
 
 class SimulationRequest(BaseModel):
     base_metrics: dict
@@ -189,14 +444,93 @@ class SimulationRequest(BaseModel):
     company_info: dict
 
 @app.post("/simulate")
-def run_simulation(request: SimulationRequest):
+async def run_simulation(request: SimulationRequest):
     # 1. Calculate Math
     projection = calculate_projection(request.base_metrics, request.modifiers)
     
     # 2. AI Analysis
-    risk_analysis = analyze_scenario(projection, request.company_info)
+    risk_analysis = await analyze_scenario_async(projection, request.company_info)
     
     return {
         "projection": projection,
         "ai_analysis": risk_analysis
     }
+
+@app.post("/simulate/stream")
+async def run_simulation_stream(request: SimulationRequest):
+    """
+    /simulate as server-sent events: the `projection` right away, the AI
+    critique as `narrative` pieces, then `done` with the full text.
+    """
+    async def events():
+        projection = calculate_projection(request.base_metrics, request.modifiers)
+        yield "projection", projection
+        pieces = []
+        async for piece in stream_scenario(projection, request.company_info):
+            pieces.append(piece)
+            yield "narrative", {"text": piece}
+        yield "done", {"ai_analysis": "".join(pieces)}
+
+    return _event_stream(events())
+
+class ModifierRange(BaseModel):
+    start: float
+    stop: float
+    step: float = 0.01
+
+class GridSimulationRequest(BaseModel):
+    base_metrics: dict
+    revenue_growth: Union[List[float], ModifierRange]
+    expense_change: Union[List[float], ModifierRange]
+    company_info: dict = {}
+    # Only these points get an AI critique, e.g. the one the user clicked.
+    critique_points: List[Dict[str, float]] = []
+
+# AI critiques are the slow part of a grid request; keep the fan-out small.
+MAX_CRITIQUE_POINTS = 5
+
+@app.post("/simulate/grid")
+async def run_simulation_grid(request: GridSimulationRequest):
+    def as_spec(values):
+        return values.model_dump() if isinstance(values, ModifierRange) else values
+
+    if len(request.critique_points) > MAX_CRITIQUE_POINTS:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_CRITIQUE_POINTS} critique points per request")
+
+    # 1. Whole grid in one vectorized pass
+    try:
+        grid = calculate_projection_grid(request.base_metrics, as_spec(request.revenue_growth), as_spec(request.expense_change))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    # 2. AI Analysis for the selected points only
+    projections = [calculate_projection(request.base_metrics, point) for point in request.critique_points]
+    analyses = await asyncio.gather(*(analyze_scenario_async(p, request.company_info) for p in projections))
+
+    return {
+        "grid": grid,
+        "critiques": [
+            {"modifiers": point, "projection": projection, "ai_analysis": analysis}
+            for point, projection, analysis in zip(request.critique_points, projections, analyses)
+        ]
+    }
+
+class ProjectionRequest(BaseModel):
+    base_metrics: dict
+    modifiers: dict = {}
+    months: int = Field(12, ge=1, le=120)
+    paths: int = Field(MONTE_CARLO_PATHS, ge=100, le=100_000)
+    starting_cash: float = 0.0
+    seed: Optional[int] = None
+
+@app.post("/simulate/projection")
+def run_projection(request: ProjectionRequest):
+    # CPU-bound NumPy work; FastAPI runs sync endpoints in the threadpool.
+    return project_multi_period(
+        request.base_metrics,
+        request.modifiers,
+        months=request.months,
+        paths=request.paths,
+        starting_cash=request.starting_cash,
+        seed=request.seed
+    )
@@ -0,0 +1,53 @@
+"""
+Idempotent schema upgrade for existing SQLite/Postgres databases.
+
+create_all only creates missing tables; it never adds columns or indexes to
+tables that already exist. upgrade_schema also adds missing (nullable)
+columns and any index declared on the models, so databases created by older
+versions catch up without data loss. migrate adds the data backfills; the API
+runs it at startup unless AUTO_MIGRATE=false.
+
+Usage (from the backend folder):
+    python migrations.py
+"""
+from sqlalchemy import inspect, text
+from sqlalchemy.engine import Engine
+
+from models import Base
+from services.snapshots import backfill_snapshots
+
+def upgrade_schema(engine: Engine):
+    Base.metadata.create_all(bind=engine)
+
+    inspector = inspect(engine)
+    applied = []
+    with engine.begin() as connection:
+        for table in Base.metadata.sorted_tables:
+            existing_columns = {column["name"] for column in inspector.get_columns(table.name)}
+            existing_indexes = {index["name"] for index in inspector.get_indexes(table.name)}
+
+            for column in table.columns:
+                if column.name not in existing_columns:
+                    column_type = column.type.compile(dialect=engine.dialect)
+                    connection.execute(text(f'ALTER TABLE {table.name} ADD COLUMN "{column.name}" {column_type}'))
+                    applied.append(f"column {table.name}.{column.name}")
+
+            for index in table.indexes:
+                if index.name not in existing_indexes:
+                    index.create(bind=connection)
+                    applied.append(f"index {index.name}")
+
+    return applied
+
+def migrate(engine: Engine, session_factory):
+    applied = upgrade_schema(engine)
+    # Snapshots for companies loaded before the snapshot table existed
+    with session_factory() as session:
+        backfill_snapshots(session)
+    return applied
+
+if __name__ == "__main__":
+    from database import engine, SessionLocal
+
+    changes = migrate(engine, SessionLocal)
+    print("\n".join(changes) if changes else "Schema is up to date")
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Float, DateTime, ForeignKey, Text
+from sqlalchemy import Column, Integer, BigInteger, String, Float, DateTime, ForeignKey, Text, Index
 from sqlalchemy.orm import relationship, declarative_base
 from datetime import datetime
 
@@ -36,8 +36,21 @@ class FinancialRecord(Base):
     # Raw data storage (e.g., JSON of the full CSV)
     raw_data_path = Column(String, nullable=True)
 
+    # sha256 of the uploaded file and the client's Idempotency-Key, so a
+    # repeated upload returns this record instead of being processed again
+    content_hash = Column(String(64), nullable=True)
+    idempotency_key = Column(String(255), nullable=True)
+
     company = relationship("Company", back_populates="financial_records")
 
+    # Per-company history, newest period first (keyset pagination on period_end, id)
+    __table_args__ = (
+        Index("ix_financial_records_company_period", "company_id", "period_end", "id"),
+        # One record per content / key and company; also the dedup lookups
+        Index("ux_financial_records_company_content", "company_id", "content_hash", unique=True),
+        Index("ux_financial_records_company_idempotency", "company_id", "idempotency_key", unique=True),
+    )
+
 class Assessment(Base):
     __tablename__ = "assessments"
 
@@ -50,5 +63,109 @@ class Assessment(Base):
     
     summary_report = Column(Text) # AI generated text
     recommendations = Column(Text) # JSON or markdown list
+
+    # The upload this assessment was made from (null for older rows)
+    financial_record_id = Column(Integer, ForeignKey("financial_records.id"), nullable=True)
     
     company = relationship("Company", back_populates="assessments")
+
+    # Per-company history, newest first (keyset pagination on created_at, id)
+    __table_args__ = (
+        Index("ix_assessments_company_created", "company_id", "created_at", "id"),
+        Index("ix_assessments_record", "financial_record_id", "id"),
+    )
+
+class Job(Base):
+    __tablename__ = "jobs"
+
+    id = Column(Integer, primary_key=True, index=True)
+    kind = Column(String, index=True) # e.g., upload
+    status = Column(String, index=True, default="queued") # queued, running, succeeded, failed
+    company_id = Column(Integer, ForeignKey("companies.id"), nullable=True)
+
+    payload = Column(Text) # JSON arguments for the handler
+    result = Column(Text, nullable=True) # JSON result once succeeded
+    error = Column(Text, nullable=True)
+    attempts = Column(Integer, default=0)
+
+    created_at = Column(DateTime, default=datetime.utcnow)
+    started_at = Column(DateTime, nullable=True)
+    finished_at = Column(DateTime, nullable=True)
+    # Renewed by the worker while the job runs; a running job whose
+    # heartbeat is older than the lease is requeued (see services.jobs)
+    heartbeat_at = Column(DateTime, nullable=True)
+
+class MonthlyRollup(Base):
+    __tablename__ = "monthly_rollups"
+
+    # One row per company and calendar month, maintained incrementally from
+    # the ledger rows each upload adds
+    company_id = Column(Integer, ForeignKey("companies.id"), primary_key=True)
+    month = Column(String, primary_key=True) # YYYY-MM
+
+    revenue = Column(Float, default=0.0)
+    expenses = Column(Float, default=0.0)
+    net_profit = Column(Float, default=0.0)
+    row_count = Column(Integer, default=0)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+class LedgerRowFingerprint(Base):
+    __tablename__ = "ledger_row_fingerprints"
+
+    # 64-bit hash of (date, category, amount, type, occurrence) for every
+    # ledger row already counted in the rollups; re-uploaded rows are skipped
+    company_id = Column(Integer, ForeignKey("companies.id"), primary_key=True)
+    month = Column(String, primary_key=True) # YYYY-MM
+    fingerprint = Column(BigInteger, primary_key=True)
+
+class CompanySnapshot(Base):
+    __tablename__ = "company_snapshots"
+
+    # Latest figures per company for dashboard reads, written in the same
+    # transaction as the FinancialRecord / Assessment they come from
+    company_id = Column(Integer, ForeignKey("companies.id"), primary_key=True)
+
+    latest_record_id = Column(Integer, nullable=True)
+    period_end = Column(DateTime, nullable=True)
+    revenue = Column(Float, nullable=True)
+    expenses = Column(Float, nullable=True)
+    net_profit = Column(Float, nullable=True)
+    # Percent change against the previous record; null without one
+    revenue_change = Column(Float, nullable=True)
+    expense_change = Column(Float, nullable=True)
+    profit_change = Column(Float, nullable=True)
+    trend = Column(Text, nullable=True) # JSON list of recent records, oldest first
+
+    latest_assessment_id = Column(Integer, nullable=True)
+    overall_score = Column(Integer, nullable=True)
+    risk_level = Column(String, nullable=True)
+    assessed_at = Column(DateTime, nullable=True)
+
+    # Bumped on every change; the read endpoints derive their ETags from it
+    version = Column(Integer, default=0, nullable=False)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    # Portfolio views filtered by risk, in company order
+    __table_args__ = (
+        Index("ix_company_snapshots_risk", "risk_level", "company_id"),
+    )
+
+class CompanyForecast(Base):
+    __tablename__ = "company_forecasts"
+
+    # Latest stored cash-flow forecast per company (services.forecasting),
+    # refreshed in batch by the `forecast_refresh` job
+    company_id = Column(Integer, ForeignKey("companies.id"), primary_key=True)
+    as_of = Column(DateTime, nullable=True) # last ledger day the forecast starts after
+    horizon_days = Column(Integer, nullable=False)
+
+    expected_inflow = Column(Float, nullable=True)
+    expected_outflow = Column(Float, nullable=True)
+    expected_net = Column(Float, nullable=True)
+    net_low = Column(Float, nullable=True) # 10th percentile of the net over the horizon
+    lowest_cumulative_net = Column(Float, nullable=True)
+    recurring_count = Column(Integer, default=0)
+    anomaly_count = Column(Integer, default=0)
+    forecast = Column(Text, nullable=True) # JSON, as served by /companies/{id}/forecast
+
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
@@ -1,6 +1,7 @@
-from pydantic import BaseModel
+import json
+from pydantic import BaseModel, field_validator
 from datetime import datetime
-from typing import List, Optional
+from typing import Any, List, Optional
 
 # Company Schemas
 class CompanyBase(BaseModel):
@@ -17,6 +18,10 @@ class Company(CompanyBase):
     class Config:
         from_attributes = True
 
+class CompanyPage(BaseModel):
+    items: List[Company]
+    next_cursor: Optional[str] = None
+
 # Financial Record Schemas
 class FinancialRecordCreate(BaseModel):
     period_start: datetime
@@ -36,6 +41,10 @@ class FinancialRecord(FinancialRecordCreate):
     class Config:
         from_attributes = True
 
+class FinancialRecordPage(BaseModel):
+    items: List[FinancialRecord]
+    next_cursor: Optional[str] = None
+
 # Assessment Schemas
 class AssessmentBase(BaseModel):
     overall_score: int
@@ -52,3 +61,92 @@ class Assessment(AssessmentBase):
     created_at: datetime
     class Config:
         from_attributes = True
+
+class AssessmentPage(BaseModel):
+    items: List[Assessment]
+    next_cursor: Optional[str] = None
+
+# Monthly Rollup Schemas
+class MonthlyRollup(BaseModel):
+    month: str
+    revenue: float
+    expenses: float
+    net_profit: float
+    row_count: int
+    class Config:
+        from_attributes = True
+
+# Company Snapshot Schemas
+class TrendPoint(BaseModel):
+    period_end: Optional[datetime] = None
+    revenue: Optional[float] = None
+    expenses: Optional[float] = None
+    net_profit: Optional[float] = None
+
+class CompanySnapshot(BaseModel):
+    company_id: int
+    name: Optional[str] = None
+    industry: Optional[str] = None
+    period_end: Optional[datetime] = None
+    revenue: Optional[float] = None
+    expenses: Optional[float] = None
+    net_profit: Optional[float] = None
+    revenue_change: Optional[float] = None
+    expense_change: Optional[float] = None
+    profit_change: Optional[float] = None
+    trend: List[TrendPoint] = []
+    overall_score: Optional[int] = None
+    risk_level: Optional[str] = None
+    assessed_at: Optional[datetime] = None
+    version: int
+    updated_at: Optional[datetime] = None
+    class Config:
+        from_attributes = True
+
+    @field_validator("trend", mode="before")
+    @classmethod
+    def parse_trend(cls, value):
+        # Stored as JSON text
+        if value is None:
+            return []
+        return json.loads(value) if isinstance(value, str) else value
+
+class CompanySnapshotPage(BaseModel):
+    items: List[CompanySnapshot]
+    next_cursor: Optional[str] = None
+
+# Company Forecast Schemas
+class CompanyForecast(BaseModel):
+    company_id: int
+    as_of: Optional[datetime] = None
+    horizon_days: int
+    expected_inflow: Optional[float] = None
+    expected_outflow: Optional[float] = None
+    expected_net: Optional[float] = None
+    net_low: Optional[float] = None
+    lowest_cumulative_net: Optional[float] = None
+    recurring_count: int = 0
+    anomaly_count: int = 0
+    updated_at: Optional[datetime] = None
+    class Config:
+        from_attributes = True
+
+class CompanyForecastPage(BaseModel):
+    items: List[CompanyForecast]
+    next_cursor: Optional[str] = None
+
+# Job Schemas
+class Job(BaseModel):
+    id: int
+    kind: str
+    status: str
+    company_id: Optional[int] = None
+    result: Optional[Any] = None
+    error: Optional[str] = None
+    attempts: int
+    created_at: datetime
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+    heartbeat_at: Optional[datetime] = None
+    class Config:
+        from_attributes = True
@@ -1,62 +1,413 @@
-import google.generativeai as genai
+import asyncio
+import json
 import os
+import re
+import threading
+import time
+from typing import List
 from dotenv import load_dotenv
+from pydantic import BaseModel, ValidationError, field_validator
+
+from services.cache import ai_cache, cache_key
+from services.scoring import score_metrics, score_recommendations, score_summary
+from services.telemetry import llm_duration, llm_first_token, record_llm_usage
 
 load_dotenv()
 
 GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
-if GEMINI_API_KEY:
-    genai.configure(api_key=GEMINI_API_KEY)
 
-def get_financial_advice(financial_data: dict, company_info: dict):
-    if not GEMINI_API_KEY:
-        return {
-            "error": "Gemini API Key not found. Please set GEMINI_API_KEY in .env",
-            "narrative": "AI analysis unavailable.",
-            "risk_score": 50,
-            "recommendations": ["Configure API Key"]
-        }
-
-    model = genai.GenerativeModel('gemini-flash-latest')
-    
+# Upper bound on LLM calls in flight per worker, and the deadline (queueing
+# included) after which callers get a deterministic fallback instead.
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "4"))
+LLM_TIMEOUT_SECONDS = float(os.getenv("LLM_TIMEOUT_SECONDS", "30"))
+
+# Advice prompt bounds: it summarizes the ledger instead of embedding it, so
+# its size (and the call's cost and latency) is the same for any upload.
+PROMPT_TOKEN_BUDGET = int(os.getenv("PROMPT_TOKEN_BUDGET", "800"))
+PROMPT_TOP_CATEGORIES = int(os.getenv("PROMPT_TOP_CATEGORIES", "8"))
+PROMPT_MAX_MONTHS = int(os.getenv("PROMPT_MAX_MONTHS", "12"))
+# Category names are cut to this many characters
+PROMPT_LABEL_CHARS = 40
+
+_model_factory = None
+_model = None
+_model_lock = threading.Lock()
+# One LLM semaphore per event loop (API, standalone worker, test clients)
+_semaphores = {}
+
+def set_model_factory(factory):
+    """
+    Overrides how models are built, e.g. with services.llm_stub.FakeGenerativeModel
+    for local benchmarks. Pass None to go back to Gemini.
+    """
+    global _model_factory
+    _model_factory = factory
+
+def llm_available():
+    return _model_factory is not None or bool(GEMINI_API_KEY)
+
+def create_model():
+    """
+    The shared Gemini model, or a fresh one from the factory set with
+    set_model_factory. google.generativeai takes most of a second to import,
+    so it is imported and configured here on first use rather than when the
+    app starts; workers that never call the LLM never load it.
+    """
+    global _model
+    if _model_factory is not None:
+        return _model_factory()
+    if _model is None:
+        with _model_lock:
+            if _model is None:
+                import google.generativeai as genai
+                genai.configure(api_key=GEMINI_API_KEY)
+                _model = genai.GenerativeModel('gemini-flash-latest')
+    return _model
+
+def _get_semaphore():
+    # An asyncio.Semaphore only works on the loop that first waits on it, so
+    # each running loop gets its own. Closed loops are dropped on the way.
+    loop = asyncio.get_running_loop()
+    with _model_lock:
+        semaphore = _semaphores.get(loop)
+        if semaphore is None:
+            for closed in [other for other in _semaphores if other.is_closed()]:
+                del _semaphores[closed]
+            semaphore = _semaphores[loop] = asyncio.Semaphore(LLM_MAX_CONCURRENCY)
+    return semaphore
+
+def _generate_blocking(prompt: str, generation_config=None, purpose: str = "other"):
+    response = create_model().generate_content(prompt, generation_config=generation_config)
+    record_llm_usage(purpose, response)
+    return response.text
+
+async def generate_text(prompt: str, timeout: float = None, generation_config=None, purpose: str = "other"):
+    """
+    Runs the blocking generate_content call in a worker thread, limited by the
+    shared semaphore and a per-call deadline. Raises asyncio.TimeoutError when
+    the deadline passes; the slot is only freed once the call really returns,
+    so abandoned calls still count against the limit. Latency (queueing
+    included) and token usage are recorded per `purpose`.
+    """
+    start = time.perf_counter()
+    outcome = "error"
+    try:
+        text = await _generate_text(prompt, timeout, generation_config, purpose)
+        outcome = "ok"
+        return text
+    except asyncio.TimeoutError:
+        outcome = "timeout"
+        raise
+    finally:
+        llm_duration.observe(time.perf_counter() - start, purpose=purpose, outcome=outcome)
+
+async def _generate_text(prompt: str, timeout: float, generation_config, purpose: str):
+    timeout = LLM_TIMEOUT_SECONDS if timeout is None else timeout
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + timeout
+    semaphore = _get_semaphore()
+
+    await asyncio.wait_for(semaphore.acquire(), timeout)
+    try:
+        call = loop.run_in_executor(None, _generate_blocking, prompt, generation_config, purpose)
+    except Exception:
+        semaphore.release()
+        raise
+    call.add_done_callback(lambda _: semaphore.release())
+
+    return await asyncio.wait_for(asyncio.shield(call), max(deadline - loop.time(), 0))
+
+_END_OF_STREAM = object()
+
+async def stream_text(prompt: str, timeout: float = None, generation_config=None, purpose: str = "other"):
+    """
+    Streaming generate_text: yields the answer's text in pieces as the model
+    produces them. The blocking stream is consumed in a worker thread under
+    the same semaphore; the deadline covers the whole answer and raises
+    asyncio.TimeoutError between pieces. Records time to the first piece as
+    well as total latency and token usage.
+    """
+    timeout = LLM_TIMEOUT_SECONDS if timeout is None else timeout
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + timeout
+    semaphore = _get_semaphore()
+    queue = asyncio.Queue()
+    start = time.perf_counter()
+    outcome = "error"
+
+    def put(item):
+        try:
+            loop.call_soon_threadsafe(queue.put_nowait, item)
+        except RuntimeError:
+            pass  # the loop is gone; nobody is listening
+
+    def produce():
+        try:
+            response = create_model().generate_content(prompt, generation_config=generation_config, stream=True)
+            for chunk in response:
+                # Gemini can end with a chunk that has no text parts
+                if getattr(chunk, "parts", True):
+                    put(chunk.text)
+            record_llm_usage(purpose, response)
+            put(_END_OF_STREAM)
+        except Exception as e:
+            put(e)
+
+    try:
+        await asyncio.wait_for(semaphore.acquire(), timeout)
+        try:
+            call = loop.run_in_executor(None, produce)
+        except Exception:
+            semaphore.release()
+            raise
+        call.add_done_callback(lambda _: semaphore.release())
+
+        first = True
+        while True:
+            item = await asyncio.wait_for(queue.get(), max(deadline - loop.time(), 0))
+            if item is _END_OF_STREAM:
+                break
+            if isinstance(item, Exception):
+                raise item
+            if first:
+                llm_first_token.observe(time.perf_counter() - start, purpose=purpose)
+                first = False
+            yield item
+        outcome = "ok"
+    except asyncio.TimeoutError:
+        outcome = "timeout"
+        raise
+    finally:
+        llm_duration.observe(time.perf_counter() - start, purpose=purpose, outcome=outcome)
+
+def estimate_tokens(text: str):
+    # Rough count for budgeting (about 4 characters per token for English
+    # and numbers); the API is not called just to count.
+    return (len(text) + 3) // 4
+
+def _money(value):
+    return f"${value:,.0f}"
+
+def _category_lines(by_category: dict, top_k: int):
+    # Largest categories by volume; the rest are folded into one line.
+    ranked = sorted(by_category.items(), key=lambda item: item[1]["revenue"] + item[1]["expenses"], reverse=True)
+    lines = [
+        f"- {name[:PROMPT_LABEL_CHARS]}: revenue {_money(totals['revenue'])}, expenses {_money(totals['expenses'])}"
+        for name, totals in ranked[:top_k]
+    ]
+    rest = ranked[top_k:]
+    if rest:
+        lines.append(
+            f"- {len(rest)} other categories: revenue {_money(sum(t['revenue'] for _, t in rest))}, "
+            f"expenses {_money(sum(t['expenses'] for _, t in rest))}"
+        )
+    return lines
+
+def _month_lines(by_month: dict, months: int):
+    recent = sorted(by_month.items())[-months:] if months else []
+    return [
+        f"- {month}: revenue {_money(totals['revenue'])}, expenses {_money(totals['expenses'])}, "
+        f"net {_money(totals['revenue'] - totals['expenses'])}"
+        for month, totals in recent
+    ]
+
+def build_advice_prompt(financial_data: dict, company_info: dict):
+    """
+    Compact prompt over the headline metrics, the top PROMPT_TOP_CATEGORIES
+    categories and the last PROMPT_MAX_MONTHS monthly totals. Its size does
+    not depend on the ledger: detail is dropped (oldest months first, then
+    the smallest categories) until it fits PROMPT_TOKEN_BUDGET.
+    """
     # Extract key metrics for explicit prompt injection to avoid hallucinations
-    revenue = financial_data.get('revenue', 0)
-    expenses = financial_data.get('expenses', 0)
-    profit = financial_data.get('net_profit', 0)
-
-    prompt = f"""
-    You are an expert financial advisor for SMEs. Analyze the following financial data for a {company_info.get('business_type')} company in the {company_info.get('industry')} industry.
-    
-    CRITICAL FINANCIAL METRICS:
-    - Revenue: ${revenue:,.2f}
-    - Expenses: ${expenses:,.2f}
-    - Net Profit: ${profit:,.2f}
-    
-    Full Financial Data:
-    {financial_data}
-    
-    Company Name: {company_info.get('name')}
-    
-    INSTRUCTIONS:
-    1. If Net Profit is NEGATIVE, the Risk Score MUST be above 70 (High Risk).
-    2. If Net Profit is POSITIVE but small (<10% margin), Risk Score should be 40-60 (Moderate).
-    3. Reference the specific Revenue and Profit numbers in your summary.
-    
-    Provide:
-    1. A brief executive summary of their financial health (Mention the specific numbers).
-    2. A Risk Score from 0 (Safe) to 100 (Critical).
-    3. 3-5 actionable strategic recommendations to improve cash flow and profitability.
-    
-    Format the output as JSON with keys: "executive_summary", "risk_score", "recommendations" (list of strings).
-    """
-    
-    print("----- GENERATED PROMPT -----")
-    print(prompt)
-    print("----------------------------")
-    
+    revenue = financial_data.get('revenue', 0) or 0
+    expenses = financial_data.get('expenses', 0) or 0
+    profit = financial_data.get('net_profit', 0) or 0
+    margin = profit / revenue if revenue else 0.0
+    by_category = financial_data.get('by_category') or {}
+    by_month = financial_data.get('by_month') or {}
+
+    def render(top_k: int, months: int):
+        categories = "\n".join(_category_lines(by_category, top_k)) or "- none"
+        monthly = "\n".join(_month_lines(by_month, months)) or "- none"
+        return f"""You are an expert financial advisor for SMEs. Analyze the following financial data for a {company_info.get('business_type')} company in the {company_info.get('industry')} industry.
+Company Name: {company_info.get('name')}
+
+CRITICAL FINANCIAL METRICS:
+- Revenue: ${revenue:,.2f}
+- Expenses: ${expenses:,.2f}
+- Net Profit: ${profit:,.2f} ({margin:.1%} margin)
+- Period: {str(financial_data.get('period_start', ''))[:10]} to {str(financial_data.get('period_end', ''))[:10]}, {financial_data.get('row_count', 0)} transactions
+
+Largest categories:
+{categories}
+
+Monthly totals (most recent):
+{monthly}
+
+INSTRUCTIONS:
+1. If Net Profit is NEGATIVE, the Risk Score MUST be above 70 (High Risk).
+2. If Net Profit is POSITIVE but small (<10% margin), Risk Score should be 40-60 (Moderate).
+3. Reference the specific Revenue and Profit numbers in your summary.
+
+Provide:
+1. executive_summary: a brief summary of their financial health (mention the specific numbers).
+2. risk_score: from 0 (Safe) to 100 (Critical).
+3. recommendations: 3-5 actionable strategic recommendations to improve cash flow and profitability.
+"""
+
+    top_k, months = PROMPT_TOP_CATEGORIES, PROMPT_MAX_MONTHS
+    prompt = render(top_k, months)
+    while estimate_tokens(prompt) > PROMPT_TOKEN_BUDGET and (months or top_k):
+        if months:
+            months -= 1
+        else:
+            top_k -= 1
+        prompt = render(top_k, months)
+    return prompt
+
+class Advice(BaseModel):
+    """
+    Shape of the advisor's answer. Doubles as the response_schema for
+    Gemini's JSON mode, so the model cannot return anything else.
+    """
+    executive_summary: str
+    risk_score: int
+    recommendations: List[str]
+
+    @field_validator("risk_score")
+    @classmethod
+    def clamp_risk_score(cls, value):
+        return max(0, min(100, value))
+
+def advice_generation_config():
+    # A plain dict is accepted wherever genai.GenerationConfig is, without
+    # importing the SDK.
+    return {"response_mime_type": "application/json", "response_schema": Advice}
+
+def parse_advice(text: str):
+    """
+    Validates the model's JSON answer and returns it re-serialized in the
+    stored form. Raises ValueError (pydantic's ValidationError) if the answer
+    does not match Advice.
+    """
+    return Advice.model_validate_json(text).model_dump_json()
+
+# Body of a JSON string up to its closing quote, and an unfinished \uXXXX
+# escape at the end of one that is still arriving
+_JSON_STRING_BODY = re.compile(r'(?:[^"\\]|\\.)*')
+_PARTIAL_UNICODE_ESCAPE = re.compile(r'\\u[0-9a-fA-F]{0,3}$')
+
+def partial_string_field(text: str, field: str):
+    """
+    Decoded value of a top-level string field in JSON that is still being
+    written, as far as it has arrived ("" before it starts).
+    """
+    match = re.search(r'"%s"\s*:\s*"' % re.escape(field), text)
+    if not match:
+        return ""
+    body = _JSON_STRING_BODY.match(text, match.end()).group(0)
     try:
-        response = model.generate_content(prompt)
-        # simplistic parsing, ideally we ensure JSON mode or parse carefully
-        return response.text 
+        return json.loads('"' + body + '"', strict=False)
+    except ValueError:
+        return json.loads('"' + _PARTIAL_UNICODE_ESCAPE.sub("", body) + '"', strict=False)
+
+def fallback_advice(financial_data: dict, reason: str, score: dict = None):
+    """
+    Deterministic assessment used when the LLM is not configured, fails or
+    does not answer in time: services.scoring's score, summary and
+    recommendations in the same JSON shape, flagged with "fallback".
+    """
+    score = score or score_metrics(financial_data)
+    return json.dumps({
+        "executive_summary": f"{score_summary(financial_data, score)} Automated assessment: {reason}.",
+        "risk_score": score["risk_score"],
+        "recommendations": score_recommendations(score),
+        "fallback": True
+    })
+
+def get_financial_advice(financial_data: dict, company_info: dict):
+    if not llm_available():
+        return fallback_advice(financial_data, "AI analysis unavailable (GEMINI_API_KEY is not set)")
+
+    model = create_model()
+    prompt = build_advice_prompt(financial_data, company_info)
+
+    try:
+        response = model.generate_content(prompt, generation_config=advice_generation_config())
+        record_llm_usage("advice", response)
+        return parse_advice(response.text)
+    except ValidationError:
+        return fallback_advice(financial_data, "AI response did not match the expected format")
     except Exception as e:
-        return {"error": str(e)}
+        return fallback_advice(financial_data, f"AI analysis failed ({e})")
+
+async def get_financial_advice_async(financial_data: dict, company_info: dict, timeout: float = None):
+    """
+    Non-blocking, cached variant of get_financial_advice for async endpoints.
+    Returns fallback_advice when the LLM is not configured, fails or misses
+    its deadline.
+    """
+    if not llm_available():
+        return get_financial_advice(financial_data, company_info)
+
+    # The answer depends only on the prompt, so uploads that summarize the
+    # same way reuse the previous answer instead of paying for another call.
+    prompt = build_advice_prompt(financial_data, company_info)
+    key = cache_key("advice", prompt)
+    cached = ai_cache.get(key)
+    if cached is not None:
+        return cached
+
+    try:
+        result = parse_advice(await generate_text(prompt, timeout, advice_generation_config(), purpose="advice"))
+    except asyncio.TimeoutError:
+        return fallback_advice(financial_data, "AI analysis timed out")
+    except ValidationError:
+        # JSON mode makes this rare; never store the raw text as an assessment.
+        return fallback_advice(financial_data, "AI response did not match the expected format")
+    except Exception as e:
+        return fallback_advice(financial_data, f"AI analysis failed ({e})")
+
+    ai_cache.set(key, result)
+    return result
+
+async def stream_financial_advice(financial_data: dict, company_info: dict, timeout: float = None):
+    """
+    Streaming get_financial_advice_async. Yields ("summary", text) pieces of
+    the executive summary as the model writes them, then ("advice", json)
+    with the validated answer, cached like the non-streamed one. Cached
+    answers and fallbacks arrive as a single summary piece; a fallback after
+    part of the summary was sent is only in the final "advice".
+    """
+    if not llm_available():
+        result = get_financial_advice(financial_data, company_info)
+    else:
+        prompt = build_advice_prompt(financial_data, company_info)
+        key = cache_key("advice", prompt)
+        result = ai_cache.get(key)
+    if result is not None:
+        yield "summary", json.loads(result)["executive_summary"]
+        yield "advice", result
+        return
+
+    text = ""
+    sent = 0
+    try:
+        async for piece in stream_text(prompt, timeout, advice_generation_config(), purpose="advice"):
+            text += piece
+            summary = partial_string_field(text, "executive_summary")
+            if len(summary) > sent:
+                yield "summary", summary[sent:]
+                sent = len(summary)
+        result = parse_advice(text)
+        ai_cache.set(key, result)
+    except asyncio.TimeoutError:
+        result = fallback_advice(financial_data, "AI analysis timed out")
+    except ValidationError:
+        result = fallback_advice(financial_data, "AI response did not match the expected format")
+    except Exception as e:
+        result = fallback_advice(financial_data, f"AI analysis failed ({e})")
+
+    if not sent:
+        yield "summary", json.loads(result)["executive_summary"]
+    yield "advice", result
@@ -0,0 +1,210 @@
+import csv
+import json
+import multiprocessing
+import os
+import time
+import zipfile
+from datetime import datetime
+from concurrent.futures import ProcessPoolExecutor
+from fastapi.encoders import jsonable_encoder
+from sqlalchemy import insert
+from sqlalchemy.orm import Session
+from dotenv import load_dotenv
+
+from models import Company, FinancialRecord, Assessment, Job, CompanySnapshot
+from services.ledger_store import convert_ledger, stored_digest
+from services.rollups import apply_rollups
+from services.scoring import score_many, score_recommendations, score_summary
+from services.snapshots import new_company_snapshot
+from services.telemetry import span, stage_duration
+
+load_dotenv()
+
+MANIFEST_NAME = "manifest.csv"
+MANIFEST_COLUMNS = ("name", "industry", "business_type", "file")
+# Parser processes for bulk ingestion (defaults to one per CPU)
+BULK_PARSE_PROCESSES = int(os.getenv("BULK_PARSE_PROCESSES", "0")) or os.cpu_count() or 2
+# Companies per insert transaction
+BULK_INSERT_BATCH = int(os.getenv("BULK_INSERT_BATCH", "1000"))
+# Largest bundle accepted, in bytes once extracted (default 2 GiB)
+BULK_MAX_BUNDLE_BYTES = int(os.getenv("BULK_MAX_BUNDLE_BYTES", str(2 << 30)))
+
+def _inside(path: str, root: str):
+    # Whether `path` resolves (symlinks followed) to somewhere under `root`
+    path, root = os.path.realpath(path), os.path.realpath(root)
+    return path.startswith(root + os.sep) or path == root
+
+def extract_bundle(zip_path: str, destination: str):
+    """
+    Extracts a ledger bundle, refusing entries that would land outside
+    `destination` and bundles larger than BULK_MAX_BUNDLE_BYTES once
+    extracted. Returns the folder that holds manifest.csv.
+    """
+    destination = os.path.realpath(destination)
+    with zipfile.ZipFile(zip_path) as bundle:
+        members = bundle.infolist()
+        for member in members:
+            if not _inside(os.path.join(destination, member.filename), destination):
+                raise ValueError(f"Unsafe path in bundle: {member.filename}")
+        # Sizes from the zip directory; extraction stops at the declared size
+        if sum(member.file_size for member in members) > BULK_MAX_BUNDLE_BYTES:
+            raise ValueError(f"Bundle is larger than {BULK_MAX_BUNDLE_BYTES} bytes once extracted")
+        bundle.extractall(destination)
+
+    for folder, _, files in os.walk(destination):
+        if MANIFEST_NAME in files:
+            return folder
+    raise ValueError(f"Bundle has no {MANIFEST_NAME}")
+
+def read_manifest(root: str):
+    """
+    manifest.csv lists one company per row: name, industry, business_type and
+    the ledger file relative to the manifest. Files outside the manifest's
+    folder (absolute paths, `..`, symlinks out) are refused.
+    """
+    path = os.path.join(root, MANIFEST_NAME)
+    if not os.path.exists(path):
+        raise ValueError(f"{MANIFEST_NAME} not found in {root}")
+
+    with open(path, newline="", encoding="utf-8-sig") as handle:
+        reader = csv.DictReader(handle)
+        fields = {(field or "").strip().lower() for field in reader.fieldnames or []}
+        missing = [column for column in MANIFEST_COLUMNS if column not in fields]
+        if missing:
+            raise ValueError(f"{MANIFEST_NAME} is missing columns: {', '.join(missing)}")
+
+        entries = []
+        for row in reader:
+            row = {(key or "").strip().lower(): (value or "").strip() for key, value in row.items()}
+            if not _inside(os.path.join(root, row["file"]), root):
+                raise ValueError(f"Unsafe path in {MANIFEST_NAME}: {row['file']}")
+            entries.append({
+                "name": row["name"],
+                "industry": row["industry"],
+                "business_type": row["business_type"],
+                "file": os.path.join(root, row["file"])
+            })
+        return entries
+
+def _parse_ledger(path: str):
+    # Runs in a worker process; errors come back as values so one bad file
+    # does not abort the batch. Returns ((store_path, metrics), error).
+    try:
+        return convert_ledger(path), None
+    except Exception as e:
+        return None, str(e)
+
+def parse_ledgers(paths: list, processes: int = None):
+    processes = processes or BULK_PARSE_PROCESSES
+    if processes <= 1 or len(paths) <= 1:
+        return [_parse_ledger(path) for path in paths]
+    chunksize = max(1, len(paths) // (processes * 4))
+    # Spawned, not forked: this runs on a thread of the multithreaded API
+    # process, and a fork would copy its held locks, pooled DB connections
+    # and event loop state into the children.
+    with ProcessPoolExecutor(max_workers=processes, mp_context=multiprocessing.get_context("spawn")) as pool:
+        return list(pool.map(_parse_ledger, paths, chunksize=chunksize))
+
+def ingest_bundle(db: Session, root: str, processes: int = None, assess: bool = True):
+    """
+    Loads every company in a bundle: ledgers are parsed in a process pool,
+    then companies and financial records are written with batched
+    executemany inserts, BULK_INSERT_BATCH companies per transaction. Each
+    company gets a locally scored assessment straight away; AI narratives
+    are not run inline: with `assess` an `assessment` job is queued per
+    company for the (throttled) job workers.
+    """
+    entries = read_manifest(root)
+    with span("bulk.parse"):
+        results = parse_ledgers([entry["file"] for entry in entries], processes)
+
+    failed = []
+    loaded = []
+    for entry, (stored, error) in zip(entries, results):
+        if error:
+            failed.append({"name": entry["name"], "file": os.path.relpath(entry["file"], root), "error": error})
+        else:
+            ledger_location, metrics = stored
+            loaded.append((dict(entry, ledger=ledger_location), metrics))
+
+    companies = records = jobs = 0
+    for start in range(0, len(loaded), BULK_INSERT_BATCH):
+        batch = loaded[start:start + BULK_INSERT_BATCH]
+        batch_started = time.perf_counter()
+
+        company_ids = db.execute(
+            insert(Company).returning(Company.id, sort_by_parameter_order=True),
+            [{"name": e["name"], "industry": e["industry"], "business_type": e["business_type"]} for e, _ in batch]
+        ).scalars().all()
+
+        record_ids = db.execute(insert(FinancialRecord).returning(FinancialRecord.id, sort_by_parameter_order=True), [
+            {
+                "company_id": company_id,
+                "period_start": metrics["period_start"],
+                "period_end": metrics["period_end"],
+                "revenue": metrics["revenue"],
+                "cogs": 0.0,
+                "opex": metrics["expenses"],
+                "net_profit": metrics["net_profit"],
+                "assets": 0.0,
+                "liabilities": 0.0,
+                "equity": 0.0,
+                "raw_data_path": entry["ledger"],
+                "content_hash": stored_digest(entry["ledger"])
+            }
+            for company_id, (entry, metrics) in zip(company_ids, batch)
+        ]).scalars().all()
+        # Every company is scored locally right away, in one vectorized
+        # pass; the AI narrative (if any) follows from the assessment jobs.
+        scores = score_many([metrics for _, metrics in batch])
+        assessed_at = datetime.utcnow()
+        assessment_ids = db.execute(insert(Assessment).returning(Assessment.id, sort_by_parameter_order=True), [
+            {
+                "company_id": company_id,
+                "financial_record_id": record_id,
+                "created_at": assessed_at,
+                "overall_score": score["overall_score"],
+                "risk_level": score["risk_level"],
+                "summary_report": score_summary(metrics, score),
+                "recommendations": json.dumps(score_recommendations(score))
+            }
+            for company_id, record_id, score, (_, metrics) in zip(company_ids, record_ids, scores, batch)
+        ]).scalars().all()
+        db.execute(insert(CompanySnapshot), [
+            dict(
+                new_company_snapshot(company_id, record_id, metrics),
+                latest_assessment_id=assessment_id,
+                overall_score=score["overall_score"],
+                risk_level=score["risk_level"],
+                assessed_at=assessed_at
+            )
+            for company_id, record_id, assessment_id, score, (_, metrics)
+            in zip(company_ids, record_ids, assessment_ids, scores, batch)
+        ])
+        for company_id, (entry, _) in zip(company_ids, batch):
+            apply_rollups(db, company_id, entry["ledger"], new_company=True)
+
+        if assess:
+            db.execute(insert(Job), [
+                {
+                    "kind": "assessment",
+                    "status": "queued",
+                    "company_id": company_id,
+                    "payload": json.dumps({"metrics": jsonable_encoder(metrics), "record_id": record_id}),
+                    "attempts": 0
+                }
+                for company_id, record_id, (_, metrics) in zip(company_ids, record_ids, batch)
+            ])
+            jobs += len(batch)
+
+        db.commit()
+        stage_duration.observe(time.perf_counter() - batch_started, stage="bulk.insert_batch")
+        companies += len(batch)
+        records += len(batch)
+
+    return {
+        "companies": companies,
+        "records": records,
+        "assessment_jobs": jobs,
+        "failed": failed
+    }
@@ -0,0 +1,169 @@
+import datetime
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from dotenv import load_dotenv
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+AI_CACHE_MAX_ENTRIES = int(os.getenv("AI_CACHE_MAX_ENTRIES", "1024"))
+AI_CACHE_TTL_SECONDS = float(os.getenv("AI_CACHE_TTL_SECONDS", "86400"))
+# Optional persistent tier shared across restarts and workers; memory only when unset.
+AI_CACHE_SQLITE_PATH = os.getenv("AI_CACHE_SQLITE_PATH")
+
+# Column mappings (services.columns) are cached per header row, so repeat
+# uploads from the same bank or accounting export skip inference entirely.
+COLUMN_MAPPING_CACHE_SIZE = int(os.getenv("COLUMN_MAPPING_CACHE_SIZE", "512"))
+COLUMN_MAPPING_CACHE_TTL = float(os.getenv("COLUMN_MAPPING_CACHE_TTL", str(30 * 86400)))
+COLUMN_MAPPING_CACHE_PATH = os.getenv("COLUMN_MAPPING_CACHE_PATH")
+
+def _normalize(value):
+    # Money is compared to the cent and modifiers to the 1% slider step, so
+    # floats are rounded to two decimals; dict order never affects the key.
+    if isinstance(value, bool) or value is None or isinstance(value, str):
+        return value
+    if isinstance(value, (int, float)):
+        # 1000 and 1000.0 from different clients are the same amount
+        return round(float(value), 2) + 0.0
+    if isinstance(value, dict):
+        return {str(k): _normalize(v) for k, v in sorted(value.items(), key=lambda item: str(item[0]))}
+    if isinstance(value, (list, tuple)):
+        return [_normalize(v) for v in value]
+    if isinstance(value, (datetime.date, datetime.datetime)):
+        return value.isoformat()
+    if hasattr(value, "item"):
+        # numpy scalars
+        return _normalize(value.item())
+    return str(value)
+
+def cache_key(namespace: str, *parts):
+    """
+    Content address for a set of prompt inputs: a SHA-256 over their
+    normalized JSON form.
+    """
+    payload = json.dumps([namespace, _normalize(list(parts))], sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+class ResultCache:
+    """
+    LRU + TTL cache for JSON-serializable results, with an optional SQLite
+    tier behind the in-memory one. Errors from the SQLite tier (locked or
+    unwritable file, corrupt row) are logged and treated as a miss or a
+    memory-only store, so a cache problem never fails the caller.
+    """
+
+    def __init__(self, max_entries: int = AI_CACHE_MAX_ENTRIES, ttl_seconds: float = AI_CACHE_TTL_SECONDS,
+                 sqlite_path: str = None):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.disk_hits = 0
+        self.disk_errors = 0
+
+        self._db = None
+        if sqlite_path:
+            self._db = sqlite3.connect(sqlite_path, check_same_thread=False)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS result_cache (key TEXT PRIMARY KEY, value TEXT NOT NULL, stored_at REAL NOT NULL)"
+            )
+            self._db.commit()
+
+    def get(self, key: str):
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                stored_at, value = entry
+                if now - stored_at <= self.ttl_seconds:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._entries[key]
+                self.evictions += 1
+
+            if self._db is not None:
+                try:
+                    row = self._db.execute(
+                        "SELECT value, stored_at FROM result_cache WHERE key = ?", (key,)
+                    ).fetchone()
+                    value = json.loads(row[0]) if row is not None and now - row[1] <= self.ttl_seconds else None
+                except (sqlite3.Error, ValueError) as e:
+                    self._disk_error("read", e)
+                    value = None
+                if value is not None:
+                    self._store(key, value, row[1])
+                    self.hits += 1
+                    self.disk_hits += 1
+                    return value
+
+            self.misses += 1
+            return None
+
+    def set(self, key: str, value):
+        now = time.time()
+        with self._lock:
+            self._store(key, value, now)
+            if self._db is not None:
+                try:
+                    self._db.execute(
+                        "INSERT OR REPLACE INTO result_cache (key, value, stored_at) VALUES (?, ?, ?)",
+                        (key, json.dumps(value), now)
+                    )
+                    self._db.execute("DELETE FROM result_cache WHERE stored_at < ?", (now - self.ttl_seconds,))
+                    self._db.commit()
+                except (sqlite3.Error, TypeError, ValueError) as e:
+                    self._disk_error("write", e)
+
+    def _disk_error(self, action: str, error: Exception):
+        # Called with the lock held
+        self.disk_errors += 1
+        logger.warning("Result cache %s failed: %s", action, error)
+        try:
+            self._db.rollback()
+        except sqlite3.Error:
+            pass
+
+    def _store(self, key: str, value, stored_at: float):
+        self._entries[key] = (stored_at, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            if self._db is not None:
+                self._db.execute("DELETE FROM result_cache")
+                self._db.commit()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "disk_hits": self.disk_hits,
+                "disk_errors": self.disk_errors,
+                "size": len(self._entries),
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "persistent": self._db is not None
+            }
+
+# Shared cache for AI assessments and scenario critiques.
+ai_cache = ResultCache(sqlite_path=AI_CACHE_SQLITE_PATH)
+# Inferred column mappings, keyed by header row.
+mapping_cache = ResultCache(max_entries=COLUMN_MAPPING_CACHE_SIZE, ttl_seconds=COLUMN_MAPPING_CACHE_TTL,
+                            sqlite_path=COLUMN_MAPPING_CACHE_PATH)
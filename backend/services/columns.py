@@ -0,0 +1,289 @@
+import csv
+import re
+import numpy as np
+import pandas as pd
+
+from services.cache import cache_key, mapping_cache
+
+# Rows looked at when inferring roles and formats from content
+INFERENCE_SAMPLE_ROWS = 200
+# Share of sampled values that must parse for a column/format to qualify
+MIN_PARSE_RATE = 0.8
+# CSV delimiters told apart from the start of the file
+CSV_DELIMITERS = ",;\t|"
+CSV_SNIFF_BYTES = 64 * 1024
+
+# Normalized header -> role. "debit"/"credit" are split-amount columns;
+# "ignore" keeps look-alikes (running balances) out of content inference.
+HEADER_SYNONYMS = {
+    "date": ["date", "txn date", "transaction date", "trans date", "posting date", "posted date", "post date",
+             "booking date", "value date", "entry date", "invoice date", "posted"],
+    "amount": ["amount", "value", "amt", "sum", "total", "net amount", "transaction amount",
+               "txn amount", "amount gbp", "amount usd", "amount eur", "amount inr"],
+    "debit": ["debit", "debits", "debit amount", "withdrawal", "withdrawals", "money out", "paid out", "dr",
+              "outflow", "spent"],
+    "credit": ["credit", "credits", "credit amount", "deposit", "deposits", "money in", "paid in", "cr",
+               "inflow", "received"],
+    "type": ["type", "direction", "txn type", "transaction type", "dr cr", "cr dr", "debit credit",
+             "credit debit", "flow", "in out", "kind"],
+    "category": ["category", "categories", "account", "account name", "ledger", "class", "description",
+                 "details", "memo", "narrative", "particulars", "payee", "merchant", "reference"],
+    "ignore": ["balance", "running balance", "closing balance", "available balance"]
+}
+ROLE_BY_HEADER = {name: role for role, names in HEADER_SYNONYMS.items() for name in names}
+# When several headers map to one role, the earlier synonym wins
+# (e.g. "category" over "description").
+HEADER_RANK = {name: rank for names in HEADER_SYNONYMS.values() for rank, name in enumerate(names)}
+
+ROLES = ("date", "amount", "debit", "credit", "type", "category")
+
+INCOME_LABELS = {"income", "credit", "cr", "c", "deposit", "in", "inflow", "revenue", "sale", "sales",
+                 "receipt", "received", "money in", "+"}
+EXPENSE_LABELS = {"expense", "expenses", "debit", "dr", "d", "withdrawal", "out", "outflow", "payment",
+                  "cost", "purchase", "spend", "money out", "-"}
+
+DIRECTIONS = ["", "income", "expense"]
+
+DATE_FORMATS = ["%Y-%m-%d", "%Y-%m-%d %H:%M:%S", "%d/%m/%Y", "%m/%d/%Y", "%d-%m-%Y", "%m-%d-%Y", "%d.%m.%Y",
+                "%Y/%m/%d", "%d/%m/%y", "%m/%d/%y", "%d-%b-%Y", "%d %b %Y", "%b %d, %Y", "%d-%b-%y", "%Y%m%d"]
+
+_DECIMAL_COMMA = re.compile(r"^[^.,]*(\.\d{3})*,\d{1,2}$")
+
+def sniff_delimiter(path: str):
+    """
+    A CSV ledger's field delimiter, sniffed from its first lines: exports
+    with decimal commas use ";", some banks tabs. "," when it cannot be told.
+    """
+    with open(path, newline="", encoding="utf-8-sig", errors="replace") as handle:
+        sample = handle.read(CSV_SNIFF_BYTES)
+    if len(sample) == CSV_SNIFF_BYTES and "\n" in sample:
+        # Whole lines only
+        sample = sample[:sample.rindex("\n")]
+    try:
+        return csv.Sniffer().sniff(sample, delimiters=CSV_DELIMITERS).delimiter
+    except csv.Error:
+        return ","
+
+def normalize_header(name):
+    return " ".join(re.sub(r"[^a-z0-9]+", " ", str(name).lower()).split())
+
+def header_role(name):
+    return ROLE_BY_HEADER.get(normalize_header(name))
+
+def _sample(series: pd.Series):
+    return series.dropna().head(INFERENCE_SAMPLE_ROWS)
+
+def infer_date_format(series: pd.Series):
+    """
+    Returns (format, parse rate) for the best candidate format, or None as
+    the format when values are already datetimes. Parsing with an explicit
+    format is vectorized; guessing per value is not.
+    """
+    sample = _sample(series)
+    if pd.api.types.is_datetime64_any_dtype(series) or len(sample) == 0:
+        return None, 1.0 if len(sample) else 0.0
+    if pd.api.types.is_numeric_dtype(series):
+        return None, 0.0
+    text = sample.astype(str).str.strip()
+    best, best_rate = None, 0.0
+    for candidate in DATE_FORMATS:
+        rate = pd.to_datetime(text, format=candidate, errors="coerce").notna().mean()
+        if rate > best_rate:
+            best, best_rate = candidate, rate
+        if rate == 1.0:
+            break
+    return best, best_rate
+
+def infer_decimal(series: pd.Series):
+    if pd.api.types.is_numeric_dtype(series):
+        return "."
+    text = _sample(series).astype(str).str.strip()
+    if len(text) and text.str.match(_DECIMAL_COMMA).mean() > 0.5:
+        return ","
+    return "."
+
+def parse_numbers(series: pd.Series, decimal: str = "."):
+    """
+    Vectorized amount parsing: currency symbols, spaces and thousands
+    separators are dropped; "(12.50)" and "12.50-" are negative.
+    """
+    if pd.api.types.is_numeric_dtype(series) and not pd.api.types.is_bool_dtype(series):
+        return series.astype(np.float64)
+    text = series.astype("string").str.strip()
+    negative = (text.str.startswith("(") & text.str.endswith(")")) | text.str.endswith("-")
+    cleaned = text.str.replace(r"[^0-9,.\-]", "", regex=True).str.rstrip("-")
+    if decimal == ",":
+        cleaned = cleaned.str.replace(".", "", regex=False).str.replace(",", ".", regex=False)
+    else:
+        cleaned = cleaned.str.replace(",", "", regex=False)
+    values = pd.to_numeric(cleaned, errors="coerce").astype(np.float64)
+    return values.where(~negative.fillna(False).to_numpy(dtype=bool), -values.abs())
+
+def parse_dates(series: pd.Series, date_format):
+    if pd.api.types.is_datetime64_any_dtype(series):
+        return series
+    if not date_format:
+        return pd.to_datetime(series, errors="coerce", format="mixed")
+    dates = pd.to_datetime(series, format=date_format, errors="coerce")
+    # Padded values only fail the strict format; retry just those stripped.
+    missed = dates.isna() & series.notna()
+    if missed.any():
+        dates[missed] = pd.to_datetime(series[missed].astype(str).str.strip(), format=date_format, errors="coerce")
+    return dates
+
+def classify_directions(series: pd.Series):
+    """
+    Maps a type/direction column to "income"/"expense"/"" by classifying each
+    distinct label once.
+    """
+    labels = pd.Categorical(series)
+    names = [str(label).strip().lower() for label in labels.categories]
+    lookup = np.array(
+        [1 if name in INCOME_LABELS else 2 if name in EXPENSE_LABELS else 0 for name in names] + [0],
+        dtype=np.int8
+    )
+    return _directions(lookup[labels.codes])
+
+def _directions(codes: np.ndarray):
+    # Categorical rather than a column of strings: no per-row string objects.
+    return pd.Categorical.from_codes(codes, DIRECTIONS)
+
+def _number_rate(series: pd.Series, decimal: str):
+    sample = _sample(series)
+    if len(sample) == 0 or pd.api.types.is_datetime64_any_dtype(series):
+        return 0.0
+    return parse_numbers(sample, decimal).notna().mean()
+
+def infer_mapping(frame: pd.DataFrame):
+    """
+    Works out which column plays which role (date, amount or debit/credit,
+    direction, category) from header synonyms, then from content for roles
+    still missing, and records the date format and decimal separator.
+    Raises ValueError when no amount can be identified.
+    """
+    roles = {}
+    for column in frame.columns:
+        role = header_role(column)
+        if role is None:
+            continue
+        current = roles.get(role)
+        if current is None or HEADER_RANK[normalize_header(column)] < HEADER_RANK[normalize_header(current)]:
+            roles[role] = column
+    roles.pop("ignore", None)
+    assigned = set(roles.values())
+    ignored = {column for column in frame.columns if header_role(column) == "ignore"}
+    unassigned = [column for column in frame.columns if column not in assigned and column not in ignored]
+
+    if "date" not in roles:
+        best, best_rate = None, 0.0
+        for column in unassigned:
+            _, rate = infer_date_format(frame[column])
+            if rate > best_rate:
+                best, best_rate = column, rate
+        if best is not None and best_rate >= MIN_PARSE_RATE:
+            roles["date"] = best
+            unassigned.remove(best)
+
+    if "amount" not in roles and not ("debit" in roles or "credit" in roles):
+        for column in unassigned:
+            if _number_rate(frame[column], infer_decimal(frame[column])) >= MIN_PARSE_RATE:
+                roles["amount"] = column
+                unassigned.remove(column)
+                break
+
+    if "category" not in roles:
+        for column in unassigned:
+            sample = _sample(frame[column])
+            if pd.api.types.is_object_dtype(sample) or pd.api.types.is_string_dtype(sample):
+                if _number_rate(frame[column], ".") < MIN_PARSE_RATE:
+                    roles["category"] = column
+                    break
+
+    if "amount" not in roles and "debit" not in roles and "credit" not in roles:
+        raise ValueError(
+            "Could not identify an amount column. Expected a header such as Amount, Value, or Debit/Credit; "
+            f"found: {', '.join(str(c) for c in frame.columns)}"
+        )
+
+    if "type" in roles and not classify_directions(_sample(frame[roles["type"]])).codes.any():
+        # Labels we cannot read as income/expense; fall back to amount signs.
+        del roles["type"]
+
+    amount_columns = [roles[role] for role in ("amount", "debit", "credit") if role in roles]
+    date_format = infer_date_format(frame[roles["date"]])[0] if "date" in roles else None
+    return {
+        **{role: str(column) for role, column in roles.items()},
+        "date_format": date_format,
+        "decimal": infer_decimal(frame[amount_columns[0]])
+    }
+
+def header_fingerprint(columns):
+    return cache_key("column-mapping", [normalize_header(column) for column in columns])
+
+def resolve_mapping(frame: pd.DataFrame):
+    """
+    The cached mapping for this header row, or a freshly inferred one. A
+    cached date format that no longer parses the sample is re-inferred.
+    """
+    key = header_fingerprint(frame.columns)
+    mapping = mapping_cache.get(key)
+    if mapping is not None and all(mapping[role] in frame.columns for role in ROLES if mapping.get(role)):
+        date_column, date_format = mapping.get("date"), mapping["date_format"]
+        if not date_column or not date_format or _format_rate(frame[date_column], date_format) >= MIN_PARSE_RATE:
+            return mapping
+    mapping = infer_mapping(frame)
+    mapping_cache.set(key, mapping)
+    return mapping
+
+def _format_rate(series: pd.Series, date_format: str):
+    sample = _sample(series)
+    if len(sample) == 0 or pd.api.types.is_datetime64_any_dtype(series):
+        return 1.0
+    return pd.to_datetime(sample.astype(str).str.strip(), format=date_format, errors="coerce").notna().mean()
+
+def apply_mapping(frame: pd.DataFrame, mapping: dict):
+    """
+    Rewrites a raw chunk into the engine's standard columns: date, category,
+    amount and type ("income"/"expense"/"").
+    """
+    decimal = mapping["decimal"]
+    standard = pd.DataFrame(index=frame.index)
+
+    if mapping.get("date"):
+        standard["date"] = parse_dates(frame[mapping["date"]], mapping["date_format"])
+    if mapping.get("category"):
+        standard["category"] = frame[mapping["category"]]
+
+    if mapping.get("amount"):
+        amounts = parse_numbers(frame[mapping["amount"]], decimal).to_numpy()
+        if mapping.get("type"):
+            # The type column gives the direction; bank exports often sign
+            # debits too, which must not turn them into negative expenses
+            standard["amount"] = np.abs(amounts)
+            standard["type"] = classify_directions(frame[mapping["type"]])
+        else:
+            # Signed amounts: positive is income, negative is expense
+            standard["amount"] = np.abs(amounts)
+            standard["type"] = _directions(np.where(amounts > 0, 1, np.where(amounts < 0, 2, 0)))
+    else:
+        debit = parse_numbers(frame[mapping["debit"]], decimal).fillna(0.0).abs().to_numpy() \
+            if mapping.get("debit") else np.zeros(len(frame))
+        credit = parse_numbers(frame[mapping["credit"]], decimal).fillna(0.0).abs().to_numpy() \
+            if mapping.get("credit") else np.zeros(len(frame))
+        standard["amount"] = np.where(credit > 0, credit, debit)
+        standard["type"] = _directions(np.where(credit > 0, 1, np.where(debit > 0, 2, 0)))
+
+    standard["amount"] = standard["amount"].fillna(0.0)
+    return standard
+
+def ensure_classified(metrics: dict):
+    """
+    Refuses a ledger whose rows were read but none counted as income or
+    expense, instead of reporting zero revenue for a misread file.
+    """
+    if metrics["row_count"] and not metrics["revenue"] and not metrics["expenses"]:
+        raise ValueError(
+            f"None of the {metrics['row_count']} rows could be read as income or expense; "
+            "check the amount and type columns"
+        )
+    return metrics
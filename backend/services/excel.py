@@ -0,0 +1,303 @@
+import datetime
+import posixpath
+import zipfile
+import xml.etree.ElementTree as ET
+import numpy as np
+import pandas as pd
+from openpyxl.styles.numbers import BUILTIN_FORMATS, is_date_format
+
+from services.columns import header_role
+
+# How far down a sheet to look for the header row (exports often start with
+# a title, company name or blank lines)
+HEADER_SCAN_ROWS = 20
+HEADER_SCAN_COLUMNS = 64
+
+COLUMN_NUMBER = "number"
+COLUMN_DATE = "date"
+COLUMN_TEXT = "text"
+
+_REL_NS = "{http://schemas.openxmlformats.org/officeDocument/2006/relationships}"
+_PKG_REL_NS = "{http://schemas.openxmlformats.org/package/2006/relationships}"
+_TEXT_TYPES = {"s", "str", "inlineStr"}
+
+def _local(tag: str):
+    return tag.rpartition("}")[2]
+
+_column_indexes = {}
+
+def _column_index(ref: str):
+    # "AB12" -> 27; letters are cached since every row repeats them
+    letters = ref.rstrip("0123456789")
+    index = _column_indexes.get(letters)
+    if index is None:
+        index = 0
+        for char in letters:
+            index = index * 26 + ord(char) - 64
+        index = _column_indexes[letters] = index - 1
+    return index
+
+class XlsxReader:
+    """
+    Streaming reader for .xlsx ledgers. Rows come straight from the sheet XML
+    as raw (value, type, style) cells; converting them is left to whole
+    columns, which is where pd.read_excel spends most of its time per cell.
+    """
+
+    def __init__(self, source):
+        self._zip = zipfile.ZipFile(source)
+        relations = self._relations("xl/_rels/workbook.xml.rels")
+        self.shared_strings = self._read_shared_strings(relations.get("sharedStrings"))
+        self.date_styles = self._read_date_styles(relations.get("styles"))
+        self.epoch, self.sheets = self._read_workbook(relations)
+
+    def close(self):
+        self._zip.close()
+
+    def _relations(self, path: str):
+        # Relationship type (last path segment) -> target, plus id -> target
+        relations = {}
+        if path not in self._zip.namelist():
+            return relations
+        for element in ET.fromstring(self._zip.read(path)).iter(_PKG_REL_NS + "Relationship"):
+            target = element.get("Target", "")
+            target = target.lstrip("/") if target.startswith("/") else posixpath.normpath(posixpath.join("xl", target))
+            relations[element.get("Id")] = target
+            relations.setdefault(element.get("Type", "").rpartition("/")[2], target)
+        return relations
+
+    def _read_workbook(self, relations: dict):
+        root = ET.fromstring(self._zip.read("xl/workbook.xml"))
+        epoch = np.datetime64("1899-12-30")
+        sheets = []
+        for element in root.iter():
+            name = _local(element.tag)
+            if name == "workbookPr" and element.get("date1904") in ("1", "true"):
+                epoch = np.datetime64("1904-01-01")
+            elif name == "sheet":
+                path = relations.get(element.get(_REL_NS + "id"))
+                if path:
+                    sheets.append((element.get("name"), path))
+        return epoch, sheets
+
+    def _read_shared_strings(self, path: str):
+        if not path:
+            return np.array([], dtype=object)
+        strings = []
+        for _, element in ET.iterparse(self._zip.open(path)):
+            if _local(element.tag) == "si":
+                # Plain <t> or rich-text runs <r><t>; phonetic hints (<rPh>) are skipped.
+                strings.append("".join(
+                    part.text or "" for child in element
+                    for part in ([child] if _local(child.tag) == "t" else child.iter() if _local(child.tag) == "r" else [])
+                    if _local(part.tag) == "t"
+                ))
+                element.clear()
+        return np.array(strings, dtype=object)
+
+    def _read_date_styles(self, path: str):
+        if not path:
+            return set()
+        root = ET.fromstring(self._zip.read(path))
+        formats = dict(BUILTIN_FORMATS)
+        date_styles = set()
+        for element in root.iter():
+            if _local(element.tag) == "numFmt":
+                formats[int(element.get("numFmtId"))] = element.get("formatCode", "")
+            elif _local(element.tag) == "cellXfs":
+                for index, xf in enumerate(element):
+                    if is_date_format(formats.get(int(xf.get("numFmtId", 0)), "")):
+                        date_styles.add(str(index))
+        return date_styles
+
+    def iter_blocks(self, path: str, width: int, rows: int, skip: int = 0):
+        """
+        Yields the sheet's non-empty rows, after the first `skip`, in blocks
+        of up to `rows` rows. A block is three flat lists (raw values, cell
+        types, styles) holding exactly `width` cells per row, so column j of
+        the block is simply values[j::width]. Flat lists instead of a list per
+        row keep garbage collection out of the hot loop.
+        """
+        tags = None
+        values, types, styles = [], [], []
+        row_start = 0
+        count = 0
+        for _, element in ET.iterparse(self._zip.open(path)):
+            if tags is None:
+                namespace = element.tag[:element.tag.index("}") + 1] if element.tag.startswith("{") else ""
+                tags = tuple(namespace + name for name in ("c", "v", "row", "t"))
+            cell_tag, value_tag, row_tag, text_tag = tags
+
+            tag = element.tag
+            if tag == cell_tag:
+                ref = element.get("r")
+                position = _column_index(ref) if ref else len(values) - row_start
+                if position >= width:
+                    continue
+                gap = position - (len(values) - row_start)
+                if gap > 0:
+                    values.extend([None] * gap)
+                    types.extend([None] * gap)
+                    styles.extend([None] * gap)
+                kind = element.get("t")
+                if kind == "inlineStr":
+                    value = "".join(part.text or "" for part in element.iter(text_tag))
+                else:
+                    node = element.find(value_tag)
+                    value = node.text if node is not None else None
+                values.append(value)
+                # A missing t attribute means a number
+                types.append((kind or "n") if value is not None else None)
+                styles.append(element.get("s"))
+            elif tag == row_tag:
+                # Free the parsed cells; only an empty row element stays behind.
+                element.clear()
+                if skip or not any(types[row_start:]):
+                    if any(types[row_start:]):
+                        skip -= 1
+                    del values[row_start:], types[row_start:], styles[row_start:]
+                    continue
+                gap = width - (len(values) - row_start)
+                if gap:
+                    values.extend([None] * gap)
+                    types.extend([None] * gap)
+                    styles.extend([None] * gap)
+                row_start += width
+                count += 1
+                if count == rows:
+                    yield values, types, styles
+                    values, types, styles = [], [], []
+                    row_start = count = 0
+        if count:
+            yield values, types, styles
+
+    def cell_value(self, value, kind, style):
+        """
+        Converts one raw cell; used for header rows and for columns whose
+        cells turn out to be of mixed types.
+        """
+        if value is None or kind == "e":
+            return None
+        if kind == "s":
+            return self.shared_strings[int(value)]
+        if kind in ("str", "inlineStr"):
+            return value
+        if kind == "b":
+            return value == "1"
+        if kind == "d":
+            return pd.Timestamp(value).to_pydatetime()
+        number = float(value)
+        if style in self.date_styles:
+            return pd.Timestamp(self.serial_to_datetime(np.array([number]))[0]).to_pydatetime()
+        return number
+
+    def serial_to_datetime(self, serials: np.ndarray):
+        # Excel stores dates as days since the workbook epoch; keep ms precision.
+        milliseconds = np.round(serials * 86_400_000)
+        return self.epoch.astype("datetime64[ms]") + milliseconds.astype("timedelta64[ms]")
+
+def _header_score(row: list):
+    # Cells naming a ledger role (any known header variant) count as matches.
+    names = [value for value in row if value is not None and str(value).strip()]
+    return sum(1 for name in names if header_role(name) not in (None, "ignore")), len(names)
+
+def find_header(rows: list):
+    """
+    Picks the header row among the first rows of a sheet: the one naming the
+    most ledger columns, else the first row with two or more text cells.
+    Returns its index, or None for an empty sheet.
+    """
+    best, best_score = None, 0
+    fallback = None
+    for index, row in enumerate(rows):
+        known, filled = _header_score(row)
+        if known > best_score:
+            best, best_score = index, known
+        if fallback is None and filled >= 2 and all(isinstance(v, str) for v in row if v is not None):
+            fallback = index
+    return best if best is not None else fallback
+
+def _select_sheet(reader: XlsxReader):
+    # The first sheet whose header names a ledger column wins; otherwise the
+    # first sheet with any header at all.
+    fallback = None
+    for _, path in reader.sheets:
+        head = []
+        for values, types, styles in reader.iter_blocks(path, HEADER_SCAN_COLUMNS, HEADER_SCAN_ROWS):
+            cells = [reader.cell_value(*cell) for cell in zip(values, types, styles)]
+            head = [cells[start:start + HEADER_SCAN_COLUMNS] for start in range(0, len(cells), HEADER_SCAN_COLUMNS)]
+            break
+        header = find_header(head)
+        if header is None:
+            continue
+        if _header_score(head[header])[0]:
+            return path, header, head[header]
+        if fallback is None:
+            fallback = (path, header, head[header])
+    if fallback is None:
+        raise ValueError("No ledger table found in workbook")
+    return fallback
+
+def infer_column_kind(reader: XlsxReader, types: tuple, styles: tuple):
+    """
+    Classifies a column once, from the first cell that has a value, so later
+    chunks are converted with a single typed array call.
+    """
+    for kind, style in zip(types, styles):
+        if kind is None:
+            continue
+        if kind in _TEXT_TYPES:
+            return COLUMN_TEXT
+        if kind == "d" or (kind == "n" and style in reader.date_styles):
+            return COLUMN_DATE
+        return COLUMN_NUMBER
+    return COLUMN_TEXT
+
+def convert_column(reader: XlsxReader, kind: str, values: tuple, types: tuple, styles: tuple):
+    present = {t for t in set(types) if t is not None}
+    uniform = present <= {"n"} if kind != COLUMN_TEXT else present <= {"s"} or present <= {"str", "inlineStr"}
+    if kind == COLUMN_DATE and uniform and set(styles) <= reader.date_styles | {None}:
+        serials = pd.to_numeric(pd.Series(values, dtype=object)).to_numpy(dtype=np.float64)
+        return reader.serial_to_datetime(serials).astype("datetime64[ns]")
+    if kind == COLUMN_NUMBER and uniform:
+        return pd.to_numeric(pd.Series(values, dtype=object)).to_numpy(dtype=np.float64)
+    if kind == COLUMN_TEXT and uniform and present == {"s"}:
+        indices = np.array([-1 if value is None else value for value in values], dtype=np.int64)
+        strings = np.append(reader.shared_strings, None)
+        return strings[indices]
+    if kind == COLUMN_TEXT and uniform:
+        return np.array(values, dtype=object)
+    # Mixed cells (e.g. a text note in an amount column): convert one by one
+    # and let the metrics engine coerce what it can.
+    return np.array([reader.cell_value(*cell) for cell in zip(values, types, styles)], dtype=object)
+
+def iter_excel_frames(source, chunksize: int):
+    """
+    Streams an .xlsx workbook (path or file object) as DataFrame chunks. The
+    ledger sheet and its header row are detected automatically, blank rows
+    are skipped and each column is typed once, then converted per chunk.
+    """
+    reader = XlsxReader(source)
+    try:
+        path, header_index, header = _select_sheet(reader)
+        # Trailing empty header cells do not widen the table.
+        names = [str(value).strip() if value is not None else None for value in header]
+        while names and not names[-1]:
+            names.pop()
+        keep = [index for index, name in enumerate(names) if name]
+        width = len(names)
+
+        kinds = None
+        for values, types, styles in reader.iter_blocks(path, width, chunksize, skip=header_index + 1):
+            if kinds is None:
+                kinds = {index: infer_column_kind(reader, types[index::width], styles[index::width]) for index in keep}
+            yield pd.DataFrame({
+                names[index]: convert_column(reader, kinds[index], values[index::width], types[index::width],
+                                             styles[index::width])
+                for index in keep
+            })
+        if kinds is None:
+            # Header only: an empty frame still carries the column names.
+            yield pd.DataFrame({names[index]: [] for index in keep})
+    finally:
+        reader.close()
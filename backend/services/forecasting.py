@@ -0,0 +1,408 @@
+import json
+import os
+import warnings
+from datetime import datetime
+import numpy as np
+from sqlalchemy.orm import Session
+from dotenv import load_dotenv
+
+from models import FinancialRecord, CompanyForecast
+from services.ledger_store import convert_ledger, is_stored_ledger
+from services.metrics import TYPE_INCOME, TYPE_EXPENSE
+from services.rollups import dated_columns, ledger_fingerprints
+from services.scoring import NON_OPERATING_INCOME
+
+load_dotenv()
+
+# Days forecast ahead unless the caller asks otherwise
+FORECAST_HORIZON_DAYS = int(os.getenv("FORECAST_HORIZON_DAYS", "90"))
+# Trailing history the non-recurring cash flow is averaged over
+FORECAST_LOOKBACK_DAYS = int(os.getenv("FORECAST_LOOKBACK_DAYS", "180"))
+# A day's amount in a category is anomalous when its robust z-score (rolling
+# median/MAD) is beyond this
+ANOMALY_Z = float(os.getenv("ANOMALY_Z", "3.5"))
+# Preceding days of the same category the rolling statistics cover; with
+# fewer than ANOMALY_MIN_PERIODS the category's whole history is used, and
+# categories seen on fewer days than that are compared with the type's
+ANOMALY_WINDOW = 60
+ANOMALY_MIN_PERIODS = 10
+# The spread is never taken below this share of the median, so a run of
+# identical amounts does not make every small difference an anomaly
+MIN_RELATIVE_SPREAD = 0.05
+# A category is recurring with at least RECURRING_MIN_OCCURRENCES days whose
+# intervals and amounts stay within these shares of their medians, and a
+# median interval close to one of CADENCES (days)
+RECURRING_MIN_OCCURRENCES = 3
+RECURRING_INTERVAL_TOLERANCE = 0.2
+RECURRING_AMOUNT_TOLERANCE = 0.25
+CADENCES = {"weekly": 7.0, "fortnightly": 14.0, "monthly": 30.44, "quarterly": 91.31, "yearly": 365.25}
+# Cadences projected on the calendar (same day of the month) rather than
+# every interval_days
+CADENCE_MONTHS = {"monthly": 1, "quarterly": 3, "yearly": 12}
+# Scales the MAD to a standard deviation for normally distributed data
+MAD_SCALE = 1.4826
+# z of the 10th/90th percentiles for the forecast band
+BAND_Z = 1.2816
+# Anomalies listed per forecast, newest first
+MAX_ANOMALIES = 50
+# Companies per commit when refreshing stored forecasts
+FORECAST_BATCH = 500
+
+def _group_median(groups: np.ndarray, values: np.ndarray):
+    # (group ids, median per group) in one sort
+    if not len(groups):
+        return groups, values.astype(np.float64)
+    order = np.lexsort((values, groups))
+    groups, values = groups[order], values[order]
+    starts = np.flatnonzero(np.r_[True, groups[1:] != groups[:-1]])
+    counts = np.diff(np.r_[starts, len(groups)])
+    return groups[starts], (values[starts + (counts - 1) // 2] + values[starts + counts // 2]) / 2
+
+def ledger_days(columns: dict):
+    """
+    Collapses ledger columns to one amount per (category, type, day) for
+    income and expense rows: several payroll rows on one day are one
+    payment. Returns arrays sorted by group then day: group (category code
+    * 2 + is_expense), day (days since the epoch), amount.
+    """
+    keep = np.isin(columns["type_codes"], (TYPE_INCOME, TYPE_EXPENSE)) & ~np.isnat(columns["dates"])
+    groups = columns["category_codes"][keep].astype(np.int64) * 2 + (columns["type_codes"][keep] == TYPE_EXPENSE)
+    days = columns["dates"][keep].astype("datetime64[D]").astype(np.int64)
+    if not len(days):
+        return {"group": groups, "day": days, "amount": np.zeros(0)}
+
+    span = days.max() - days.min() + 1
+    keys, inverse = np.unique(groups * span + (days - days.min()), return_inverse=True)
+    return {
+        "group": keys // span,
+        "day": keys % span + days.min(),
+        "amount": np.bincount(inverse, weights=columns["amounts"][keep], minlength=len(keys))
+    }
+
+def recurring_series(days: dict, end_day: int):
+    """
+    Categories paid or received on a regular cadence (rent, payroll,
+    subscriptions, retainers): per group the cadence, median interval and
+    amount, the amount's spread and the last day seen. A series counts as
+    active while it is less than two intervals overdue at `end_day`.
+    """
+    group, day, amount = days["group"], days["day"], days["amount"]
+    same = np.r_[False, group[1:] == group[:-1]]
+    interval_groups, intervals = group[same], np.diff(day)[same[1:]]
+
+    ids, counts = np.unique(group, return_counts=True)
+    if not len(intervals):
+        return {}
+    interval_ids, interval_median = _group_median(interval_groups, intervals.astype(np.float64))
+    position = np.searchsorted(interval_ids, interval_groups)
+    _, interval_mad = _group_median(interval_groups, np.abs(intervals - interval_median[position]))
+
+    _, amount_median = _group_median(group, amount)
+    _, amount_mad = _group_median(group, np.abs(amount - amount_median[np.searchsorted(ids, group)]))
+    last_day = day[np.r_[np.flatnonzero(~same[1:]), len(day) - 1]]
+
+    # Only groups with at least one interval reach interval_ids
+    with_intervals = np.isin(ids, interval_ids)
+    ids, counts = ids[with_intervals], counts[with_intervals]
+    amount_median, amount_mad = amount_median[with_intervals], amount_mad[with_intervals]
+    last_day = last_day[with_intervals]
+
+    cadence_days = np.array(list(CADENCES.values()))
+    error = np.abs(interval_median[:, None] - cadence_days) / cadence_days
+    nearest = error.argmin(axis=1)
+    regular = (
+        (counts >= RECURRING_MIN_OCCURRENCES)
+        & (error[np.arange(len(ids)), nearest] <= RECURRING_INTERVAL_TOLERANCE)
+        & (interval_mad <= RECURRING_INTERVAL_TOLERANCE * interval_median)
+        & (amount_mad <= RECURRING_AMOUNT_TOLERANCE * amount_median)
+    )
+    names = list(CADENCES)
+    return {
+        int(ids[i]): {
+            "cadence": names[nearest[i]],
+            "interval_days": float(interval_median[i]),
+            "amount": float(amount_median[i]),
+            "spread": float(max(amount_mad[i] * MAD_SCALE, MIN_RELATIVE_SPREAD * amount_median[i])),
+            "occurrences": int(counts[i]),
+            "last_day": int(last_day[i]),
+            "active": bool(end_day - last_day[i] < 2 * interval_median[i])
+        }
+        for i in np.flatnonzero(regular)
+    }
+
+def _rolling_robust(values: np.ndarray, position: np.ndarray, targets: np.ndarray,
+                    window: int = ANOMALY_WINDOW, block: int = 50_000):
+    # Median and MAD of the up to `window` values before each target within
+    # its run (`position` counts from the start of the run; NaN at 0). Full
+    # windows are gathered in blocks to bound the window matrix's memory;
+    # only targets with a shorter history need the slower NaN-aware median.
+    median = np.full(len(targets), np.nan)
+    mad = np.full(len(targets), np.nan)
+    offsets = np.arange(-window, 0)
+    partial = np.flatnonzero(position[targets] < window)
+    if len(partial):
+        rows = targets[partial]
+        windows = np.where(offsets >= -position[rows][:, None], values[np.maximum(rows[:, None] + offsets, 0)],
+                           np.nan)
+        with np.errstate(all="ignore"), warnings.catch_warnings():
+            # A run's first value has an all-NaN window
+            warnings.simplefilter("ignore", RuntimeWarning)
+            median[partial] = np.nanmedian(windows, axis=1)
+            mad[partial] = np.nanmedian(np.abs(windows - median[partial, None]), axis=1)
+    full = np.flatnonzero(position[targets] >= window)
+    for start in range(0, len(full), block):
+        chunk = full[start:start + block]
+        windows = values[targets[chunk][:, None] + offsets]
+        median[chunk] = np.median(windows, axis=1)
+        mad[chunk] = np.median(np.abs(windows - median[chunk, None]), axis=1)
+    return median, mad
+
+def detect_anomalies(days: dict, series: dict):
+    """
+    Robust z-score of every (category, type, day) amount. Recurring
+    categories are judged against their own median amount, so a rent rise
+    or a short payroll shows. Everything else is judged against the rolling
+    median/MAD of the category's preceding days (its whole history while
+    that is short) and, for categories seen on fewer than
+    ANOMALY_MIN_PERIODS days, of all preceding days of the same type; only
+    spikes (a one-off grant, an unusual purchase) count there. Returns (z,
+    anomalous, expected amount).
+    """
+    group, amount = days["group"], days["amount"]
+    count = len(amount)
+    first = np.r_[True, group[1:] != group[:-1]]
+    run = np.cumsum(first) - 1
+    starts = np.flatnonzero(first)
+    position = np.arange(count) - starts[run]
+    size = np.diff(np.r_[starts, count])[run]
+
+    # The category's own history (days are sorted by group, then day)
+    expected, mad = _rolling_robust(amount, position, np.arange(count))
+    _, group_median = _group_median(group, amount)
+    _, group_mad = _group_median(group, np.abs(amount - group_median[run]))
+    short = position < ANOMALY_MIN_PERIODS
+    expected = np.where(short, group_median[run], expected)
+    mad = np.where(short, group_mad[run], mad)
+
+    # Sparse categories: every preceding day of the same type
+    is_expense = group % 2 == 1
+    for flag in (False, True):
+        rows = np.flatnonzero(is_expense == flag)
+        rows = rows[np.argsort(days["day"][rows], kind="stable")]
+        sparse = np.flatnonzero(size[rows] < ANOMALY_MIN_PERIODS)
+        if not len(sparse):
+            continue
+        values = amount[rows]
+        median, spread = _rolling_robust(values, np.arange(len(rows)), sparse)
+        overall = np.median(values)
+        few = sparse < ANOMALY_MIN_PERIODS
+        expected[rows[sparse]] = np.where(few, overall, median)
+        mad[rows[sparse]] = np.where(few, np.median(np.abs(values - overall)), spread)
+    spread = np.maximum(mad * MAD_SCALE, MIN_RELATIVE_SPREAD * np.abs(expected))
+
+    recurring = np.isin(group, list(series))
+    if recurring.any():
+        lookup = {key: (value["amount"], value["spread"]) for key, value in series.items()}
+        stats = np.array([lookup[g] for g in group[recurring].tolist()])
+        expected[recurring], spread[recurring] = stats[:, 0], stats[:, 1]
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        z = (amount - expected) / np.where(spread > 0, spread, np.nan)
+    anomalous = np.where(recurring, np.abs(z) > ANOMALY_Z, z > ANOMALY_Z)
+    return z, anomalous, expected
+
+def _date(day: int):
+    return np.datetime64(int(day), "D").astype(datetime)
+
+def _next_occurrences(item: dict, end_day: int, horizon: int):
+    # Days (since the epoch) a recurring series falls on after end_day,
+    # within the horizon
+    last = item["last_day"]
+    months = CADENCE_MONTHS.get(item["cadence"])
+    if months is None:
+        steps = np.arange(1, int((end_day + horizon - last) / item["interval_days"]) + 1)
+        days = np.round(last + steps * item["interval_days"]).astype(np.int64)
+    else:
+        # The same day of the month, or the month's last day when shorter
+        month = np.datetime64(last, "D").astype("datetime64[M]")
+        day_of_month = last - month.astype("datetime64[D]").astype(np.int64)
+        starts = month + np.arange(1, (end_day + horizon - last) // (28 * months) + 2) * months
+        first_days = starts.astype("datetime64[D]").astype(np.int64)
+        lengths = (starts + 1).astype("datetime64[D]").astype(np.int64) - first_days
+        days = first_days + np.minimum(day_of_month, lengths - 1)
+    return days[(days > end_day) & (days <= end_day + horizon)]
+
+def forecast_columns(columns: dict, horizon: int = FORECAST_HORIZON_DAYS):
+    """
+    Cash-flow forecast for one company's ledger columns: recurring series
+    projected on their cadence, plus the average daily cash flow of the
+    remaining history (the last FORECAST_LOOKBACK_DAYS) with a 10th-90th
+    percentile band. Spikes are reported as anomalies and, like
+    non-recurring grants, loans and other non-operating income, kept out of
+    the baseline. Returns None for a ledger without dated income or expense
+    rows.
+    """
+    days = ledger_days(columns)
+    if not len(days["day"]):
+        return None
+    labels = columns["categories"]
+    first_day, end_day = int(days["day"].min()), int(days["day"].max())
+    series = recurring_series(days, end_day)
+    z, anomalous, expected = detect_anomalies(days, series)
+
+    sign = np.where(days["group"] % 2 == 1, -1.0, 1.0)
+    recurring = np.isin(days["group"], list(series))
+    non_operating = np.array([any(word in str(name).lower() for word in NON_OPERATING_INCOME) for name in labels],
+                             dtype=bool)
+    one_off = (sign > 0) & non_operating[days["group"] // 2] & ~recurring
+    lookback = min(FORECAST_LOOKBACK_DAYS, end_day - first_day + 1)
+    residual = ~recurring & ~one_off & ~anomalous & (days["day"] > end_day - lookback)
+    daily = np.bincount(days["day"][residual] - (end_day - lookback + 1),
+                        weights=(sign * days["amount"])[residual], minlength=lookback)
+    inflow_rate = days["amount"][residual & (sign > 0)].sum() / lookback
+    outflow_rate = days["amount"][residual & (sign < 0)].sum() / lookback
+    daily_std = float(daily.std()) if lookback > 1 else 0.0
+
+    # Recurring series on their cadence, from their last occurrence
+    inflow = np.full(horizon, inflow_rate)
+    outflow = np.full(horizon, outflow_rate)
+    for group_id, item in series.items():
+        if not item["active"]:
+            continue
+        offsets = _next_occurrences(item, end_day, horizon) - end_day - 1
+        np.add.at(outflow if group_id % 2 else inflow, offsets, item["amount"])
+        item["next_date"] = _date(end_day + 1 + offsets[0]) if len(offsets) else None
+
+    net = inflow - outflow
+    cumulative = np.cumsum(net)
+    band = BAND_Z * daily_std * np.sqrt(np.arange(1, horizon + 1))
+    lowest = int(cumulative.argmin())
+
+    flagged = np.flatnonzero(anomalous)
+    flagged = flagged[np.argsort(-days["day"][flagged], kind="stable")][:MAX_ANOMALIES]
+    return {
+        "as_of": _date(end_day),
+        "history_days": end_day - first_day + 1,
+        "horizon_days": horizon,
+        "expected_inflow": float(inflow.sum()),
+        "expected_outflow": float(outflow.sum()),
+        "expected_net": float(cumulative[-1]),
+        "net_low": float(cumulative[-1] - band[-1]),
+        "net_high": float(cumulative[-1] + band[-1]),
+        "lowest_cumulative_net": {"date": _date(end_day + 1 + lowest), "value": float(cumulative[lowest])},
+        "baseline": {"daily_inflow": float(inflow_rate), "daily_outflow": float(outflow_rate),
+                     "daily_net_std": daily_std, "lookback_days": lookback},
+        "recurring": [
+            {
+                "category": str(labels[group_id // 2]),
+                "type": "expense" if group_id % 2 else "income",
+                **{key: value for key, value in item.items() if key not in ("last_day", "spread")},
+                "last_date": _date(item["last_day"])
+            }
+            for group_id, item in sorted(series.items(), key=lambda entry: -entry[1]["amount"])
+        ],
+        "one_off_income": float(days["amount"][one_off].sum()),
+        "anomaly_count": int(anomalous.sum()),
+        "anomalies": [
+            {
+                "date": _date(days["day"][i]),
+                "category": str(labels[days["group"][i] // 2]),
+                "type": "expense" if days["group"][i] % 2 else "income",
+                "amount": float(days["amount"][i]),
+                "expected": float(expected[i]),
+                "z": float(z[i])
+            }
+            for i in flagged
+        ],
+        "daily": [
+            {"date": _date(end_day + 1 + i), "inflow": float(inflow[i]), "outflow": float(outflow[i]),
+             "cumulative_net": float(cumulative[i]), "low": float(cumulative[i] - band[i]),
+             "high": float(cumulative[i] + band[i])}
+            for i in range(horizon)
+        ]
+    }
+
+def company_ledger(db: Session, company_id: int):
+    """
+    Every row the company has uploaded, as one set of ledger columns:
+    stored ledgers are read from the memory map and rows repeated across
+    overlapping uploads (year-to-date exports) are kept once. None without
+    a ledger on disk.
+    """
+    paths = [path for (path,) in db.query(FinancialRecord.raw_data_path).filter(
+        FinancialRecord.company_id == company_id, FinancialRecord.raw_data_path.isnot(None)
+    ).distinct()]
+    parts = []
+    for path in paths:
+        if not os.path.exists(path):
+            continue
+        if not is_stored_ledger(path):
+            path, _ = convert_ledger(path)
+        parts.append(dated_columns(path))
+    if not parts:
+        return None
+
+    # One category dictionary across the ledgers
+    labels, inverse = np.unique(np.concatenate([part["categories"].astype(str) for part in parts]),
+                                return_inverse=True)
+    offsets = np.cumsum([0] + [len(part["categories"]) for part in parts])
+    columns = {
+        key: np.concatenate([part[key] for part in parts]) for key in ("dates", "type_codes", "amounts")
+    }
+    columns["category_codes"] = np.concatenate([
+        inverse[offset:offset + len(part["categories"])][part["category_codes"]]
+        for offset, part in zip(offsets, parts)
+    ]).astype(np.int32)
+    columns["categories"] = labels.astype(object)
+    if len(parts) > 1:
+        fingerprints = np.concatenate([ledger_fingerprints(part) for part in parts])
+        _, first = np.unique(fingerprints, return_index=True)
+        first.sort()
+        columns.update({key: columns[key][first] for key in ("dates", "type_codes", "amounts", "category_codes")})
+    return columns
+
+def forecast_company(db: Session, company_id: int, horizon: int = FORECAST_HORIZON_DAYS):
+    columns = company_ledger(db, company_id)
+    return forecast_columns(columns, horizon) if columns is not None else None
+
+def store_forecast(db: Session, company_id: int, forecast: dict):
+    # Upserts the summary row; the full forecast is kept as JSON
+    stored = db.get(CompanyForecast, company_id)
+    if stored is None:
+        stored = CompanyForecast(company_id=company_id)
+        db.add(stored)
+    stored.as_of = forecast["as_of"]
+    stored.horizon_days = forecast["horizon_days"]
+    stored.expected_inflow = forecast["expected_inflow"]
+    stored.expected_outflow = forecast["expected_outflow"]
+    stored.expected_net = forecast["expected_net"]
+    stored.net_low = forecast["net_low"]
+    stored.lowest_cumulative_net = forecast["lowest_cumulative_net"]["value"]
+    stored.recurring_count = len(forecast["recurring"])
+    stored.anomaly_count = forecast["anomaly_count"]
+    stored.forecast = json.dumps(forecast, default=str)
+    return stored
+
+def refresh_forecasts(db: Session, company_ids: list = None, horizon: int = FORECAST_HORIZON_DAYS):
+    """
+    Recomputes and stores the forecast of every company with an uploaded
+    ledger (or just `company_ids`), committing every FORECAST_BATCH
+    companies. Returns counts for the job result.
+    """
+    query = db.query(FinancialRecord.company_id).filter(FinancialRecord.raw_data_path.isnot(None)).distinct()
+    if company_ids is not None:
+        query = query.filter(FinancialRecord.company_id.in_(company_ids))
+    companies = sorted(company_id for (company_id,) in query)
+
+    refreshed = skipped = 0
+    for index, company_id in enumerate(companies, 1):
+        forecast = forecast_company(db, company_id, horizon)
+        if forecast is None:
+            skipped += 1
+        else:
+            store_forecast(db, company_id, forecast)
+            refreshed += 1
+        if index % FORECAST_BATCH == 0:
+            db.commit()
+    db.commit()
+    return {"companies": len(companies), "refreshed": refreshed, "skipped": skipped, "horizon_days": horizon}
@@ -0,0 +1,257 @@
+import asyncio
+import json
+import os
+import time
+import traceback
+from datetime import datetime, timedelta
+from sqlalchemy import func, update
+from sqlalchemy.orm import Session
+from dotenv import load_dotenv
+
+from database import run_db
+from models import Job
+
+load_dotenv()
+
+# In-process workers started with the API. Set to 0 when jobs are handled by
+# separate `python worker.py` processes instead.
+UPLOAD_WORKERS = int(os.getenv("UPLOAD_WORKERS", "4"))
+# How often workers look in the table for queued jobs nobody submitted.
+JOB_POLL_INTERVAL = float(os.getenv("JOB_POLL_INTERVAL", "1.0"))
+# A running job holds a lease its worker renews every third of this. Once the
+# lease runs out (the process crashed or was killed) the job is queued again.
+JOB_LEASE_SECONDS = float(os.getenv("JOB_LEASE_SECONDS", "120"))
+# Claims after which a job that keeps losing its worker is failed instead.
+JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", "3"))
+
+def create_job(db: Session, kind: str, company_id: int = None, payload: dict = None):
+    job = Job(kind=kind, status="queued", company_id=company_id, payload=json.dumps(payload or {}))
+    db.add(job)
+    db.commit()
+    db.refresh(job)
+    return job
+
+def claim_job(db: Session, job_id: int):
+    """
+    Atomically moves a queued job to running. Only one worker (in this process
+    or another one sharing the DB) can win the claim.
+    """
+    now = datetime.utcnow()
+    claimed = db.execute(
+        update(Job)
+        .where(Job.id == job_id, Job.status == "queued")
+        .values(status="running", started_at=now, heartbeat_at=now, attempts=Job.attempts + 1)
+    ).rowcount == 1
+    db.commit()
+    return claimed
+
+def renew_lease(db: Session, job_id: int, attempt: int):
+    # False once the job is no longer held by this claim
+    renewed = db.execute(
+        update(Job)
+        .where(Job.id == job_id, Job.status == "running", Job.attempts == attempt)
+        .values(heartbeat_at=datetime.utcnow())
+    ).rowcount == 1
+    db.commit()
+    return renewed
+
+def requeue_expired_jobs(db: Session, lease: float = JOB_LEASE_SECONDS):
+    """
+    Moves running jobs whose lease ran out back to queued, or to failed once
+    they have been claimed JOB_MAX_ATTEMPTS times. Returns how many were
+    requeued.
+    """
+    now = datetime.utcnow()
+    expired = (Job.status == "running", func.coalesce(Job.heartbeat_at, Job.started_at) < now - timedelta(seconds=lease))
+    db.execute(
+        update(Job)
+        .where(*expired, Job.attempts >= JOB_MAX_ATTEMPTS)
+        .values(status="failed", error=f"Worker lost the job {JOB_MAX_ATTEMPTS} times", finished_at=now)
+    )
+    requeued = db.execute(update(Job).where(*expired).values(status="queued")).rowcount
+    db.commit()
+    return requeued
+
+class JobQueue:
+    """
+    Pool of asyncio workers executing jobs stored in the `jobs` table.
+
+    The in-memory queue only carries job ids as a wake-up signal; the table is
+    the source of truth, so queued jobs survive restarts and can be shared
+    with standalone workers. `handlers` maps job kinds to async handlers; it
+    may also be a callable returning that mapping, called per job, so the
+    handlers' imports wait until there is work.
+    """
+
+    def __init__(self, session_factory, handlers, workers: int = UPLOAD_WORKERS):
+        self.session_factory = session_factory
+        self.handlers = handlers
+        self.workers = workers
+        self._queue = asyncio.Queue()
+        self._tasks = []
+
+    async def start(self):
+        if self.workers <= 0:
+            return
+        # A fresh queue for the loop starting us: an asyncio.Queue stays bound
+        # to the first loop that waits on it (app reloads, test clients).
+        self._queue = asyncio.Queue()
+        # Jobs queued before a restart, or left running by a worker that died,
+        # are picked up again.
+        await asyncio.to_thread(self.requeue_expired)
+        for job_id in await asyncio.to_thread(self.pending_job_ids):
+            self._queue.put_nowait(job_id)
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+        self._tasks.append(asyncio.create_task(self._poll()))
+
+    async def stop(self):
+        pending = set(self._tasks)
+        while pending:
+            # Cancel again until every worker exits: asyncio.wait_for (used by
+            # the LLM calls) can swallow a cancellation that races with the
+            # call completing, leaving the worker looping on the queue.
+            for task in pending:
+                task.cancel()
+            _, pending = await asyncio.wait(pending, timeout=0.1)
+        self._tasks = []
+
+    def submit(self, job_id: int):
+        if self.workers > 0:
+            self._queue.put_nowait(job_id)
+
+    def requeue_expired(self):
+        db = self.session_factory()
+        try:
+            return requeue_expired_jobs(db)
+        finally:
+            db.close()
+
+    def pending_job_ids(self, limit: int = None):
+        db = self.session_factory()
+        try:
+            query = db.query(Job.id).filter(Job.status == "queued").order_by(Job.id)
+            if limit:
+                query = query.limit(limit)
+            return [job_id for (job_id,) in query.all()]
+        finally:
+            db.close()
+
+    async def _worker(self):
+        while True:
+            job_id = await self._queue.get()
+            try:
+                await self.run_job(job_id)
+            finally:
+                self._queue.task_done()
+
+    async def _poll(self):
+        # Picks up jobs queued without submit(), e.g. the assessment jobs bulk
+        # ingestion inserts, and jobs whose lease expired. Duplicates are
+        # harmless: only one claim succeeds.
+        next_sweep = time.monotonic() + JOB_LEASE_SECONDS / 3
+        while True:
+            if time.monotonic() >= next_sweep:
+                await asyncio.to_thread(self.requeue_expired)
+                next_sweep = time.monotonic() + JOB_LEASE_SECONDS / 3
+            found = []
+            if self._queue.empty():
+                found = await asyncio.to_thread(self.pending_job_ids, self.workers * 16)
+                for job_id in found:
+                    self._queue.put_nowait(job_id)
+            # Keep draining a backlog quickly; back off once the table is idle.
+            await asyncio.sleep(0.05 if found else JOB_POLL_INTERVAL)
+
+    @staticmethod
+    def _claim(db: Session, job_id: int):
+        # The job once this worker owns it, else None
+        if not claim_job(db, job_id):
+            return None
+        job = db.query(Job).filter(Job.id == job_id).first()
+        db.commit()
+        return job
+
+    @staticmethod
+    def _finish(db: Session, job_id: int, attempt: int, result: str = None, error: str = None):
+        # Stores the outcome: `result` as JSON text, or the error message.
+        # Skipped when the lease was lost and the job belongs to a new claim.
+        if error is not None:
+            db.rollback()
+        job = db.query(Job).filter(Job.id == job_id, Job.status == "running", Job.attempts == attempt).first()
+        if job is None:
+            db.commit()
+            return
+        if error is None:
+            job.status = "succeeded"
+            job.result = result
+        else:
+            job.status = "failed"
+            job.error = error
+        job.finished_at = datetime.utcnow()
+        db.commit()
+
+    @staticmethod
+    def _release(db: Session, job_id: int, attempt: int):
+        # Hands a job interrupted by shutdown straight back to the queue
+        db.rollback()
+        db.execute(
+            update(Job)
+            .where(Job.id == job_id, Job.status == "running", Job.attempts == attempt)
+            .values(status="queued")
+        )
+        db.commit()
+
+    async def _heartbeat(self, job_id: int, attempt: int):
+        while True:
+            await asyncio.sleep(JOB_LEASE_SECONDS / 3)
+            db = self.session_factory()
+            try:
+                if not await run_db(renew_lease, db, job_id, attempt):
+                    return
+            finally:
+                await run_db(db.close)
+
+    async def run_job(self, job_id: int):
+        # Handlers await their own work; the session calls around them run in
+        # a thread so the event loop never waits on the database.
+        db = self.session_factory()
+        heartbeat = None
+        try:
+            job = await run_db(self._claim, db, job_id)
+            if job is None:
+                return
+            attempt = job.attempts
+            heartbeat = asyncio.create_task(self._heartbeat(job_id, attempt))
+            try:
+                handlers = self.handlers() if callable(self.handlers) else self.handlers
+                handler = handlers[job.kind]
+                result = json.dumps(await handler(db, job))
+            except asyncio.CancelledError:
+                await run_db(self._release, db, job_id, attempt)
+                raise
+            except Exception as e:
+                await run_db(self._finish, db, job_id, attempt, error=str(e) or traceback.format_exc(limit=1))
+            else:
+                await run_db(self._finish, db, job_id, attempt, result)
+        finally:
+            if heartbeat is not None:
+                heartbeat.cancel()
+            await run_db(db.close)
+
+    async def run_forever(self, poll_interval: float = JOB_POLL_INTERVAL):
+        """
+        Standalone worker loop: polls the table for queued jobs and runs up to
+        `workers` of them concurrently.
+        """
+        running = set()
+        next_sweep = 0.0
+        while True:
+            if time.monotonic() >= next_sweep:
+                await asyncio.to_thread(self.requeue_expired)
+                next_sweep = time.monotonic() + JOB_LEASE_SECONDS / 3
+            free = max(self.workers - len(running), 0)
+            for job_id in await asyncio.to_thread(self.pending_job_ids, free) if free else []:
+                running.add(asyncio.create_task(self.run_job(job_id)))
+            if running:
+                _, running = await asyncio.wait(running, timeout=poll_interval, return_when=asyncio.FIRST_COMPLETED)
+            else:
+                await asyncio.sleep(poll_interval)
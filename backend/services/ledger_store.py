@@ -0,0 +1,132 @@
+import hashlib
+import os
+import uuid
+import numpy as np
+import pyarrow as pa
+from dotenv import load_dotenv
+
+from services.columns import ensure_classified
+from services.metrics import frame_to_columns
+from services.parser import CHUNK_SIZE, LedgerAggregate, iter_ledger_frames
+
+load_dotenv()
+
+# Converted ledgers, one Arrow IPC file per distinct upload (named by content hash)
+LEDGER_STORE_DIR = os.getenv("LEDGER_STORE_DIR", os.path.join("uploads", "ledgers"))
+LEDGER_EXTENSION = ".arrow"
+
+# Typed columns: categories are dictionary-encoded, so each distinct label is
+# stored once and rows carry int32 codes.
+LEDGER_SCHEMA = pa.schema([
+    ("date", pa.timestamp("ns")),
+    ("type", pa.int8()),
+    ("amount", pa.float64()),
+    ("category", pa.dictionary(pa.int32(), pa.string()))
+])
+
+def file_digest(path: str, block_size: int = 1 << 20):
+    digest = hashlib.sha256()
+    with open(path, "rb") as handle:
+        for block in iter(lambda: handle.read(block_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+def stored_digest(path: str):
+    # Saved uploads and stored ledgers are both named after the sha256 of
+    # the uploaded file
+    return os.path.splitext(os.path.basename(path))[0]
+
+def ledger_path(digest: str):
+    return os.path.join(LEDGER_STORE_DIR, digest + LEDGER_EXTENSION)
+
+def is_stored_ledger(path: str):
+    return path.endswith(LEDGER_EXTENSION)
+
+def convert_ledger(source_path: str, chunksize: int = CHUNK_SIZE):
+    """
+    Converts a CSV/Excel ledger into the columnar store, streaming it chunk by
+    chunk, and returns (store_path, metrics). Content that was converted
+    before is not parsed again; its metrics are read from the stored copy.
+    """
+    path = ledger_path(file_digest(source_path))
+    if os.path.exists(path):
+        return path, load_ledger_metrics(path)
+
+    os.makedirs(LEDGER_STORE_DIR, exist_ok=True)
+    # Write under a temporary name so readers never see a partial file and
+    # concurrent conversions of the same content cannot clash.
+    partial = f"{path}.{uuid.uuid4().hex}.tmp"
+    aggregate = LedgerAggregate()
+    labels = {}
+
+    try:
+        with pa.OSFile(partial, "wb") as sink:
+            # The category dictionary only ever grows, so each batch adds a
+            # delta instead of replacing it (IPC files allow one dictionary).
+            options = pa.ipc.IpcWriteOptions(emit_dictionary_deltas=True)
+            with pa.ipc.new_file(sink, LEDGER_SCHEMA, options=options) as writer:
+                for frame in iter_ledger_frames(source_path, chunksize):
+                    columns = frame_to_columns(frame)
+                    aggregate.fold_columns(columns)
+                    writer.write_batch(_to_record_batch(columns, labels))
+        metrics = ensure_classified(aggregate.to_metrics())
+        os.replace(partial, path)
+    except Exception as e:
+        if os.path.exists(partial):
+            os.remove(partial)
+        raise ValueError(f"Error parsing file: {str(e)}")
+
+    return path, metrics
+
+def _to_record_batch(columns: dict, labels: dict):
+    # Re-map the chunk's category codes onto the file-wide dictionary.
+    lookup = np.array(
+        [labels.setdefault(str(label), len(labels)) for label in columns["categories"]],
+        dtype=np.int32
+    )
+    codes = lookup[columns["category_codes"]] if len(lookup) else columns["category_codes"]
+    return pa.record_batch([
+        pa.array(columns["dates"], type=pa.timestamp("ns"), from_pandas=True),
+        pa.array(columns["type_codes"], type=pa.int8()),
+        pa.array(columns["amounts"], type=pa.float64()),
+        pa.DictionaryArray.from_arrays(pa.array(codes, type=pa.int32()), pa.array(list(labels), type=pa.string()))
+    ], schema=LEDGER_SCHEMA)
+
+def read_ledger(path: str):
+    """
+    Opens a stored ledger as a memory-mapped Arrow table. Column buffers
+    point into the mapping, so nothing is copied until it is used.
+    """
+    return pa.ipc.open_file(pa.memory_map(path, "r")).read_all()
+
+def iter_ledger_columns(path: str):
+    """
+    Yields a stored ledger batch by batch in the column layout
+    compute_ledger_metrics expects. Dates with no gaps, type codes, amounts
+    and category codes are zero-copy views of the mapped file.
+    """
+    reader = pa.ipc.open_file(pa.memory_map(path, "r"))
+    for index in range(reader.num_record_batches):
+        batch = reader.get_batch(index)
+        category = batch.column(3)
+        yield {
+            "dates": batch.column(0).to_numpy(zero_copy_only=False),
+            "type_codes": batch.column(1).to_numpy(),
+            "amounts": batch.column(2).to_numpy(),
+            "category_codes": category.indices.to_numpy(),
+            "categories": category.dictionary.to_numpy(zero_copy_only=False)
+        }
+
+def load_ledger_metrics(*paths: str):
+    """
+    Recomputes metrics over one or more ledgers, e.g. a company's full
+    upload history. Stored ledgers are read from the memory map; legacy
+    raw_data_path entries pointing at CSV/Excel are converted on first use.
+    """
+    aggregate = LedgerAggregate()
+    for path in paths:
+        if not is_stored_ledger(path):
+            path, _ = convert_ledger(path)
+        for columns in iter_ledger_columns(path):
+            aggregate.fold_columns(columns)
+    return aggregate.to_metrics()
@@ -0,0 +1,67 @@
+import json
+import random
+import time
+
+class FakeUsage:
+    # Same fields as Gemini's usage_metadata, estimated at ~4 characters per token
+    def __init__(self, prompt: str, text: str):
+        self.prompt_token_count = (len(str(prompt)) + 3) // 4
+        self.candidates_token_count = (len(text) + 3) // 4
+        self.total_token_count = self.prompt_token_count + self.candidates_token_count
+
+class FakeResponse:
+    def __init__(self, text: str, prompt: str = ""):
+        self.text = text
+        self.usage_metadata = FakeUsage(prompt, text)
+
+class FakeChunk:
+    def __init__(self, text: str):
+        self.text = text
+
+class FakeStreamResponse:
+    """
+    What generate_content(..., stream=True) returns: iterating it yields the
+    answer in chunks of `chunk_chars`, with the latency spread evenly across
+    them.
+    """
+
+    def __init__(self, text: str, prompt: str, latency: float, chunk_chars: int):
+        self.text = text
+        self.usage_metadata = FakeUsage(prompt, text)
+        self._chunks = [text[i:i + chunk_chars] for i in range(0, len(text), chunk_chars)] or [""]
+        self._latency = latency
+
+    def __iter__(self):
+        for chunk in self._chunks:
+            time.sleep(self._latency / len(self._chunks))
+            yield FakeChunk(chunk)
+
+class FakeGenerativeModel:
+    """
+    Local stand-in for genai.GenerativeModel. Sleeps for a configurable latency
+    (plus optional jitter) and returns a canned assessment, so the advisor can
+    be exercised under load without network access or API spend. With
+    stream=True the same answer arrives in chunks over the same latency.
+
+    Usage:
+        set_model_factory(lambda: FakeGenerativeModel(latency=0.8))
+    """
+
+    def __init__(self, latency: float = 0.5, jitter: float = 0.0, text: str = None, seed: int = None,
+                 chunk_chars: int = 16):
+        self.latency = latency
+        self.jitter = jitter
+        self.chunk_chars = chunk_chars
+        self.text = text or json.dumps({
+            "executive_summary": "Stub assessment generated locally.",
+            "risk_score": 35,
+            "recommendations": ["Stub recommendation"]
+        })
+        self._random = random.Random(seed)
+
+    def generate_content(self, prompt, stream: bool = False, **kwargs):
+        latency = self.latency + self._random.uniform(0, self.jitter)
+        if stream:
+            return FakeStreamResponse(self.text, prompt, latency, self.chunk_chars)
+        time.sleep(latency)
+        return FakeResponse(self.text, prompt)
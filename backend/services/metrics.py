@@ -0,0 +1,151 @@
+import numpy as np
+import pandas as pd
+
+# Type codes used by the columnar ledger representation.
+TYPE_OTHER = 0
+TYPE_INCOME = 1
+TYPE_EXPENSE = 2
+TYPE_LABELS = {"income": TYPE_INCOME, "expense": TYPE_EXPENSE}
+
+def frame_to_columns(df: pd.DataFrame):
+    """
+    Converts a ledger frame (lowercase column names) into typed columns:
+    datetime64 dates, int8 type codes, float64 amounts and int32 category
+    codes with their labels.
+    """
+    n = len(df)
+
+    if 'amount' in df.columns:
+        amounts = pd.to_numeric(df['amount'], errors='coerce').fillna(0.0).to_numpy(dtype=np.float64)
+    else:
+        amounts = np.zeros(n, dtype=np.float64)
+
+    if 'type' in df.columns:
+        # Lowercase the distinct labels once, then map codes, instead of
+        # lowercasing every row for every filter.
+        types = pd.Categorical(df['type'])
+        lookup = np.array(
+            [TYPE_LABELS.get(str(label).strip().lower(), TYPE_OTHER) for label in types.categories] + [TYPE_OTHER],
+            dtype=np.int8
+        )
+        type_codes = lookup[types.codes]
+    elif 'amount' in df.columns:
+        # Assume positive is income, negative is expense if simplified
+        type_codes = np.where(amounts > 0, TYPE_INCOME, np.where(amounts < 0, TYPE_EXPENSE, TYPE_OTHER)).astype(np.int8)
+        amounts = np.abs(amounts)
+    else:
+        type_codes = np.zeros(n, dtype=np.int8)
+
+    if 'date' in df.columns:
+        dates = df['date'] if pd.api.types.is_datetime64_any_dtype(df['date']) else pd.to_datetime(df['date'], errors='coerce')
+        dates = dates.to_numpy(dtype='datetime64[ns]')
+    else:
+        dates = np.full(n, np.datetime64('NaT'), dtype='datetime64[ns]')
+
+    if 'category' in df.columns:
+        categories = pd.Categorical(df['category'].fillna('Uncategorized'))
+        category_codes = categories.codes.astype(np.int32)
+        category_labels = np.asarray(categories.categories, dtype=object)
+    else:
+        category_codes = np.zeros(n, dtype=np.int32)
+        category_labels = np.array(['Uncategorized'], dtype=object)
+
+    return {
+        "dates": dates,
+        "type_codes": type_codes,
+        "amounts": amounts,
+        "category_codes": category_codes,
+        "categories": category_labels
+    }
+
+def _split_totals(codes: np.ndarray, type_codes: np.ndarray, amounts: np.ndarray, size: int):
+    # One weighted bincount gives income/expense totals for every group.
+    flat = np.bincount(codes.astype(np.int64) * 3 + type_codes, weights=amounts, minlength=size * 3)
+    return flat.reshape(size, 3)
+
+def compute_ledger_metrics(columns: dict):
+    """
+    Single vectorized pass over typed ledger columns. Returns totals, the
+    real reporting period and per-category / per-month breakdowns.
+    """
+    type_codes = columns["type_codes"]
+    amounts = columns["amounts"]
+    dates = columns["dates"]
+    labels = columns["categories"]
+
+    totals = np.bincount(type_codes, weights=amounts, minlength=3)
+    revenue = float(totals[TYPE_INCOME])
+    expenses = float(totals[TYPE_EXPENSE])
+
+    by_category = {}
+    if len(labels):
+        per_category = _split_totals(columns["category_codes"], type_codes, amounts, len(labels))
+        for label, row in zip(labels, per_category):
+            if row[TYPE_INCOME] or row[TYPE_EXPENSE]:
+                by_category[str(label)] = {
+                    "revenue": float(row[TYPE_INCOME]),
+                    "expenses": float(row[TYPE_EXPENSE])
+                }
+
+    period_start = period_end = None
+    by_month = {}
+    valid = ~np.isnat(dates)
+    if valid.any():
+        valid_dates = dates[valid]
+        period_start = pd.Timestamp(valid_dates.min()).to_pydatetime()
+        period_end = pd.Timestamp(valid_dates.max()).to_pydatetime()
+
+        months, month_codes = np.unique(valid_dates.astype('datetime64[M]'), return_inverse=True)
+        per_month = _split_totals(month_codes, type_codes[valid], amounts[valid], len(months))
+        for month, row in zip(months, per_month):
+            by_month[str(month)] = {
+                "revenue": float(row[TYPE_INCOME]),
+                "expenses": float(row[TYPE_EXPENSE]),
+                "net_profit": float(row[TYPE_INCOME] - row[TYPE_EXPENSE])
+            }
+
+    return {
+        "revenue": revenue,
+        "expenses": expenses,
+        "net_profit": revenue - expenses,
+        "period_start": period_start,
+        "period_end": period_end,
+        "row_count": int(len(amounts)),
+        "by_category": by_category,
+        "by_month": by_month
+    }
+
+def merge_ledger_metrics(total: dict, part: dict):
+    """
+    Folds one partial result from compute_ledger_metrics into a running total.
+    """
+    total["revenue"] += part["revenue"]
+    total["expenses"] += part["expenses"]
+    total["net_profit"] = total["revenue"] - total["expenses"]
+    total["row_count"] += part["row_count"]
+
+    if part["period_start"] is not None:
+        if total["period_start"] is None or part["period_start"] < total["period_start"]:
+            total["period_start"] = part["period_start"]
+        if total["period_end"] is None or part["period_end"] > total["period_end"]:
+            total["period_end"] = part["period_end"]
+
+    for key in ("by_category", "by_month"):
+        for name, values in part[key].items():
+            running = total[key].setdefault(name, dict.fromkeys(values, 0.0))
+            for field, value in values.items():
+                running[field] += value
+
+    return total
+
+def empty_ledger_metrics():
+    return {
+        "revenue": 0.0,
+        "expenses": 0.0,
+        "net_profit": 0.0,
+        "period_start": None,
+        "period_end": None,
+        "row_count": 0,
+        "by_category": {},
+        "by_month": {}
+    }
@@ -0,0 +1,71 @@
+import base64
+import json
+from datetime import datetime
+from sqlalchemy import DateTime, and_, or_
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+
+def encode_cursor(*values):
+    """
+    Opaque keyset cursor for the sort key of the last row on a page.
+    """
+    payload = [value.isoformat() if isinstance(value, datetime) else value for value in values]
+    return base64.urlsafe_b64encode(json.dumps(payload).encode("utf-8")).decode("ascii")
+
+def decode_cursor(cursor: str, *types):
+    """
+    Inverse of encode_cursor; `types` converts each value back (datetime or
+    int). Raises ValueError for malformed cursors.
+    """
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+        if len(values) != len(types):
+            raise ValueError
+        return [datetime.fromisoformat(value) if kind is datetime else kind(value) for kind, value in zip(types, values)]
+    except Exception:
+        raise ValueError("Invalid cursor")
+
+def _after(columns, values, descending: bool):
+    # Row-value comparison (a, b) > (x, y) spelled as a > x OR (a = x AND b > y),
+    # which both SQLite and Postgres answer from the composite index.
+    column, value = columns[0], values[0]
+    beyond = column < value if descending else column > value
+    if len(columns) == 1:
+        return beyond
+    return or_(beyond, and_(column == value, _after(columns[1:], values[1:], descending)))
+
+def _paginate(query, columns: list, cursor: str, limit: int, descending: bool):
+    # Works on both a Query and a select(): one row beyond the page tells
+    # whether there is a next one
+    if cursor:
+        types = [datetime if isinstance(column.type, DateTime) else int for column in columns]
+        query = query.filter(_after(columns, decode_cursor(cursor, *types), descending))
+
+    order = [column.desc() if descending else column.asc() for column in columns]
+    return query.order_by(*order).limit(limit + 1)
+
+def _split(rows: list, columns: list, limit: int):
+    page = rows[:limit]
+    next_cursor = None
+    if len(rows) > limit:
+        next_cursor = encode_cursor(*[getattr(page[-1], column.key) for column in columns])
+    return page, next_cursor
+
+def keyset_page(query, columns: list, cursor: str = None, limit: int = DEFAULT_PAGE_SIZE, descending: bool = False):
+    """
+    Applies keyset pagination ordered by `columns` (the last one must be
+    unique, e.g. the primary key). Returns (rows, next_cursor); next_cursor is
+    None on the last page. Cost is independent of how deep the page is.
+    """
+    return _split(_paginate(query, columns, cursor, limit, descending).all(), columns, limit)
+
+async def keyset_page_async(db, statement, columns: list, cursor: str = None, limit: int = DEFAULT_PAGE_SIZE,
+                            descending: bool = False):
+    """
+    keyset_page for an AsyncSession and a select(): a single selected
+    entity comes back as objects, several columns as rows.
+    """
+    result = await db.execute(_paginate(statement, columns, cursor, limit, descending))
+    rows = result.scalars().all() if len(statement.column_descriptions) == 1 else result.all()
+    return _split(rows, columns, limit)
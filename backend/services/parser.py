@@ -1,71 +1,96 @@
 import pandas as pd
-from fastapi import UploadFile
-import io
+import os
 import datetime
 
-async def parse_financial_statement(file: UploadFile):
+from services.columns import resolve_mapping, apply_mapping, ensure_classified, sniff_delimiter
+from services.excel import iter_excel_frames
+from services.metrics import (
+    frame_to_columns,
+    compute_ledger_metrics,
+    merge_ledger_metrics,
+    empty_ledger_metrics
+)
+
+# Rows per chunk when streaming a ledger from disk. Peak memory is bounded by
+# one chunk, no matter how many rows the upload contains.
+CHUNK_SIZE = int(os.getenv("PARSER_CHUNK_SIZE", "50000"))
+
+class LedgerAggregate:
+    """
+    Running income/expense/period totals, folded one chunk at a time so the
+    full ledger never has to be held in memory.
+    """
+
+    def __init__(self):
+        self.metrics = empty_ledger_metrics()
+
+    def fold(self, chunk: pd.DataFrame):
+        chunk.columns = [str(c).lower().strip() for c in chunk.columns]
+        self.fold_columns(frame_to_columns(chunk))
+
+    def fold_columns(self, columns: dict):
+        merge_ledger_metrics(self.metrics, compute_ledger_metrics(columns))
+
+    def to_metrics(self):
+        return _finalize_metrics(self.metrics)
+
+def _finalize_metrics(metrics: dict):
+    # Ledgers without a usable date column still need a period for the DB.
+    now = datetime.datetime.now()
+    metrics["period_start"] = metrics["period_start"] or now
+    metrics["period_end"] = metrics["period_end"] or now
+    metrics["by_month"] = dict(sorted(metrics["by_month"].items()))
+    return metrics
+
+def iter_ledger_frames(path: str, chunksize: int = CHUNK_SIZE):
+    """
+    Yields a saved ledger as DataFrame chunks of at most `chunksize` rows in
+    the standard date/category/amount/type layout. Column roles are resolved
+    once, from the first chunk (cached per header row).
+    """
+    filename = path.lower()
+    if filename.endswith(".csv"):
+        chunks = pd.read_csv(path, chunksize=chunksize, sep=sniff_delimiter(path))
+    elif filename.endswith(".xlsx"):
+        # Streamed straight from the sheet XML; sheet and header row are
+        # detected.
+        chunks = iter_excel_frames(path, chunksize)
+    elif filename.endswith(".xls"):
+        # Legacy binary workbooks have no streaming reader; read in one go.
+        chunks = [pd.read_excel(path)]
+    else:
+        raise ValueError("Unsupported file format. Please upload CSV or Excel.")
+
+    mapping = None
+    for chunk in chunks:
+        if mapping is None:
+            mapping = resolve_mapping(chunk)
+        yield apply_mapping(chunk, mapping)
+
+def stream_financial_statement(path: str, chunksize: int = CHUNK_SIZE):
     """
-    Parses an uploaded file (CSV/Excel) into a standardized dictionary.
+    Streams a saved ledger from disk in bounded chunks and returns the same
+    metrics dict as calculate_metrics, without materializing the row list.
     """
-    content = await file.read()
-    filename = file.filename.lower()
-    
+    aggregate = LedgerAggregate()
+
     try:
-        if filename.endswith(".csv"):
-            df = pd.read_csv(io.BytesIO(content))
-        elif filename.endswith(".xlsx") or filename.endswith(".xls"):
-            df = pd.read_excel(io.BytesIO(content))
-        else:
-            raise ValueError("Unsupported file format. Please upload CSV or Excel.")
-            
-        # Basic normalization (simplistic for MVP)
-        # We assume columns like 'Category', 'Amount', 'Date' exist or we infer them
-        # For this hackathon, let's assume a strictly formatted CSV for simplicity first, 
-        # then make it robust.
-        
-        # Expected columns: Date, Category, Amount, Type (Income/Expense)
-        df.columns = [c.lower().strip() for c in df.columns]
-        
-        return df.to_dict(orient="records")
-        
+        for chunk in iter_ledger_frames(path, chunksize):
+            aggregate.fold(chunk)
     except Exception as e:
         raise ValueError(f"Error parsing file: {str(e)}")
 
-def calculate_metrics(data: list):
+    return ensure_classified(aggregate.to_metrics())
+
+def calculate_metrics(data):
     """
-    Calculates basic financial metrics from parsed data.
+    Calculates financial metrics from parsed data (the parser's list of
+    records or a DataFrame) using the columnar engine in services.metrics.
     """
-    if not data:
-         return {
-        "revenue": 0.0,
-        "expenses": 0.0,
-        "net_profit": 0.0,
-        "period_start": datetime.datetime.now(),
-        "period_end": datetime.datetime.now()
-    }
-    
-    df = pd.DataFrame(data)
-    
-    # Simple heuristic to guess columns if not standard
-    # Looking for 'amount', 'type', 'category'
-    
-    total_revenue = 0.0
-    total_expenses = 0.0
-    
-    # Mock calculation if columns missing
-    if 'amount' in df.columns and 'type' in df.columns:
-        total_revenue = df[df['type'].str.lower() == 'income']['amount'].sum()
-        total_expenses = df[df['type'].str.lower() == 'expense']['amount'].sum()
-        
-    elif 'amount' in df.columns:
-        # Assume positive is income, negative is expense if simplified
-        total_revenue = df[df['amount'] > 0]['amount'].sum()
-        total_expenses = abs(df[df['amount'] < 0]['amount'].sum())
-        
-    return {
-        "revenue": float(total_revenue),
-        "expenses": float(total_expenses),
-        "net_profit": float(total_revenue - total_expenses),
-        "period_start": datetime.datetime.now(), # Placeholder
-        "period_end": datetime.datetime.now() # Placeholder
-    }
+    if data is None or len(data) == 0:
+        return _finalize_metrics(empty_ledger_metrics())
+
+    df = data if isinstance(data, pd.DataFrame) else pd.DataFrame(data)
+    df = apply_mapping(df, resolve_mapping(df))
+
+    return _finalize_metrics(compute_ledger_metrics(frame_to_columns(df)))
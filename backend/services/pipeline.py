@@ -0,0 +1,364 @@
+import asyncio
+import hashlib
+import json
+import os
+import shutil
+import uuid
+from fastapi.concurrency import run_in_threadpool
+from fastapi.encoders import jsonable_encoder
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from database import run_db
+from models import Company, FinancialRecord, Assessment
+from services.ledger_store import convert_ledger, stored_digest
+from services.rollups import apply_rollups
+from services.snapshots import record_written, assessment_written
+from services.ai_advisor import get_financial_advice_async, stream_financial_advice, fallback_advice
+from services.scoring import score_metrics
+from services.telemetry import span, upload_bytes, ledger_rows
+from services.bulk import ingest_bundle
+from services.forecasting import refresh_forecasts, FORECAST_HORIZON_DAYS
+
+UPLOAD_DIR = "uploads"
+
+# Streamed assessments still running; referenced so they are not collected
+_narration_tasks = set()
+
+def save_upload(fileobj, filename: str, block_size: int = 1 << 20, directory: str = UPLOAD_DIR):
+    """
+    Copies an uploaded file to disk in fixed-size blocks, hashing it on the
+    way, and returns its location: uploads/<sha256><ext>. Different files
+    with the same name no longer overwrite each other, and identical content
+    lands on the same path.
+    """
+    os.makedirs(directory, exist_ok=True)
+    partial = f"{directory}/{uuid.uuid4().hex}.tmp"
+    digest = hashlib.sha256()
+    with open(partial, "wb") as buffer:
+        for block in iter(lambda: fileobj.read(block_size), b""):
+            digest.update(block)
+            buffer.write(block)
+
+    extension = os.path.splitext(filename or "")[1].lower()
+    file_location = f"{directory}/{digest.hexdigest()}{extension}"
+    os.replace(partial, file_location)
+    return file_location
+
+def build_assessment(company_id: int, ai_result: str, score: dict, record_id: int = None):
+    """
+    Assessment row from the deterministic score (services.scoring) and the
+    advisor's narrative (schema-validated JSON text, see parse_advice and
+    fallback_advice).
+    """
+    data = json.loads(ai_result)
+    return Assessment(
+        company_id=company_id,
+        financial_record_id=record_id,
+        overall_score=score["overall_score"],
+        risk_level=score["risk_level"],
+        summary_report=data.get('executive_summary', ''),
+        recommendations=json.dumps(data.get('recommendations', []))
+    )
+
+class DuplicateUpload(Exception):
+    """
+    Another request stored the same upload (content or Idempotency-Key) for
+    the company first; look it up with find_upload.
+    """
+
+def _stored_lookup(db: Session, company_id: int, column, value):
+    # The record via its unique index, with its newest assessment if any
+    return db.query(FinancialRecord, Assessment).outerjoin(
+        Assessment, Assessment.financial_record_id == FinancialRecord.id
+    ).filter(
+        FinancialRecord.company_id == company_id, column == value
+    ).order_by(Assessment.id.desc().nulls_last()).first()
+
+def find_upload(db: Session, company_id: int, content_hash: str = None, idempotency_key: str = None):
+    """
+    Result of an earlier upload by this company with the same
+    Idempotency-Key or, failing that, the same file content; None when there
+    is none. Nothing is parsed, written or sent to the LLM. A key that was
+    used for different content raises ValueError.
+    """
+    row = None
+    if idempotency_key:
+        row = _stored_lookup(db, company_id, FinancialRecord.idempotency_key, idempotency_key)
+        if row and content_hash and row[0].content_hash not in (None, content_hash):
+            raise ValueError("Idempotency-Key was already used for a different file")
+    if row is None and content_hash:
+        row = _stored_lookup(db, company_id, FinancialRecord.content_hash, content_hash)
+    if row is None:
+        return None
+    record, assessment = row
+    return {
+        "status": "duplicate",
+        "record_id": record.id,
+        "metrics": {
+            "revenue": record.revenue,
+            "expenses": record.opex,
+            "net_profit": record.net_profit,
+            "period_start": record.period_start,
+            "period_end": record.period_end
+        },
+        "assessment": {
+            "assessment_id": assessment.id,
+            "score": assessment.overall_score,
+            "risk": assessment.risk_level,
+            "summary": assessment.summary_report,
+            "recommendations": assessment.recommendations
+        } if assessment else None
+    }
+
+def store_record(db: Session, company_id: int, ledger_location: str, metrics: dict, content_hash: str = None,
+                 idempotency_key: str = None):
+    """
+    Adds the upload's FinancialRecord, rollups and snapshot in one commit
+    and returns (record_id, rollups). Raises DuplicateUpload when the
+    company already has a record with this content or key.
+    """
+    record = FinancialRecord(
+        company_id=company_id,
+        period_start=metrics['period_start'],
+        period_end=metrics['period_end'],
+        revenue=metrics['revenue'],
+        cogs=0.0, # TODO: Extract detailed categories
+        opex=metrics['expenses'],
+        net_profit=metrics['net_profit'],
+        assets=0.0,
+        liabilities=0.0,
+        equity=0.0,
+        raw_data_path=ledger_location,
+        content_hash=content_hash,
+        idempotency_key=idempotency_key
+    )
+    db.add(record)
+    try:
+        # Only rows this company has not uploaded before reach the monthly rollups
+        rollups = apply_rollups(db, company_id, ledger_location)
+        record_written(db, company_id)
+        db.commit()
+    except IntegrityError:
+        db.rollback()
+        # A concurrent retry of the same upload got there first
+        if find_upload(db, company_id, content_hash, idempotency_key):
+            raise DuplicateUpload()
+        raise
+    return record.id, rollups
+
+async def ingest_upload(db: Session, company: Company, file_location: str, idempotency_key: str = None):
+    """
+    Parse -> financial record -> local score for a saved upload. Returns
+    (company_info, record_id, metrics, rollups, score); parse errors surface
+    as ValueError, repeats of a stored upload as DuplicateUpload.
+    """
+    # Capture what the prompt needs up front; the session then holds no
+    # connection between commits, in particular not during the LLM call.
+    company_info = {
+        "name": company.name,
+        "industry": company.industry,
+        "business_type": company.business_type
+    }
+    await run_db(db.commit)
+
+    # 2. Parse File
+    # Stream the saved copy in bounded chunks into the columnar ledger store
+    # (skipped for content converted before); runs in the threadpool so the
+    # event loop stays free.
+    with span("upload.parse"):
+        ledger_location, metrics = await run_in_threadpool(convert_ledger, file_location)
+    upload_bytes.observe(os.path.getsize(file_location))
+    ledger_rows.observe(metrics["row_count"])
+    
+    # 3. Save Record
+    # The record, its rollups and the snapshot commit together in one
+    # threadpool call: the write transaction never stays open across an
+    # await, where it would block other requests' writes (SQLite locks the
+    # whole database).
+    with span("db.store_record"):
+        record_id, rollups = await run_db(store_record, db, company.id, ledger_location, metrics,
+                                          stored_digest(file_location), idempotency_key)
+    
+    # 4. Score locally (deterministic, no network)
+    with span("score"):
+        score = score_metrics(metrics)
+    return company_info, record_id, metrics, rollups, score
+
+def save_assessment(db: Session, company_id: int, ai_result: str, score: dict, record_id: int = None):
+    # 5. Save Assessment
+    with span("db.assessment"):
+        assessment = build_assessment(company_id, ai_result, score, record_id)
+        db.add(assessment)
+        assessment_written(db, assessment)
+        db.commit()
+    return assessment
+
+def assessment_summary(assessment: Assessment, score: dict):
+    return {
+        "assessment_id": assessment.id,
+        "score": assessment.overall_score,
+        "risk": assessment.risk_level,
+        "drivers": score["drivers"],
+        "summary": assessment.summary_report,
+        "recommendations": assessment.recommendations
+    }
+
+async def process_upload(db: Session, company: Company, file_location: str, narrative: bool = True,
+                         idempotency_key: str = None):
+    """
+    Parse -> financial record -> score -> AI assessment for a saved upload.
+    Shared by the synchronous /upload endpoint and the background upload
+    jobs. Without `narrative` the LLM is skipped and the assessment carries
+    the scoring engine's own summary. An upload the company already made
+    returns find_upload's stored result instead.
+    """
+    try:
+        company_info, record_id, metrics, rollups, score = await ingest_upload(db, company, file_location,
+                                                                              idempotency_key)
+    except DuplicateUpload:
+        return await run_db(find_upload, db, company.id, stored_digest(file_location), idempotency_key)
+    if narrative:
+        with span("llm.advice"):
+            ai_result = await get_financial_advice_async(metrics, company_info)
+    else:
+        ai_result = fallback_advice(metrics, "AI narrative not requested", score)
+    assessment = await run_db(save_assessment, db, company.id, ai_result, score, record_id)
+
+    return {
+        "status": "success", 
+        "record_id": record_id,
+        "metrics": metrics, 
+        "rollups": rollups,
+        "assessment": assessment_summary(assessment, score)
+    }
+
+def _save_assessment_session(session_factory, company_id: int, ai_result: str, score: dict, record_id: int):
+    # save_assessment on a session of its own, for callers without one
+    db = session_factory()
+    try:
+        return save_assessment(db, company_id, ai_result, score, record_id)
+    finally:
+        db.close()
+
+async def _narrate(session_factory, company_id: int, record_id: int, metrics: dict, company_info: dict,
+                   score: dict, queue: asyncio.Queue):
+    # Streams the advisor's summary into `queue`, then stores the assessment
+    # and ends with None. Runs as its own task so that the assessment is
+    # stored even when the client goes away mid-stream.
+    try:
+        ai_result = None
+        with span("llm.advice"):
+            async for kind, value in stream_financial_advice(metrics, company_info):
+                if kind == "summary":
+                    queue.put_nowait(("narrative", {"text": value}))
+                else:
+                    ai_result = value
+        assessment = await run_in_threadpool(_save_assessment_session, session_factory, company_id, ai_result,
+                                             score, record_id)
+        queue.put_nowait(("assessment", assessment_summary(assessment, score)))
+    except Exception as e:
+        queue.put_nowait(("error", {"detail": f"Assessment failed ({e})"}))
+    finally:
+        queue.put_nowait(None)
+
+async def stream_upload(session_factory, company_id: int, file_location: str, idempotency_key: str = None):
+    """
+    process_upload as a stream of (event, data) pairs for server-sent
+    events: "metrics" (metrics, rollups and the local score) as soon as the
+    file is parsed, "narrative" pieces of the AI summary as the model writes
+    them, then "assessment" once it is stored; "assessment" is
+    authoritative (a failed or late model answer is replaced by the
+    fallback). Parse errors end the stream with an "error" event, and a
+    repeated upload with a single "duplicate" event (find_upload).
+    """
+    db = session_factory()
+    try:
+        company = await run_db(db.get, Company, company_id)
+        try:
+            company_info, record_id, metrics, rollups, score = await ingest_upload(db, company, file_location,
+                                                                                  idempotency_key)
+        except ValueError as e:
+            yield "error", {"detail": str(e)}
+            return
+        except DuplicateUpload:
+            yield "duplicate", await run_db(find_upload, db, company_id, stored_digest(file_location),
+                                            idempotency_key)
+            return
+    finally:
+        await run_db(db.close)
+
+    yield "metrics", {
+        "record_id": record_id,
+        "metrics": metrics,
+        "rollups": rollups,
+        "score": {"score": score["overall_score"], "risk": score["risk_level"], "drivers": score["drivers"]}
+    }
+
+    queue = asyncio.Queue()
+    task = asyncio.create_task(_narrate(session_factory, company_id, record_id, metrics, company_info, score, queue))
+    _narration_tasks.add(task)
+    task.add_done_callback(_narration_tasks.discard)
+    while (event := await queue.get()) is not None:
+        yield event
+
+def _job_company(db: Session, company_id: int):
+    company = db.query(Company).filter(Company.id == company_id).first()
+    # End the read transaction: handlers hold no connection while they wait
+    db.commit()
+    return company
+
+async def run_upload_job(db: Session, job):
+    payload = json.loads(job.payload)
+    company = await run_db(_job_company, db, job.company_id)
+    if not company:
+        raise ValueError("Company not found")
+    result = await process_upload(db, company, payload["file_location"], payload.get("narrative", True),
+                                  payload.get("idempotency_key"))
+    return jsonable_encoder(result)
+
+async def run_assessment_job(db: Session, job):
+    """
+    Deferred AI assessment for metrics that were already stored, e.g. by bulk
+    ingestion. Throughput is bounded by the job workers and the advisor's
+    LLM concurrency limit.
+    """
+    payload = json.loads(job.payload)
+    company = await run_db(_job_company, db, job.company_id)
+    if not company:
+        raise ValueError("Company not found")
+    company_info = {
+        "name": company.name,
+        "industry": company.industry,
+        "business_type": company.business_type
+    }
+
+    with span("llm.advice"):
+        ai_result = await get_financial_advice_async(payload["metrics"], company_info)
+    assessment = await run_db(save_assessment, db, company.id, ai_result, score_metrics(payload["metrics"]),
+                              payload.get("record_id"))
+    return {"assessment_id": assessment.id, "score": assessment.overall_score, "risk": assessment.risk_level}
+
+async def run_bulk_ingest_job(db: Session, job):
+    payload = json.loads(job.payload)
+    try:
+        # Parsing fans out to a process pool; keep the event loop free meanwhile.
+        return await run_db(ingest_bundle, db, payload["root"], None, payload.get("assess", True))
+    finally:
+        # The ledgers are in the ledger store by now; the extracted copy can go
+        if payload.get("bundle_dir"):
+            await run_in_threadpool(shutil.rmtree, payload["bundle_dir"], True)
+
+async def run_forecast_refresh_job(db: Session, job):
+    payload = json.loads(job.payload)
+    # Reads every company's ledgers; keep the event loop free meanwhile.
+    return await run_db(refresh_forecasts, db, payload.get("company_ids"),
+                        payload.get("horizon", FORECAST_HORIZON_DAYS))
+
+# Job kind -> async handler(db, job) returning a JSON-serializable result.
+JOB_HANDLERS = {
+    "upload": run_upload_job,
+    "assessment": run_assessment_job,
+    "bulk_ingest": run_bulk_ingest_job,
+    "forecast_refresh": run_forecast_refresh_job
+}
@@ -0,0 +1,206 @@
+import os
+import numpy as np
+from sqlalchemy import func, select
+from sqlalchemy.orm import Session
+from dotenv import load_dotenv
+
+from models import Company, Assessment, CompanySnapshot
+
+load_dotenv()
+
+# A metric is an outlier when its robust z-score (median/MAD within the
+# company's peer group) is beyond this
+PORTFOLIO_OUTLIER_Z = float(os.getenv("PORTFOLIO_OUTLIER_Z", "3.5"))
+# Score drop against the previous assessment that counts as slipping
+SCORE_SLIP_POINTS = int(os.getenv("SCORE_SLIP_POINTS", "10"))
+# Peer groups smaller than this are ranked against the whole portfolio
+MIN_PEER_GROUP = 5
+
+# Per-company figures that are ranked and benchmarked; margin and the
+# changes are percentages
+ANALYTICS_METRICS = ["overall_score", "score_change", "revenue", "net_profit", "margin", "revenue_change",
+                     "profit_change"]
+OUTLIER_METRICS = ["margin", "revenue_change", "profit_change"]
+BENCHMARK_QUANTILES = {"p25": 0.25, "median": 0.5, "p75": 0.75}
+PEER_GROUPS = {"industry": ["industry"], "business_type": ["business_type"], "both": ["industry", "business_type"]}
+# Scales the MAD to a standard deviation for normally distributed data
+MAD_SCALE = 1.4826
+
+def _company_filter(industry: str = None, business_type: str = None):
+    conditions = []
+    if industry:
+        conditions.append(Company.industry == industry)
+    if business_type:
+        conditions.append(Company.business_type == business_type)
+    return conditions
+
+def load_portfolio(db: Session, industry: str = None, business_type: str = None):
+    """
+    One row per company with a snapshot: its latest figures and score plus
+    the score of the assessment before, as a DataFrame. Two set-based
+    queries (the snapshot join and a windowed read of the assessments)
+    whatever the number of companies.
+    """
+    import pandas as pd
+
+    conditions = _company_filter(industry, business_type)
+    result = db.execute(
+        select(CompanySnapshot.company_id, Company.name, Company.industry, Company.business_type,
+               CompanySnapshot.revenue, CompanySnapshot.expenses, CompanySnapshot.net_profit,
+               CompanySnapshot.revenue_change, CompanySnapshot.profit_change, CompanySnapshot.overall_score,
+               CompanySnapshot.risk_level, CompanySnapshot.version)
+        .join(Company, Company.id == CompanySnapshot.company_id)
+        .where(*conditions)
+        .order_by(CompanySnapshot.company_id)
+    )
+    frame = pd.DataFrame(result.all(), columns=list(result.keys()))
+
+    # Second newest assessment per company (ix_assessments_company_created)
+    rank = func.row_number().over(
+        partition_by=Assessment.company_id,
+        order_by=(Assessment.created_at.desc(), Assessment.id.desc())
+    ).label("rank")
+    ranked = select(Assessment.company_id, Assessment.overall_score, rank)
+    if conditions:
+        ranked = ranked.where(Assessment.company_id.in_(select(Company.id).where(*conditions)))
+    ranked = ranked.subquery()
+    previous = dict(db.execute(
+        select(ranked.c.company_id, ranked.c.overall_score).where(ranked.c.rank == 2)
+    ).all())
+
+    for column in ("revenue", "expenses", "net_profit", "revenue_change", "profit_change", "overall_score"):
+        frame[column] = frame[column].astype("float64")
+    frame["industry"] = frame["industry"].fillna("Unknown")
+    frame["business_type"] = frame["business_type"].fillna("Unknown")
+    frame["previous_score"] = frame["company_id"].map(previous).astype("float64")
+    return frame
+
+def _percentiles(frame, keys: list):
+    """
+    Percentile rank (0-100, ties averaged) of each metric across the
+    portfolio and within the company's peer group; small groups fall back
+    to the portfolio ranks.
+    """
+    small = frame.groupby(keys)["company_id"].transform("size") < MIN_PEER_GROUP
+    overall = frame[ANALYTICS_METRICS].rank(pct=True) * 100
+    peers = frame.groupby(keys)[ANALYTICS_METRICS].rank(pct=True) * 100
+    return overall, peers.mask(small, overall)
+
+def _robust_z(frame, keys: list):
+    # (value - peer median) / scaled MAD; NaN where the spread is zero
+    small = frame.groupby(keys)["company_id"].transform("size") < MIN_PEER_GROUP
+    grouped = frame.groupby(keys)[OUTLIER_METRICS]
+    median = grouped.transform("median")
+    mad = (frame[OUTLIER_METRICS] - median).abs().groupby([frame[key] for key in keys]).transform("median")
+    overall_median = frame[OUTLIER_METRICS].median()
+    overall_mad = (frame[OUTLIER_METRICS] - overall_median).abs().median()
+    median = median.mask(small, overall_median, axis=1)
+    mad = mad.mask(small, overall_mad, axis=1)
+    return (frame[OUTLIER_METRICS] - median) / (mad * MAD_SCALE).replace(0.0, np.nan)
+
+def _distribution(frame):
+    quantiles = frame[ANALYTICS_METRICS].quantile(list(BENCHMARK_QUANTILES.values()))
+    return {
+        metric: {name: _number(quantiles.at[q, metric]) for name, q in BENCHMARK_QUANTILES.items()}
+        for metric in ANALYTICS_METRICS
+    }
+
+def _number(value):
+    return None if value is None or value != value else float(value)
+
+def _rows(values: np.ndarray):
+    # Float matrix -> nested lists with NaN as None, for JSON
+    return [[None if value != value else value for value in row] for row in values.astype(np.float64).tolist()]
+
+def portfolio_analytics(db: Session, group_by: str = "industry", industry: str = None, business_type: str = None,
+                        limit: int = 100):
+    """
+    Cross-company view in one columnar pass over load_portfolio: the
+    portfolio's distribution of each metric, benchmarks per peer group
+    (industry, business_type or both), and the companies that are burning
+    cash, slipping in score (by SCORE_SLIP_POINTS or more) or outliers
+    against their peers, worst first, each with its percentile ranks.
+    Returns (result, [(company_id, version), ...]) for the ETag.
+    """
+    import pandas as pd
+
+    keys = PEER_GROUPS[group_by]
+    frame = load_portfolio(db, industry, business_type)
+    versions = list(zip(frame["company_id"].tolist(), frame["version"].tolist()))
+    if frame.empty:
+        return {"companies": 0, "group_by": group_by, "portfolio": {}, "benchmarks": [], "flag_counts": {},
+                "flagged_total": 0, "flagged": []}, versions
+
+    revenue = frame["revenue"].to_numpy()
+    with np.errstate(divide="ignore", invalid="ignore"):
+        frame["margin"] = np.where(revenue > 0, frame["net_profit"].to_numpy() / revenue * 100, np.nan)
+    frame["score_change"] = frame["overall_score"] - frame["previous_score"]
+
+    overall_rank, peer_rank = _percentiles(frame, keys)
+    z = _robust_z(frame, keys)
+    flags = {
+        "burning_cash": (frame["net_profit"] < 0).to_numpy(),
+        "score_slipping": (frame["score_change"] <= -SCORE_SLIP_POINTS).to_numpy(),
+        **{f"outlier_{metric}": (z[metric].abs() > PORTFOLIO_OUTLIER_Z).to_numpy() for metric in OUTLIER_METRICS}
+    }
+    flag_matrix = np.column_stack(list(flags.values()))
+    flag_names = np.array(list(flags))
+
+    grouped = frame.groupby(keys)
+    counts = grouped.size()
+    burning = pd.Series(flags["burning_cash"], index=frame.index).groupby([frame[key] for key in keys]).mean()
+    # Columns (metric, quantile), one row per peer group
+    quantiles = grouped[ANALYTICS_METRICS].quantile(list(BENCHMARK_QUANTILES.values())).unstack()
+    benchmarks = [
+        {
+            **dict(zip(keys, group if isinstance(group, tuple) else (group,))),
+            "companies": int(count),
+            "burning_cash_share": float(burning[group]),
+            "metrics": {
+                metric: {name: _number(quantiles.at[group, (metric, q)]) for name, q in BENCHMARK_QUANTILES.items()}
+                for metric in ANALYTICS_METRICS
+            }
+        }
+        for group, count in counts.items()
+    ]
+
+    # Worst first: most flags, then the biggest score drop, then the lowest score
+    flagged = np.flatnonzero(flag_matrix.any(axis=1))
+    order = np.lexsort((
+        frame["overall_score"].to_numpy()[flagged],
+        np.nan_to_num(frame["score_change"].to_numpy()[flagged], nan=0.0),
+        -flag_matrix[flagged].sum(axis=1)
+    ))
+    top = flagged[order][:limit]
+    labels = frame[["company_id", "name", "industry", "business_type", "risk_level"]].iloc[top]
+    metrics = _rows(frame[ANALYTICS_METRICS].to_numpy()[top])
+    percentiles = _rows(overall_rank.to_numpy()[top])
+    peer_percentiles = _rows(peer_rank.to_numpy()[top])
+    peer_z = _rows(z.to_numpy()[top])
+    items = [
+        {
+            "company_id": company_id,
+            "name": name,
+            "industry": industry,
+            "business_type": business_type,
+            "risk_level": risk_level,
+            "flags": flag_names[flag_matrix[index]].tolist(),
+            **dict(zip(ANALYTICS_METRICS, metrics[i])),
+            "percentile": dict(zip(ANALYTICS_METRICS, percentiles[i])),
+            "peer_percentile": dict(zip(ANALYTICS_METRICS, peer_percentiles[i])),
+            "peer_z": dict(zip(OUTLIER_METRICS, peer_z[i]))
+        }
+        for i, (index, (company_id, name, industry, business_type, risk_level))
+        in enumerate(zip(top, labels.itertuples(index=False)))
+    ]
+
+    result = {
+        "companies": len(frame),
+        "group_by": group_by,
+        "portfolio": _distribution(frame),
+        "benchmarks": benchmarks,
+        "flag_counts": {name: int(column.sum()) for name, column in flags.items()},
+        "flagged_total": int(len(flagged)),
+        "flagged": items
+    }
+    return result, versions
@@ -0,0 +1,158 @@
+from datetime import datetime
+import numpy as np
+import pandas as pd
+from sqlalchemy import insert
+from sqlalchemy.orm import Session
+
+from database import conflict_insert
+from models import MonthlyRollup, LedgerRowFingerprint
+from services.ledger_store import read_ledger
+from services.metrics import compute_ledger_metrics
+
+# Fingerprints inserted per executemany call
+FINGERPRINT_BATCH = 50_000
+
+def _mix(values: np.ndarray):
+    # splitmix64 finalizer; uint64 arithmetic wraps around
+    values = (values ^ (values >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+    values = (values ^ (values >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+    return values ^ (values >> np.uint64(31))
+
+def _combine(seed: np.ndarray, values: np.ndarray):
+    return _mix(seed * np.uint64(0x9E3779B97F4A7C15) + values.astype(np.uint64))
+
+def ledger_fingerprints(columns: dict):
+    """
+    64-bit fingerprint per row over (date, category, amount in cents, type,
+    occurrence). The occurrence index numbers identical rows within one
+    ledger, so two genuine same-day purchases stay distinct while the rows a
+    running year-to-date export repeats map to the same fingerprints.
+    """
+    with np.errstate(over="ignore"):
+        # Category labels are hashed once each, then looked up by code.
+        labels = pd.util.hash_array(np.asarray(columns["categories"], dtype=object))
+        row = _mix(columns["dates"].view(np.int64).astype(np.uint64))
+        row = _combine(row, labels[columns["category_codes"]])
+        row = _combine(row, np.round(columns["amounts"] * 100).astype(np.int64))
+        row = _combine(row, columns["type_codes"])
+
+        order = np.argsort(row, kind="stable")
+        ordered = row[order]
+        starts = np.r_[True, ordered[1:] != ordered[:-1]]
+        positions = np.arange(len(row))
+        occurrence = np.empty(len(row), dtype=np.int64)
+        occurrence[order] = positions - np.maximum.accumulate(np.where(starts, positions, 0))
+
+        return _combine(row, occurrence).view(np.int64)
+
+def dated_columns(ledger_path: str):
+    # A stored ledger's rows as columns, without the undated ones
+    table = read_ledger(ledger_path)
+    category = table.column("category").combine_chunks()
+    columns = {
+        "dates": table.column("date").to_numpy(),
+        "type_codes": table.column("type").to_numpy(),
+        "amounts": table.column("amount").to_numpy(),
+        "category_codes": category.indices.to_numpy(zero_copy_only=False),
+        "categories": category.dictionary.to_numpy(zero_copy_only=False)
+    }
+    dated = ~np.isnat(columns["dates"])
+    if not dated.all():
+        # Rows without a date cannot be placed in a month.
+        columns.update({key: columns[key][dated] for key in ("dates", "type_codes", "amounts", "category_codes")})
+    return columns
+
+def apply_rollups(db: Session, company_id: int, ledger_path: str, new_company: bool = False):
+    """
+    Folds the rows of a stored ledger that the company has not uploaded
+    before into its monthly rollups. Work in the database is proportional to
+    the new rows; undated rows are left out. Fingerprints are inserted with
+    ON CONFLICT DO NOTHING, only the rows whose fingerprint this call wrote
+    are counted and the months are bumped with an atomic upsert, so
+    concurrent overlapping uploads neither fail nor count a row twice.
+    `new_company` skips the conflict handling when there is nothing to
+    deduplicate against (bulk onboarding). Flushes but does not commit, so
+    the caller commits the rollups together with the upload's
+    FinancialRecord.
+    """
+    columns = dated_columns(ledger_path)
+    total = len(columns["dates"])
+    if not total:
+        return {"new_rows": 0, "duplicate_rows": 0, "months": []}
+
+    fingerprints = ledger_fingerprints(columns)
+    months = columns["dates"].astype("datetime64[M]")
+
+    if not new_company:
+        # Rows counted by committed uploads are dropped up front (only this
+        # upload's months can hold them); the insert below settles the rest.
+        seen = db.query(LedgerRowFingerprint.fingerprint).filter(
+            LedgerRowFingerprint.company_id == company_id,
+            LedgerRowFingerprint.month.in_(np.unique(months).astype(str).tolist())
+        ).all()
+        unseen = ~np.isin(fingerprints, np.fromiter((fp for (fp,) in seen), dtype=np.int64, count=len(seen)))
+        if not unseen.any():
+            return {"new_rows": 0, "duplicate_rows": total, "months": []}
+        columns = {key: value[unseen] if key != "categories" else value for key, value in columns.items()}
+        fingerprints, months = fingerprints[unseen], months[unseen]
+
+    # Same lock order in every transaction (Postgres would otherwise
+    # deadlock two uploads waiting on each other's fingerprints)
+    order = np.lexsort((fingerprints, months))
+    month_strings = months[order].astype(str).tolist()
+    fingerprint_values = fingerprints[order].tolist()
+
+    # Core inserts on the table: the ORM's bulk insert bookkeeping costs
+    # more than the statement itself at this volume
+    table = LedgerRowFingerprint.__table__
+    if new_company:
+        statement = insert(table)
+    else:
+        statement = conflict_insert(db, table).on_conflict_do_nothing().returning(table.c.fingerprint)
+    written = []
+    for start in range(0, len(fingerprint_values), FINGERPRINT_BATCH):
+        result = db.execute(statement, [
+            {"company_id": company_id, "month": month, "fingerprint": fingerprint}
+            for month, fingerprint in zip(month_strings[start:start + FINGERPRINT_BATCH],
+                                          fingerprint_values[start:start + FINGERPRINT_BATCH])
+        ])
+        if not new_company:
+            written.extend(fp for (fp,) in result)
+
+    if not new_company:
+        # Rows a concurrent upload counted first
+        new = np.isin(fingerprints, np.fromiter(written, dtype=np.int64, count=len(written)))
+        if not new.any():
+            return {"new_rows": 0, "duplicate_rows": total, "months": []}
+        columns = {key: value[new] if key != "categories" else value for key, value in columns.items()}
+        fingerprints, months = fingerprints[new], months[new]
+
+    by_month = compute_ledger_metrics(columns)["by_month"]
+    month_labels, month_rows = np.unique(months, return_counts=True)
+    row_counts = dict(zip(month_labels.astype(str).tolist(), month_rows.tolist()))
+
+    # Increments are applied in the database, not read and written back
+    statement = conflict_insert(db, MonthlyRollup)
+    statement = statement.on_conflict_do_update(
+        index_elements=[MonthlyRollup.company_id, MonthlyRollup.month],
+        set_={
+            "revenue": MonthlyRollup.revenue + statement.excluded.revenue,
+            "expenses": MonthlyRollup.expenses + statement.excluded.expenses,
+            "net_profit": MonthlyRollup.net_profit + statement.excluded.net_profit,
+            "row_count": MonthlyRollup.row_count + statement.excluded.row_count,
+            "updated_at": statement.excluded.updated_at
+        }
+    )
+    now = datetime.utcnow()
+    db.execute(statement, [
+        {"company_id": company_id, "month": month, "revenue": totals["revenue"], "expenses": totals["expenses"],
+         "net_profit": totals["revenue"] - totals["expenses"], "row_count": row_counts[month], "updated_at": now}
+        for month, totals in sorted(by_month.items())
+    ])
+    db.flush()
+
+    return {
+        "new_rows": int(len(fingerprints)),
+        "duplicate_rows": int(total - len(fingerprints)),
+        "months": sorted(by_month)
+    }
@@ -0,0 +1,255 @@
+import numpy as np
+from sqlalchemy.orm import Session
+
+from models import MonthlyRollup
+
+# Income categories that are not trading revenue (one-off or financing);
+# matched as lowercase substrings of the category name
+NON_OPERATING_INCOME = ("grant", "loan", "investment", "investor", "funding", "dividend", "capital", "equity",
+                        "interest income", "insurance payout")
+# Months of recent net profit used as the burn rate for runway
+BURN_MONTHS = 3
+# Runway is reported up to this many months (not burning counts as the cap)
+RUNWAY_CAP_MONTHS = 24
+
+# Ratio -> risk component in [0, 1], by linear interpolation between the
+# breakpoints: (ratio breakpoints ascending, risk at each breakpoint)
+RISK_CURVES = {
+    "margin": ([-0.2, 0.0, 0.1, 0.25], [1.0, 0.7, 0.4, 0.0]),
+    "runway_months": ([0.0, 3.0, 6.0, 12.0], [1.0, 0.7, 0.3, 0.0]),
+    "income_volatility": ([0.1, 0.5, 1.0], [0.0, 0.5, 1.0]),
+    "revenue_dependence": ([0.3, 0.6, 0.9], [0.0, 0.5, 1.0]),
+    "non_operating_share": ([0.0, 0.2, 0.5], [0.0, 0.5, 1.0]),
+    "expense_concentration": ([0.2, 0.5, 0.8], [0.0, 0.5, 1.0])
+}
+RISK_WEIGHTS = {
+    "margin": 0.35,
+    "runway_months": 0.2,
+    "income_volatility": 0.15,
+    "revenue_dependence": 0.1,
+    "non_operating_share": 0.1,
+    "expense_concentration": 0.1
+}
+FEATURES = tuple(RISK_WEIGHTS)
+
+# risk_score below the first bound is Safe, below the second Caution
+RISK_LEVELS = (40, 70)
+
+RECOMMENDATIONS = {
+    "margin": "Review pricing and cut or defer discretionary expenses to lift the net margin above 10%",
+    "runway_months": "Build a 13-week cash-flow forecast and secure a reserve covering at least three months of expenses",
+    "income_volatility": "Smooth monthly income with retainers, subscriptions or deposits on large orders",
+    "revenue_dependence": "Reduce reliance on the largest revenue source by growing other products or clients",
+    "non_operating_share": "Plan for grants, loans and other one-off income ending; operating revenue should cover costs",
+    "expense_concentration": "Renegotiate or re-tender the largest expense category, which dominates costs"
+}
+DRIVER_LABELS = {
+    "margin": "a thin or negative margin",
+    "runway_months": "a short cash runway",
+    "income_volatility": "volatile monthly income",
+    "revenue_dependence": "dependence on one revenue source",
+    "non_operating_share": "reliance on grants, loans or other one-off income",
+    "expense_concentration": "costs concentrated in one category"
+}
+HEALTHY_RECOMMENDATIONS = [
+    "Keep a cash reserve covering at least three months of expenses",
+    "Reinvest part of the surplus into the best-performing revenue lines",
+    "Monitor expense growth so it stays below revenue growth"
+]
+
+def _share(values: np.ndarray, total: float):
+    return values / total if total > 0 else np.zeros_like(values)
+
+def _monthly_features(revenue: np.ndarray, net: np.ndarray):
+    # Coefficient of variation of monthly revenue, and runway: surplus
+    # earned over the period divided by the recent monthly burn
+    volatility = revenue.std() / revenue.mean() if len(revenue) >= 2 and revenue.mean() > 0 else np.nan
+    if not len(net):
+        return volatility, np.nan
+    burn = -net[-BURN_MONTHS:].mean()
+    runway = min(max(net.sum(), 0.0) / burn, RUNWAY_CAP_MONTHS) if burn > 0 else RUNWAY_CAP_MONTHS
+    return volatility, runway
+
+def metrics_features(metrics: dict):
+    """
+    Scoring ratios for one ledger's metrics (parser output, or its JSON
+    form). Ratios the ledger cannot support (e.g. volatility from a single
+    month) are NaN and left out of the score.
+    """
+    revenue = metrics.get("revenue", 0) or 0.0
+    expenses = metrics.get("expenses", 0) or 0.0
+    by_category = metrics.get("by_category") or {}
+    by_month = metrics.get("by_month") or {}
+
+    names = list(by_category)
+    income = np.array([by_category[name]["revenue"] for name in names], dtype=np.float64)
+    spend = np.array([by_category[name]["expenses"] for name in names], dtype=np.float64)
+    non_operating = np.array([any(word in name.lower() for word in NON_OPERATING_INCOME) for name in names], dtype=bool)
+
+    months = sorted(by_month)
+    monthly_revenue = np.array([by_month[month]["revenue"] for month in months], dtype=np.float64)
+    monthly_net = np.array([by_month[month]["revenue"] - by_month[month]["expenses"] for month in months],
+                           dtype=np.float64)
+    volatility, runway = _monthly_features(monthly_revenue, monthly_net)
+
+    return {
+        "margin": (revenue - expenses) / revenue if revenue > 0 else (-1.0 if expenses > 0 else np.nan),
+        "runway_months": runway,
+        "income_volatility": volatility,
+        "revenue_dependence": _share(income, revenue).max() if len(names) and revenue > 0 else np.nan,
+        "non_operating_share": _share(income[non_operating], revenue).sum() if revenue > 0 else np.nan,
+        "expense_concentration": np.square(_share(spend, expenses)).sum() if len(names) and expenses > 0 else np.nan,
+        "net_profit": revenue - expenses
+    }
+
+def score_features(features: dict):
+    """
+    Vectorized scoring: `features` maps each name in FEATURES (plus
+    "net_profit") to an array with one entry per company. Returns arrays
+    risk_score and overall_score (0-100, overall = 100 - risk), risk_level,
+    and each feature's risk component. NaN features are left out and the
+    remaining weights renormalized.
+    """
+    net_profit = np.asarray(features["net_profit"], dtype=np.float64)
+    weighted = np.zeros(len(net_profit))
+    weights = np.zeros(len(net_profit))
+    components = {}
+    for name in FEATURES:
+        values = np.asarray(features[name], dtype=np.float64)
+        known = ~np.isnan(values)
+        component = np.interp(np.where(known, values, 0.0), *RISK_CURVES[name])
+        components[name] = np.where(known, component, np.nan)
+        weighted += np.where(known, component * RISK_WEIGHTS[name], 0.0)
+        weights += np.where(known, RISK_WEIGHTS[name], 0.0)
+
+    risk = np.divide(weighted, weights, out=np.full(len(weighted), 0.5), where=weights > 0) * 100
+    # The same hard rules the advisor prompt gives the LLM
+    margin = np.asarray(features["margin"], dtype=np.float64)
+    risk = np.where(net_profit < 0, np.maximum(risk, 71), risk)
+    small_margin = (net_profit >= 0) & (margin < 0.10)
+    risk = np.where(small_margin, np.clip(risk, 40, 60), risk)
+
+    risk_score = np.rint(risk).astype(np.int64)
+    risk_level = np.select([risk_score < RISK_LEVELS[0], risk_score < RISK_LEVELS[1]], ["Safe", "Caution"],
+                           "Critical")
+    return {
+        "risk_score": risk_score,
+        "overall_score": 100 - risk_score,
+        "risk_level": risk_level,
+        "components": components
+    }
+
+def score_many(metrics_list: list):
+    """
+    Deterministic scores for several ledgers' metrics in one vectorized
+    pass (e.g. a bulk upload). Each is a dict of overall_score, risk_score,
+    risk_level, the ratios behind them and the drivers: components that
+    carry at least half their risk, largest weighted first.
+    """
+    features = [metrics_features(metrics) for metrics in metrics_list]
+    if not features:
+        return []
+    arrays = {name: np.array([entry[name] for entry in features], dtype=np.float64) for name in (*FEATURES, "net_profit")}
+    scored = score_features(arrays)
+
+    components = np.column_stack([scored["components"][name] for name in FEATURES])
+    weighted = np.where(components >= 0.5, components * np.array([RISK_WEIGHTS[name] for name in FEATURES]), 0.0)
+    order = np.argsort(-weighted, axis=1, kind="stable")
+    ratios = np.round(np.column_stack([arrays[name] for name in FEATURES]), 4)
+
+    return [
+        {
+            "overall_score": int(scored["overall_score"][row]),
+            "risk_score": int(scored["risk_score"][row]),
+            "risk_level": str(scored["risk_level"][row]),
+            "ratios": {name: None if np.isnan(value) else float(value) for name, value in zip(FEATURES, ratios[row])},
+            "drivers": [FEATURES[index] for index in order[row] if weighted[row, index] > 0]
+        }
+        for row in range(len(features))
+    ]
+
+def score_metrics(metrics: dict):
+    return score_many([metrics])[0]
+
+def score_summary(metrics: dict, score: dict):
+    revenue = metrics.get("revenue", 0) or 0.0
+    profit = metrics.get("net_profit", 0) or 0.0
+    margin = profit / revenue if revenue else 0.0
+    summary = (f"Revenue of ${revenue:,.2f} and net profit of ${profit:,.2f} ({margin:.1%} margin). "
+               f"Risk is {score['risk_level']} ({score['risk_score']}/100)")
+    if score["drivers"]:
+        summary += ", driven by " + ", ".join(DRIVER_LABELS[name] for name in score["drivers"])
+    return summary + "."
+
+def score_recommendations(score: dict, limit: int = 3):
+    recommendations = [RECOMMENDATIONS[name] for name in score["drivers"][:limit]]
+    return recommendations + HEALTHY_RECOMMENDATIONS[:max(limit - len(recommendations), 0)]
+
+def rollup_features(rollups):
+    """
+    Scoring ratios for many companies at once from monthly rollups
+    (columns company_id, month, revenue, expenses), one row per company in
+    company_id order. Category ratios are not kept in rollups and come out
+    NaN.
+    """
+    rollups = rollups.sort_values(["company_id", "month"])
+    companies, codes = np.unique(rollups["company_id"].to_numpy(), return_inverse=True)
+    size = len(companies)
+    revenue = rollups["revenue"].to_numpy(dtype=np.float64)
+    net = revenue - rollups["expenses"].to_numpy(dtype=np.float64)
+
+    def total(values):
+        return np.bincount(codes, weights=values, minlength=size)
+
+    months = np.bincount(codes, minlength=size)
+    revenue_total, net_total = total(revenue), total(net)
+    mean = np.divide(revenue_total, months, out=np.zeros(size), where=months > 0)
+    variance = np.maximum(total(np.square(revenue)) / np.maximum(months, 1) - np.square(mean), 0.0)
+    volatility = np.where((months >= 2) & (mean > 0), np.sqrt(variance) / np.where(mean > 0, mean, 1.0), np.nan)
+
+    # Months counted from each company's latest; the last BURN_MONTHS give the burn
+    from_end = np.cumsum(months)[codes] - 1 - np.arange(len(codes))
+    recent = from_end < BURN_MONTHS
+    burn = -total(np.where(recent, net, 0.0)) / np.minimum(months, BURN_MONTHS)
+    runway = np.where(burn > 0, np.minimum(np.maximum(net_total, 0.0) / np.where(burn > 0, burn, 1.0),
+                                           RUNWAY_CAP_MONTHS), RUNWAY_CAP_MONTHS)
+
+    expenses_total = revenue_total - net_total
+    margin = np.where(revenue_total > 0, net_total / np.where(revenue_total > 0, revenue_total, 1.0),
+                      np.where(expenses_total > 0, -1.0, np.nan))
+    unknown = np.full(size, np.nan)
+    return companies, {
+        "margin": margin,
+        "runway_months": runway,
+        "income_volatility": volatility,
+        "revenue_dependence": unknown,
+        "non_operating_share": unknown,
+        "expense_concentration": unknown,
+        "net_profit": net_total
+    }
+
+def score_portfolio(db: Session, company_ids: list = None):
+    """
+    Scores every company with monthly rollups (or just `company_ids`) in one
+    query and one vectorized pass. Returns a DataFrame indexed by company_id
+    with overall_score, risk_score, risk_level and the ratios.
+    """
+    # pandas is only needed here; the per-upload path (and everything that
+    # imports this module at startup) does without it.
+    import pandas as pd
+
+    query = db.query(MonthlyRollup.company_id, MonthlyRollup.month, MonthlyRollup.revenue, MonthlyRollup.expenses)
+    if company_ids is not None:
+        query = query.filter(MonthlyRollup.company_id.in_(company_ids))
+    rollups = pd.DataFrame(query.all(), columns=["company_id", "month", "revenue", "expenses"])
+    if rollups.empty:
+        return pd.DataFrame(columns=["overall_score", "risk_score", "risk_level", *FEATURES])
+
+    companies, features = rollup_features(rollups)
+    scored = score_features(features)
+    return pd.DataFrame({
+        "overall_score": scored["overall_score"],
+        "risk_score": scored["risk_score"],
+        "risk_level": scored["risk_level"],
+        **{name: features[name] for name in FEATURES}
+    }, index=pd.Index(companies, name="company_id"))
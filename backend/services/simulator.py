@@ -1,14 +1,25 @@
+import asyncio
+import numpy as np
 
-import google.generativeai as genai
-import os
-from dotenv import load_dotenv
+from services.ai_advisor import llm_available, create_model, generate_text, stream_text
+from services.cache import ai_cache, cache_key
+from services.telemetry import record_llm_usage
 
-load_dotenv()
+# The frontend sliders move in 1% steps; critiques are cached at that granularity.
+MODIFIER_STEP = 0.01
 
-# Ensure we use the working model key
-GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
-if GEMINI_API_KEY:
-    genai.configure(api_key=GEMINI_API_KEY)
+# Keeps /simulate/grid payloads bounded (a 500x500 surface is ~250k floats).
+MAX_GRID_POINTS = 250_000
+
+# Monte Carlo defaults for project_multi_period. With fewer months of history
+# than MIN_HISTORY_MONTHS the drift is assumed flat and the volatility falls
+# back to DEFAULT_MONTHLY_VOLATILITY.
+MONTE_CARLO_PATHS = 10_000
+MIN_HISTORY_MONTHS = 3
+DEFAULT_MONTHLY_VOLATILITY = 0.10
+# Clamp on the historical monthly drift so a couple of odd months cannot
+# compound into absurd projections.
+MAX_MONTHLY_DRIFT = 0.10
 
 def calculate_projection(base_metrics: dict, modifiers: dict):
     """
@@ -46,15 +57,177 @@ def calculate_projection(base_metrics: dict, modifiers: dict):
         }
     }
 
-def analyze_scenario(projection: dict, company_info: dict):
+def modifier_count(spec):
     """
-    Asks AI to critique the scenario.
+    Number of values expand_modifier_values returns for `spec`, without
+    allocating them, so oversized ranges are refused before any memory is
+    spent. The step defaults to MODIFIER_STEP only when it is not given.
     """
-    if not GEMINI_API_KEY:
-        return "AI Analysis Unavailable (Key Missing)"
+    if isinstance(spec, dict):
+        step = spec.get("step", MODIFIER_STEP)
+        if not step > 0:
+            raise ValueError("Range step must be positive")
+        span = (spec["stop"] - spec["start"]) / step
+        if not np.isfinite(span):
+            raise ValueError("Range start, stop and step must be finite")
+        return max(int(np.floor(span + 1e-9)) + 1, 0)
+    return np.asarray(spec, dtype=np.float64).size
+
+def expand_modifier_values(spec):
+    """
+    Turns a list of modifiers or a {"start", "stop", "step"} range (stop
+    inclusive) into a float64 array.
+    """
+    if isinstance(spec, dict):
+        return spec["start"] + spec.get("step", MODIFIER_STEP) * np.arange(modifier_count(spec), dtype=np.float64)
+    return np.asarray(spec, dtype=np.float64).ravel()
+
+def calculate_projection_grid(base_metrics: dict, revenue_growth, expense_change):
+    """
+    calculate_projection over the whole (revenue_growth x expense_change)
+    cartesian grid in one broadcast pass. Returns a compact payload: the two
+    axes, the net profit surface (rows = revenue_growth) and the breakeven
+    contour, i.e. the expense change at which profit hits zero for each
+    revenue growth value.
+    """
+    points = modifier_count(revenue_growth) * modifier_count(expense_change)
+    if points > MAX_GRID_POINTS:
+        raise ValueError(f"Grid too large: {points} points (max {MAX_GRID_POINTS})")
+    growth = expand_modifier_values(revenue_growth)
+    change = expand_modifier_values(expense_change)
+
+    original_revenue = float(base_metrics.get("revenue", 0.0))
+    original_expenses = float(base_metrics.get("expenses", 0.0))
+
+    new_revenue = original_revenue * (1 + growth)
+    new_expenses = original_expenses * (1 + change)
+    profit = new_revenue[:, None] - new_expenses[None, :]
+
+    # profit == 0  <=>  expense_change = R(1+g)/E - 1
+    if original_expenses:
+        breakeven = (new_revenue / original_expenses - 1).round(6).tolist()
+    else:
+        breakeven = [None] * growth.size
+
+    best = np.unravel_index(np.argmax(profit), profit.shape) if profit.size else None
+
+    return {
+        "revenue_growth": growth.round(6).tolist(),
+        "expense_change": change.round(6).tolist(),
+        "projected_revenue": new_revenue.round(2).tolist(),
+        "projected_expenses": new_expenses.round(2).tolist(),
+        "net_profit": profit.round(2).tolist(),
+        "breakeven_expense_change": breakeven,
+        "profitable_share": float((profit > 0).mean()) if profit.size else 0.0,
+        "best": {
+            "revenue_growth": float(growth[best[0]]),
+            "expense_change": float(change[best[1]]),
+            "net_profit": float(profit[best])
+        } if best is not None else None
+    }
+
+def monthly_history(base_metrics: dict):
+    """
+    Per-month revenue and expense series (oldest first) from the by_month
+    breakdown of the upload metrics. Without it the totals count as one month.
+    """
+    by_month = base_metrics.get("by_month") or {}
+    if by_month:
+        months = sorted(by_month)
+        revenue = np.array([by_month[m].get("revenue", 0.0) for m in months], dtype=np.float64)
+        expenses = np.array([by_month[m].get("expenses", 0.0) for m in months], dtype=np.float64)
+        return revenue, expenses
+    return (np.array([base_metrics.get("revenue", 0.0)], dtype=np.float64),
+            np.array([base_metrics.get("expenses", 0.0)], dtype=np.float64))
+
+def _drift_and_volatility(series: np.ndarray):
+    # Log growth between consecutive positive months.
+    positive = series[series > 0]
+    if positive.size < MIN_HISTORY_MONTHS:
+        return 0.0, DEFAULT_MONTHLY_VOLATILITY
+    log_growth = np.diff(np.log(positive))
+    drift = float(np.clip(log_growth.mean(), -MAX_MONTHLY_DRIFT, MAX_MONTHLY_DRIFT))
+    return drift, float(log_growth.std(ddof=1))
+
+def _percentiles(values: np.ndarray, quantiles=(5, 50, 95)):
+    # Sort once along the path axis and interpolate, which is several times
+    # faster than np.percentile's per-column selection at 10k x 36.
+    ordered = np.sort(values, axis=0)
+    positions = np.asarray(quantiles, dtype=np.float64) / 100 * (ordered.shape[0] - 1)
+    lower = np.floor(positions).astype(np.int64)
+    upper = np.minimum(lower + 1, ordered.shape[0] - 1)
+    weight = (positions - lower).reshape((-1,) + (1,) * (ordered.ndim - 1))
+    return ordered[lower] * (1 - weight) + ordered[upper] * weight
+
+def project_multi_period(base_metrics: dict, modifiers: dict, months: int = 12, paths: int = MONTE_CARLO_PATHS,
+                         starting_cash: float = 0.0, seed: int = None):
+    """
+    Compounds monthly revenue and expenses over `months` with log-normal
+    Monte Carlo paths, vectorized across paths. The starting month is the
+    recent monthly run-rate with the one-shot modifiers of calculate_projection
+    applied; drift and volatility come from the ledger's monthly history.
+
+    Returns P5/P50/P95 bands per month for revenue, expenses, net profit and
+    cumulative cash, plus cash-runway percentiles (months until cash first goes
+    negative, capped at the horizon).
+    """
+    revenue_history, expense_history = monthly_history(base_metrics)
+    recent = slice(-MIN_HISTORY_MONTHS, None)
+    start = calculate_projection(
+        {"revenue": float(revenue_history[recent].mean()), "expenses": float(expense_history[recent].mean())},
+        modifiers
+    )["projected"]
+
+    revenue_drift, revenue_vol = _drift_and_volatility(revenue_history)
+    expense_drift, expense_vol = _drift_and_volatility(expense_history)
 
-    model = genai.GenerativeModel('gemini-flash-latest')
+    rng = np.random.default_rng(seed)
+    # float32 halves memory traffic; plenty of precision for percentile bands.
+    shocks = rng.standard_normal((2, paths, months), dtype=np.float32)
+    # Geometric Brownian motion in discrete monthly steps.
+    revenue = start["revenue"] * np.exp(np.cumsum(
+        (revenue_drift - 0.5 * revenue_vol ** 2) + revenue_vol * shocks[0], axis=1, dtype=np.float64))
+    expenses = start["expenses"] * np.exp(np.cumsum(
+        (expense_drift - 0.5 * expense_vol ** 2) + expense_vol * shocks[1], axis=1, dtype=np.float64))
+    profit = revenue - expenses
+    cash = starting_cash + np.cumsum(profit, axis=1)
 
+    negative = cash < 0
+    ever_negative = negative.any(axis=1)
+    runway = np.where(ever_negative, negative.argmax(axis=1), months)
+
+    def bands(values: np.ndarray):
+        p5, p50, p95 = _percentiles(values)
+        return {"p5": p5.round(2).tolist(), "p50": p50.round(2).tolist(), "p95": p95.round(2).tolist()}
+
+    total_profit = _percentiles(profit.sum(axis=1))
+    runway_bands = _percentiles(runway)
+
+    return {
+        "months": months,
+        "paths": paths,
+        "assumptions": {
+            "starting_monthly_revenue": start["revenue"],
+            "starting_monthly_expenses": start["expenses"],
+            "starting_cash": starting_cash,
+            "revenue_monthly_drift": revenue_drift,
+            "revenue_monthly_volatility": revenue_vol,
+            "expense_monthly_drift": expense_drift,
+            "expense_monthly_volatility": expense_vol,
+            "history_months": int(revenue_history.size)
+        },
+        "bands": {
+            "revenue": bands(revenue),
+            "expenses": bands(expenses),
+            "net_profit": bands(profit),
+            "cash": bands(cash)
+        },
+        "total_profit": dict(zip(("p5", "p50", "p95"), total_profit.round(2).tolist())),
+        "runway_months": dict(zip(("p5", "p50", "p95"), runway_bands.round(2).tolist())),
+        "probability_cash_negative": float(ever_negative.mean())
+    }
+
+def build_scenario_prompt(projection: dict, company_info: dict):
     proj = projection['projected']
     deltas = projection['deltas']
     
@@ -74,9 +247,114 @@ def analyze_scenario(projection: dict, company_info: dict):
     2. If they increase expenses without revenue growth, warn about cash burn.
     3. Keep it brief (max 3 sentences). be direct.
     """
+
+    return prompt
+
+def fallback_critique(projection: dict):
+    """
+    Deterministic critique used when the LLM does not answer in time, following
+    the same rules as the scenario prompt.
+    """
+    proj = projection['projected']
+    deltas = projection['deltas']
+    revenue_pct = deltas['revenue_change_percent']
+    expense_pct = deltas['expense_change_percent']
+
+    if revenue_pct >= 20 and expense_pct < 0:
+        verdict = (f"Growing revenue {revenue_pct:.1f}% while cutting expenses {abs(expense_pct):.1f}% "
+                   "risks operational failure: someone still has to do the extra work.")
+    elif expense_pct > 0 and revenue_pct <= 0:
+        verdict = (f"Raising expenses {expense_pct:.1f}% without revenue growth burns cash "
+                   "with nothing to show for it.")
+    else:
+        verdict = "The plan is internally consistent, but the growth target still needs a concrete sales plan."
+
+    if proj['net_profit'] < 0:
+        verdict += f" The projection leaves a net loss of ${abs(proj['net_profit']):,.2f}."
+    else:
+        verdict += f" Projected net profit is ${proj['net_profit']:,.2f}."
+
+    return verdict + " (Automated critique: AI analysis timed out.)"
+
+def analyze_scenario(projection: dict, company_info: dict):
+    """
+    Asks AI to critique the scenario.
+    """
+    if not llm_available():
+        return "AI Analysis Unavailable (Key Missing)"
+
+    model = create_model()
+    prompt = build_scenario_prompt(projection, company_info)
     
     try:
         response = model.generate_content(prompt)
+        record_llm_usage("scenario", response)
         return response.text
     except Exception as e:
         return f"AI Analysis Failed: {str(e)}"
+
+def scenario_cache_key(projection: dict, company_info: dict):
+    # Moving a slider back to a previous position must hit the same entry, so
+    # modifiers are snapped to the slider step before hashing.
+    deltas = projection['deltas']
+    steps = {
+        name: int(round(deltas[name] / 100 / MODIFIER_STEP))
+        for name in ("revenue_change_percent", "expense_change_percent")
+    }
+    return cache_key("scenario", projection['original'], steps, company_info)
+
+async def analyze_scenario_async(projection: dict, company_info: dict, timeout: float = None):
+    """
+    Non-blocking, cached variant of analyze_scenario for async endpoints.
+    Returns fallback_critique when the call misses its deadline.
+    """
+    if not llm_available():
+        return analyze_scenario(projection, company_info)
+
+    key = scenario_cache_key(projection, company_info)
+    cached = ai_cache.get(key)
+    if cached is not None:
+        return cached
+
+    try:
+        result = await generate_text(build_scenario_prompt(projection, company_info), timeout, purpose="scenario")
+    except asyncio.TimeoutError:
+        return fallback_critique(projection)
+    except Exception as e:
+        return f"AI Analysis Failed: {str(e)}"
+
+    ai_cache.set(key, result)
+    return result
+
+async def stream_scenario(projection: dict, company_info: dict, timeout: float = None):
+    """
+    Streaming analyze_scenario_async: yields the critique in pieces as the
+    model writes it. Cached answers and fallbacks come as one piece; a
+    stream cut short by the deadline or an error ends where it stopped and
+    is not cached.
+    """
+    if not llm_available():
+        yield analyze_scenario(projection, company_info)
+        return
+
+    key = scenario_cache_key(projection, company_info)
+    cached = ai_cache.get(key)
+    if cached is not None:
+        yield cached
+        return
+
+    pieces = []
+    try:
+        async for piece in stream_text(build_scenario_prompt(projection, company_info), timeout, purpose="scenario"):
+            pieces.append(piece)
+            yield piece
+    except asyncio.TimeoutError:
+        if not pieces:
+            yield fallback_critique(projection)
+        return
+    except Exception as e:
+        if not pieces:
+            yield f"AI Analysis Failed: {str(e)}"
+        return
+
+    ai_cache.set(key, "".join(pieces))
@@ -0,0 +1,176 @@
+import hashlib
+import json
+from datetime import datetime
+from sqlalchemy import func, select
+from sqlalchemy.orm import Session
+
+from database import conflict_insert
+from models import Company, FinancialRecord, Assessment, CompanySnapshot
+
+# Records kept in a snapshot's trend
+TREND_PERIODS = 12
+
+def _percent_change(current, previous):
+    if current is None or not previous:
+        return None
+    return (current - previous) / abs(previous) * 100
+
+def _upsert(db: Session, company_id: int, values: dict):
+    # Creates the snapshot or updates it and bumps its version in a single
+    # statement, so concurrent writers neither collide on the first insert
+    # nor lose a version increment
+    table = CompanySnapshot.__table__
+    now = datetime.utcnow()
+    db.execute(
+        conflict_insert(db, table)
+        .values(company_id=company_id, version=1, updated_at=now, **values)
+        .on_conflict_do_update(
+            index_elements=[table.c.company_id],
+            set_={**values, "version": table.c.version + 1, "updated_at": now}
+        )
+    )
+
+def _record_values(records: list):
+    # `records` newest first, as served by ix_financial_records_company_period
+    latest = records[0]
+    previous = records[1] if len(records) > 1 else None
+    return {
+        "latest_record_id": latest.id,
+        "period_end": latest.period_end,
+        "revenue": latest.revenue,
+        "expenses": latest.opex,
+        "net_profit": latest.net_profit,
+        "revenue_change": _percent_change(latest.revenue, previous.revenue) if previous else None,
+        "expense_change": _percent_change(latest.opex, previous.opex) if previous else None,
+        "profit_change": _percent_change(latest.net_profit, previous.net_profit) if previous else None,
+        "trend": json.dumps([
+            {
+                "period_end": record.period_end.isoformat() if record.period_end else None,
+                "revenue": record.revenue,
+                "expenses": record.opex,
+                "net_profit": record.net_profit
+            }
+            for record in reversed(records)
+        ])
+    }
+
+def _assessment_values(assessment: Assessment):
+    return {
+        "latest_assessment_id": assessment.id,
+        "overall_score": assessment.overall_score,
+        "risk_level": assessment.risk_level,
+        "assessed_at": assessment.created_at
+    }
+
+def _recent_records(db: Session, company_id: int):
+    return db.query(FinancialRecord).filter(FinancialRecord.company_id == company_id).order_by(
+        FinancialRecord.period_end.desc(), FinancialRecord.id.desc()
+    ).limit(TREND_PERIODS).all()
+
+def record_written(db: Session, company_id: int):
+    """
+    Refreshes the company's snapshot after a FinancialRecord was added. The
+    trend is re-read from the (indexed) newest records rather than patched,
+    so concurrent uploads cannot leave it inconsistent. Flushes but does not
+    commit: call it before the commit that writes the record.
+    """
+    db.flush()
+    records = _recent_records(db, company_id)
+    if records:
+        _upsert(db, company_id, _record_values(records))
+
+def assessment_written(db: Session, assessment: Assessment):
+    """
+    Copies a new assessment's score and risk into the company's snapshot.
+    Flushes but does not commit.
+    """
+    db.flush()
+    _upsert(db, assessment.company_id, _assessment_values(assessment))
+
+def backfill_snapshots(db: Session):
+    """
+    Builds snapshots for companies that have records or assessments but no
+    snapshot yet (databases from before snapshots existed). Returns the
+    number created; commits.
+    """
+    has_snapshot = select(CompanySnapshot.company_id)
+    has_data = select(FinancialRecord.company_id).union(select(Assessment.company_id))
+    company_ids = db.scalars(
+        select(Company.id).where(Company.id.in_(has_data), Company.id.not_in(has_snapshot))
+    ).all()
+    if not company_ids:
+        return 0
+
+    # Newest TREND_PERIODS records and newest assessment per company, one
+    # windowed query each
+    record_rank = func.row_number().over(
+        partition_by=FinancialRecord.company_id,
+        order_by=(FinancialRecord.period_end.desc(), FinancialRecord.id.desc())
+    ).label("rank")
+    ranked_records = select(FinancialRecord.id, record_rank).where(
+        FinancialRecord.company_id.in_(company_ids)
+    ).subquery()
+    records = db.query(FinancialRecord).join(ranked_records, ranked_records.c.id == FinancialRecord.id).filter(
+        ranked_records.c.rank <= TREND_PERIODS
+    ).order_by(FinancialRecord.company_id, ranked_records.c.rank).all()
+
+    assessment_rank = func.row_number().over(
+        partition_by=Assessment.company_id,
+        order_by=(Assessment.created_at.desc(), Assessment.id.desc())
+    ).label("rank")
+    ranked_assessments = select(Assessment.id, assessment_rank).where(
+        Assessment.company_id.in_(company_ids)
+    ).subquery()
+    assessments = db.query(Assessment).join(ranked_assessments, ranked_assessments.c.id == Assessment.id).filter(
+        ranked_assessments.c.rank == 1
+    ).all()
+
+    by_company = {}
+    for record in records:
+        by_company.setdefault(record.company_id, []).append(record)
+    latest_assessment = {assessment.company_id: assessment for assessment in assessments}
+
+    rows = []
+    for company_id in company_ids:
+        row = {"company_id": company_id, "version": 1, "updated_at": datetime.utcnow()}
+        if company_id in by_company:
+            row.update(_record_values(by_company[company_id]))
+        if company_id in latest_assessment:
+            row.update(_assessment_values(latest_assessment[company_id]))
+        rows.append(row)
+    # A snapshot written meanwhile by an upload already holds newer figures
+    table = CompanySnapshot.__table__
+    created = 0
+    for row in rows:
+        created += db.execute(conflict_insert(db, table).values(**row).on_conflict_do_nothing()).rowcount
+    db.commit()
+    return created
+
+def new_company_snapshot(company_id: int, record_id: int, metrics: dict):
+    """
+    Snapshot row for a company created together with its first record, for
+    executemany inserts (bulk onboarding): there is no history to read.
+    """
+    return {
+        "company_id": company_id,
+        "latest_record_id": record_id,
+        "period_end": metrics["period_end"],
+        "revenue": metrics["revenue"],
+        "expenses": metrics["expenses"],
+        "net_profit": metrics["net_profit"],
+        "trend": json.dumps([{
+            "period_end": metrics["period_end"].isoformat(),
+            "revenue": metrics["revenue"],
+            "expenses": metrics["expenses"],
+            "net_profit": metrics["net_profit"]
+        }]),
+        "version": 1
+    }
+
+def snapshot_etag(pairs):
+    """
+    Weak ETag over (company_id, version) pairs: changes whenever any of the
+    snapshots it covers is rewritten, or the set of snapshots changes.
+    """
+    digest = hashlib.sha256(",".join(f"{company_id}.{version}" for company_id, version in pairs).encode())
+    return f'W/"{digest.hexdigest()[:32]}"'
@@ -0,0 +1,226 @@
+import bisect
+import contextvars
+import os
+import threading
+import time
+from contextlib import contextmanager
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Server-Timing header: "request" adds it when the client sends
+# `X-Server-Timing: 1`, "always" on every response, "off" never.
+SERVER_TIMING = os.getenv("SERVER_TIMING", "request").lower()
+
+# Histogram buckets (upper bounds)
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+SIZE_BUCKETS = (1e3, 1e4, 1e5, 1e6, 1e7, 1e8, 1e9)
+ROW_BUCKETS = (10, 100, 1e3, 1e4, 1e5, 1e6, 1e7)
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _label_text(names: tuple, values: tuple, extra: str = ""):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+def _number(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+class Counter:
+    def __init__(self, name: str, help_text: str, labels: tuple = ()):
+        self.name, self.help, self.labels = name, help_text, labels
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = tuple(labels.get(name, "") for name in self.labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_label_text(self.labels, key)} {_number(value)}")
+        return lines
+
+class Histogram:
+    """
+    Cumulative-bucket histogram in the Prometheus text format. Observations
+    are O(log buckets) under a lock, cheap enough for every request.
+    """
+
+    def __init__(self, name: str, help_text: str, labels: tuple = (), buckets: tuple = LATENCY_BUCKETS):
+        self.name, self.help, self.labels = name, help_text, labels
+        self.buckets = tuple(sorted(buckets))
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels):
+        key = tuple(labels.get(name, "") for name in self.labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                # Per-bucket counts (last slot is +Inf), sum, count
+                series = self._series[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for key, (counts, total, count) in sorted(self._series.items()):
+                cumulative = 0
+                for bound, bucket_count in zip((*self.buckets, float("inf")), counts):
+                    cumulative += bucket_count
+                    le = f'le="{_number(bound)}"'
+                    lines.append(f"{self.name}_bucket{_label_text(self.labels, key, le)} {cumulative}")
+                lines.append(f"{self.name}_sum{_label_text(self.labels, key)} {_number(total)}")
+                lines.append(f"{self.name}_count{_label_text(self.labels, key)} {count}")
+        return lines
+
+class Registry:
+    def __init__(self):
+        self.metrics = []
+        # Callables returning (name, help, [(labels dict, value), ...]) gauges,
+        # read at scrape time (pool and cache stats)
+        self.gauge_collectors = []
+
+    def counter(self, *args, **kwargs):
+        metric = Counter(*args, **kwargs)
+        self.metrics.append(metric)
+        return metric
+
+    def histogram(self, *args, **kwargs):
+        metric = Histogram(*args, **kwargs)
+        self.metrics.append(metric)
+        return metric
+
+    def render(self):
+        lines = []
+        for metric in self.metrics:
+            lines.extend(metric.render())
+        for collect in self.gauge_collectors:
+            for name, help_text, samples in collect():
+                lines.append(f"# HELP {name} {help_text}")
+                lines.append(f"# TYPE {name} gauge")
+                for labels, value in samples:
+                    lines.append(f"{name}{_label_text(tuple(labels), tuple(labels.values()))} {_number(value)}")
+        return "\n".join(lines) + "\n"
+
+registry = Registry()
+
+request_duration = registry.histogram(
+    "finpulse_http_request_duration_seconds", "HTTP request latency by route", ("method", "route", "status")
+)
+request_size = registry.histogram(
+    "finpulse_http_request_size_bytes", "HTTP request body size (Content-Length)", ("method", "route"),
+    buckets=SIZE_BUCKETS
+)
+stage_duration = registry.histogram(
+    "finpulse_stage_duration_seconds", "Time spent per processing stage", ("stage",)
+)
+upload_bytes = registry.histogram(
+    "finpulse_upload_bytes", "Size of uploaded ledger files", buckets=SIZE_BUCKETS
+)
+ledger_rows = registry.histogram(
+    "finpulse_ledger_rows", "Rows per parsed ledger", buckets=ROW_BUCKETS
+)
+llm_duration = registry.histogram(
+    "finpulse_llm_request_duration_seconds", "LLM call latency", ("purpose", "outcome")
+)
+llm_first_token = registry.histogram(
+    "finpulse_llm_first_token_seconds", "Time to the first streamed LLM chunk", ("purpose",)
+)
+llm_tokens = registry.counter(
+    "finpulse_llm_tokens_total", "LLM tokens used, from the response usage metadata", ("purpose", "kind")
+)
+
+# Stage timings of the current request, for the Server-Timing header. The
+# list is shared with threadpool calls, which copy the context.
+_request_spans = contextvars.ContextVar("request_spans", default=None)
+
+@contextmanager
+def span(stage: str):
+    """
+    Times a processing stage into finpulse_stage_duration_seconds and, inside
+    a request, into its Server-Timing header.
+    """
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        stage_duration.observe(elapsed, stage=stage)
+        spans = _request_spans.get()
+        if spans is not None:
+            spans.append((stage, elapsed))
+
+def record_llm_usage(purpose: str, response):
+    # google.generativeai responses carry usage_metadata; fakes may not.
+    usage = getattr(response, "usage_metadata", None)
+    if usage is None:
+        return
+    llm_tokens.inc(getattr(usage, "prompt_token_count", 0) or 0, purpose=purpose, kind="prompt")
+    llm_tokens.inc(getattr(usage, "candidates_token_count", 0) or 0, purpose=purpose, kind="completion")
+
+def _server_timing(spans: list, total: float):
+    # Repeated stages (e.g. two commits) are summed under one name.
+    totals = {}
+    for stage, elapsed in spans:
+        totals[stage] = totals.get(stage, 0.0) + elapsed
+    entries = [f"{stage.replace('.', '-')};dur={elapsed * 1000:.1f}" for stage, elapsed in totals.items()]
+    entries.append(f"total;dur={total * 1000:.1f}")
+    return ", ".join(entries)
+
+class MetricsMiddleware:
+    """
+    ASGI middleware recording latency and request size per route template
+    (e.g. /upload/{company_id}, so label cardinality stays bounded), and
+    adding the Server-Timing header when enabled.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        headers = dict(scope.get("headers") or [])
+        wants_timing = SERVER_TIMING == "always" or (
+            SERVER_TIMING == "request" and headers.get(b"x-server-timing", b"").strip() in (b"1", b"true")
+        )
+        spans = []
+        token = _request_spans.set(spans)
+        start = time.perf_counter()
+        status = 500
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                if wants_timing:
+                    timing = _server_timing(spans, time.perf_counter() - start)
+                    message = dict(message, headers=[*message.get("headers", []), (b"server-timing", timing.encode())])
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            _request_spans.reset(token)
+            route = scope.get("route")
+            path = getattr(route, "path", None) or "unmatched"
+            method = scope["method"]
+            request_duration.observe(time.perf_counter() - start, method=method, route=path, status=str(status))
+            length = headers.get(b"content-length")
+            if length and length.isdigit():
+                request_size.observe(int(length), method=method, route=path)
@@ -0,0 +1,52 @@
+import glob
+import io
+import time
+import zipfile
+
+import pytest
+
+def bundle(ledger: bytes, file_entry: str = "ledgers/a.csv", extra: dict = None):
+    # Zip with a one-company manifest.csv pointing at `file_entry`
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w", zipfile.ZIP_DEFLATED) as archive:
+        archive.writestr("manifest.csv", f"name,industry,business_type,file\nBulk Co,Retail,Shop,{file_entry}\n")
+        archive.writestr("ledgers/a.csv", ledger)
+        for name, content in (extra or {}).items():
+            archive.writestr(name, content)
+    return buffer.getvalue()
+
+def leftovers():
+    # Saved zips and extracted bundles still on disk
+    return glob.glob("uploads/*.zip") + glob.glob("uploads/bulk/*")
+
+@pytest.mark.parametrize("file_entry", ["/etc/passwd", "../outside.csv", "ledgers/../../outside.csv"])
+def test_manifest_path_outside_bundle_is_rejected(client, sample_ledger, file_entry):
+    response = client.post("/bulk/upload?assess=false", files={"file": ("b.zip", bundle(sample_ledger, file_entry))})
+    assert response.status_code == 400
+    assert "Unsafe path" in response.json()["detail"]
+    assert leftovers() == []
+
+def test_zip_entry_outside_bundle_is_rejected(client, sample_ledger):
+    archive = bundle(sample_ledger, extra={"../escaped.csv": "x"})
+    response = client.post("/bulk/upload?assess=false", files={"file": ("b.zip", archive)})
+    assert response.status_code == 400
+    assert leftovers() == []
+
+def test_not_a_zip_is_rejected(client):
+    response = client.post("/bulk/upload", files={"file": ("b.zip", b"plain text")})
+    assert response.status_code == 400
+    assert leftovers() == []
+
+def test_bundle_is_ingested_and_cleaned_up(client, sample_ledger):
+    response = client.post("/bulk/upload?assess=false", files={"file": ("b.zip", bundle(sample_ledger))})
+    assert response.status_code == 202
+    job_id = response.json()["job_id"]
+    for _ in range(200):
+        job = client.get(f"/jobs/{job_id}").json()
+        if job["status"] in ("succeeded", "failed"):
+            break
+        time.sleep(0.05)
+    assert job["status"] == "succeeded"
+    assert job["result"]["companies"] == 1
+    assert job["result"]["failed"] == []
+    assert leftovers() == []
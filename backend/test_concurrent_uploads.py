@@ -0,0 +1,38 @@
+import requests
+from concurrent.futures import ThreadPoolExecutor
+
+BASE_URL = "http://127.0.0.1:8000"
+
+# Six overlapping year-to-date exports of the same ledger, uploaded at once:
+# every row must reach the monthly rollups exactly once.
+MONTHS = [f"2024-{m:02d}" for m in range(1, 8)]
+LEDGERS = []
+body = "Date,Category,Amount,Type\n"
+for i, month in enumerate(MONTHS):
+    body += f"{month}-03,Sales,{100 + i},Income\n{month}-09,Rent,50,Expense\n"
+    if i:
+        LEDGERS.append(body)
+
+def upload(company_id, index, ledger):
+    return requests.post(f"{BASE_URL}/upload/{company_id}?narrative=none",
+                         files={"file": (f"ytd_{index}.csv", ledger.encode())})
+
+try:
+    company_id = requests.post(f"{BASE_URL}/companies/", json={
+        "name": "Concurrent Upload Co", "industry": "Retail", "business_type": "Store"
+    }).json()["id"]
+    with ThreadPoolExecutor(len(LEDGERS)) as pool:
+        responses = list(pool.map(lambda args: upload(company_id, *args), enumerate(LEDGERS)))
+    print(f"Upload status codes: {[r.status_code for r in responses]}")
+    for r in responses:
+        if r.status_code != 200:
+            print(f"Error: {r.text}")
+
+    rollups = requests.get(f"{BASE_URL}/companies/{company_id}/rollups").json()
+    revenue = sum(month["revenue"] for month in rollups)
+    rows = sum(month["row_count"] for month in rollups)
+    expected = sum(100 + i for i in range(len(MONTHS)))
+    ok = all(r.status_code == 200 for r in responses) and rows == 2 * len(MONTHS) and revenue == expected
+    print(f"{'✅' if ok else '❌'} Rollups: {rows} rows, revenue {revenue} (expected {2 * len(MONTHS)} rows, {expected})")
+except Exception as e:
+    print(f"Failed to connect: {e}")
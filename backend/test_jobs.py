@@ -0,0 +1,118 @@
+import asyncio
+import time
+from datetime import datetime, timedelta
+
+from database import SessionLocal
+from models import Job
+from services.jobs import JobQueue, claim_job, requeue_expired_jobs, JOB_MAX_ATTEMPTS
+
+def add_job(db, kind="echo", status="queued", attempts=0, started_at=None, heartbeat_at=None):
+    job = Job(kind=kind, status=status, payload="{}", attempts=attempts, started_at=started_at,
+              heartbeat_at=heartbeat_at)
+    db.add(job)
+    db.commit()
+    return job.id
+
+def reload(db, job_id):
+    db.expire_all()
+    return db.get(Job, job_id)
+
+async def echo(db, job):
+    return {"job": job.id}
+
+async def broken(db, job):
+    raise RuntimeError("ledger unreadable")
+
+def run(job_id, handlers=None):
+    queue = JobQueue(SessionLocal, handlers or {"echo": echo, "broken": broken}, workers=1)
+    asyncio.run(queue.run_job(job_id))
+
+def test_only_one_claim_wins(db):
+    job_id = add_job(db)
+    assert claim_job(db, job_id)
+    assert not claim_job(db, job_id)
+    job = reload(db, job_id)
+    assert job.status == "running"
+    assert job.attempts == 1
+    assert job.heartbeat_at is not None
+
+def test_job_result_and_error_are_stored(db):
+    done, failed = add_job(db), add_job(db, kind="broken")
+    run(done)
+    run(failed)
+    assert reload(db, done).status == "succeeded"
+    assert reload(db, done).result == f'{{"job": {done}}}'
+    assert reload(db, failed).status == "failed"
+    assert reload(db, failed).error == "ledger unreadable"
+
+def test_expired_lease_is_requeued_and_rerun(db):
+    stale = datetime.utcnow() - timedelta(hours=1)
+    lost = add_job(db, status="running", attempts=1, started_at=stale)
+    alive = add_job(db, status="running", attempts=1, started_at=stale, heartbeat_at=datetime.utcnow())
+
+    assert requeue_expired_jobs(db, lease=60) == 1
+    assert reload(db, lost).status == "queued"
+    assert reload(db, alive).status == "running"
+
+    run(lost)
+    job = reload(db, lost)
+    assert job.status == "succeeded"
+    assert job.attempts == 2
+
+def test_job_that_keeps_losing_its_worker_fails(db):
+    stale = datetime.utcnow() - timedelta(hours=1)
+    job_id = add_job(db, status="running", attempts=JOB_MAX_ATTEMPTS, started_at=stale, heartbeat_at=stale)
+    requeue_expired_jobs(db, lease=60)
+    job = reload(db, job_id)
+    assert job.status == "failed"
+    assert job.finished_at is not None
+
+def test_lost_lease_does_not_overwrite_the_new_claim(db):
+    job_id = add_job(db)
+
+    async def requeued_meanwhile(session, job):
+        # Another worker takes over while this one is still running
+        other = SessionLocal()
+        try:
+            requeue_expired_jobs(other, lease=-1)
+            claim_job(other, job.id)
+        finally:
+            other.close()
+        return {"stale": True}
+
+    run(job_id, {"echo": requeued_meanwhile})
+    job = reload(db, job_id)
+    assert job.status == "running"
+    assert job.attempts == 2
+    assert job.result is None
+
+def test_stopped_worker_hands_its_job_back(db):
+    job_id = add_job(db, kind="slow")
+    started = []
+
+    async def slow(session, job):
+        started.append(job.id)
+        await asyncio.sleep(60)
+
+    async def stop_midway():
+        queue = JobQueue(SessionLocal, {"slow": slow}, workers=1)
+        await queue.start()
+        queue.submit(job_id)
+        while not started:
+            await asyncio.sleep(0.01)
+        await queue.stop()
+
+    asyncio.run(stop_midway())
+    assert reload(db, job_id).status == "queued"
+
+def test_background_upload_runs_on_the_workers(client, company, sample_ledger):
+    response = client.post(f"/upload/{company()}?background=true", files={"file": ("ledger.csv", sample_ledger)})
+    assert response.status_code == 202
+    job_id = response.json()["job_id"]
+    for _ in range(200):
+        job = client.get(f"/jobs/{job_id}").json()
+        if job["status"] in ("succeeded", "failed"):
+            break
+        time.sleep(0.05)
+    assert job["status"] == "succeeded"
+    assert job["result"]["status"] == "success"
@@ -0,0 +1,33 @@
+def walk(client, url, limit):
+    # Every item of a cursor-paginated listing, following next_cursor
+    items, cursor = [], None
+    while True:
+        params = {"limit": limit, **({"cursor": cursor} if cursor else {})}
+        page = client.get(url, params=params).json()
+        items += page["items"]
+        cursor = page["next_cursor"]
+        if cursor is None:
+            return items
+
+def ledger(month: str, revenue: int):
+    return f"Date,Category,Amount,Type\n{month}-05,Sales,{revenue},Income\n".encode()
+
+def test_company_pages_cover_every_company_once(client, company):
+    created = [company(f"Paged {n}") for n in range(5)]
+    ids = [item["id"] for item in walk(client, "/companies/", limit=2)]
+    assert ids == sorted(ids)
+    assert len(ids) == len(set(ids))
+    assert set(created) <= set(ids)
+
+def test_records_page_newest_period_first(client, company):
+    company_id = company()
+    for month, revenue in [("2024-01", 100), ("2024-03", 300), ("2024-02", 200)]:
+        client.post(f"/upload/{company_id}?narrative=none", files={"file": (f"{month}.csv", ledger(month, revenue))})
+
+    records = walk(client, f"/companies/{company_id}/records", limit=1)
+    assert [record["revenue"] for record in records] == [300, 200, 100]
+
+def test_malformed_cursor_is_rejected(client):
+    response = client.get("/companies/", params={"cursor": "not-a-cursor"})
+    assert response.status_code == 400
+    assert response.json()["detail"] == "Invalid cursor"
@@ -0,0 +1,52 @@
+import json
+
+import pytest
+
+from services.ai_advisor import partial_string_field
+from services.simulator import calculate_projection_grid, modifier_count, MAX_GRID_POINTS
+
+BASE = {"revenue": 1000.0, "expenses": 800.0, "net_profit": 200.0}
+
+def grid(client, revenue_growth, expense_change):
+    return client.post("/simulate/grid", json={
+        "base_metrics": BASE, "revenue_growth": revenue_growth, "expense_change": expense_change
+    })
+
+def test_grid_over_lists_and_ranges(client):
+    response = grid(client, [0.0, 0.1], {"start": -0.1, "stop": 0.1, "step": 0.05})
+    assert response.status_code == 200
+    body = response.json()["grid"]
+    assert body["expense_change"] == [-0.1, -0.05, 0.0, 0.05, 0.1]
+    assert body["net_profit"][1][2] == 300.0
+    assert body["breakeven_expense_change"] == [0.25, 0.375]
+
+@pytest.mark.parametrize("step", [0, -0.01])
+def test_grid_rejects_non_positive_step(client, step):
+    response = grid(client, {"start": 0, "stop": 1, "step": step}, [0.0])
+    assert response.status_code == 400
+    assert response.json()["detail"] == "Range step must be positive"
+
+def test_grid_size_is_checked_before_allocating():
+    # 10^12 values per axis: refused from the counts alone
+    huge = {"start": 0, "stop": 1, "step": 1e-12}
+    assert modifier_count(huge) > MAX_GRID_POINTS
+    with pytest.raises(ValueError, match="Grid too large"):
+        calculate_projection_grid(BASE, huge, [0.0])
+
+def test_grid_rejects_product_over_limit(client):
+    axis = {"start": 0, "stop": 1, "step": 0.001}
+    response = grid(client, axis, axis)
+    assert response.status_code == 400
+    assert response.json()["detail"].startswith("Grid too large")
+
+def test_partial_string_field_follows_streamed_json():
+    answer = json.dumps({"executive_summary": "Cash \"runway\" is 6 months\nCut costs é", "risk_score": 40})
+    seen = [partial_string_field(answer[:end], "executive_summary") for end in range(len(answer) + 1)]
+    # Grows monotonically, never exposes a half-decoded escape, ends complete
+    for shorter, longer in zip(seen, seen[1:]):
+        assert longer.startswith(shorter)
+    assert seen[-1] == "Cash \"runway\" is 6 months\nCut costs é"
+
+def test_partial_string_field_before_the_field_arrives():
+    assert partial_string_field('{"risk_sc', "executive_summary") == ""
+    assert partial_string_field('{"executive_summary": ', "executive_summary") == ""
@@ -0,0 +1,84 @@
+from services.ai_advisor import set_model_factory
+from services.llm_stub import FakeGenerativeModel
+
+def ledger_csv(rows):
+    # (date, category, amount, type) rows as an uploadable CSV body
+    return ("Date,Category,Amount,Type\n" + "".join(f"{d},{c},{a},{t}\n" for d, c, a, t in rows)).encode()
+
+def upload(client, company_id, body, name="ledger.csv", headers=None, narrative="inline"):
+    return client.post(f"/upload/{company_id}?narrative={narrative}", files={"file": (name, body)}, headers=headers)
+
+def test_repeat_upload_returns_stored_result(client, company, sample_ledger):
+    calls = []
+    class Counting(FakeGenerativeModel):
+        def generate_content(self, *args, **kwargs):
+            calls.append(1)
+            return super().generate_content(*args, **kwargs)
+    set_model_factory(lambda: Counting(latency=0))
+    try:
+        company_id = company()
+        first = upload(client, company_id, sample_ledger, "january.csv").json()
+        made = len(calls)
+        # Same bytes under another name: matched by content hash
+        second = upload(client, company_id, sample_ledger, "copy.csv").json()
+    finally:
+        set_model_factory(lambda: FakeGenerativeModel(latency=0))
+
+    assert first["status"] == "success"
+    assert second["status"] == "duplicate"
+    assert second["record_id"] == first["record_id"]
+    assert second["assessment"]["assessment_id"] == first["assessment"]["assessment_id"]
+    assert len(calls) == made
+
+def test_same_file_for_another_company_is_stored(client, company, sample_ledger):
+    first = upload(client, company(), sample_ledger).json()
+    other = upload(client, company(), sample_ledger).json()
+    assert other["status"] == "success"
+    assert other["record_id"] != first["record_id"]
+
+def test_idempotency_key_replays_and_rejects_other_content(client, company, sample_ledger):
+    company_id = company()
+    key = {"Idempotency-Key": "retry-1"}
+    body = ledger_csv([("2024-05-01", "Sales", 900, "Income")])
+    first = upload(client, company_id, body, headers=key).json()
+    retry = upload(client, company_id, body, headers=key).json()
+    assert retry["status"] == "duplicate"
+    assert retry["record_id"] == first["record_id"]
+
+    reused = upload(client, company_id, sample_ledger, headers=key)
+    assert reused.status_code == 422
+
+def test_streamed_repeat_upload_is_a_duplicate_event(client, company, sample_ledger):
+    company_id = company()
+    upload(client, company_id, sample_ledger)
+    response = client.post(f"/upload/{company_id}/stream", files={"file": ("again.csv", sample_ledger)})
+    assert response.text.startswith("event: duplicate")
+
+def test_overlapping_ledgers_count_each_row_once(client, company):
+    company_id = company()
+    january = [("2024-01-03", "Sales", 100, "Income"), ("2024-01-09", "Rent", 40, "Expense")]
+    february = [("2024-02-03", "Sales", 150, "Income")]
+    upload(client, company_id, ledger_csv(january), narrative="none")
+    # Year-to-date export repeating January's rows
+    upload(client, company_id, ledger_csv(january + february), narrative="none")
+
+    rollups = {row["month"]: row for row in client.get(f"/companies/{company_id}/rollups").json()}
+    assert rollups["2024-01"]["revenue"] == 100
+    assert rollups["2024-01"]["expenses"] == 40
+    assert rollups["2024-01"]["row_count"] == 2
+    assert rollups["2024-02"]["revenue"] == 150
+
+def test_snapshot_etag_answers_not_modified(client, company, sample_ledger):
+    company_id = company()
+    upload(client, company_id, sample_ledger, narrative="none")
+    first = client.get(f"/companies/{company_id}/snapshot")
+    etag = first.headers["ETag"]
+
+    cached = client.get(f"/companies/{company_id}/snapshot", headers={"If-None-Match": etag})
+    assert cached.status_code == 304
+    assert cached.content == b""
+
+    upload(client, company_id, ledger_csv([("2024-06-01", "Sales", 50, "Income")]), narrative="none")
+    changed = client.get(f"/companies/{company_id}/snapshot", headers={"If-None-Match": etag})
+    assert changed.status_code == 200
+    assert changed.headers["ETag"] != etag
@@ -0,0 +1,24 @@
+"""
+Standalone job worker. Runs queued jobs from the shared `jobs` table, so
+upload processing can scale out independently of the API processes.
+
+Usage (from the backend folder, same .env as the API):
+    UPLOAD_WORKERS=0 uvicorn main:app      # API only enqueues
+    python worker.py --workers 8           # one or more worker processes
+"""
+import argparse
+import asyncio
+
+from database import SessionLocal
+from services.jobs import JobQueue, UPLOAD_WORKERS, JOB_POLL_INTERVAL
+from services.pipeline import JOB_HANDLERS
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--workers", type=int, default=max(UPLOAD_WORKERS, 1))
+    parser.add_argument("--poll-interval", type=float, default=JOB_POLL_INTERVAL)
+    args = parser.parse_args()
+
+    queue = JobQueue(SessionLocal, JOB_HANDLERS, workers=args.workers)
+    print(f"FinPulse worker running {args.workers} concurrent jobs")
+    asyncio.run(queue.run_forever(args.poll_interval))